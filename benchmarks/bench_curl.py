@@ -0,0 +1,117 @@
+"""
+Benchmark of Curl.parse_log + Curl.clean_conn_data on large verbose (-v --trace-time) traces,
+against the previous parser which split each line several times and built the logs with +=.
+
+    python benchmarks/bench_curl.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from monitorx.curlx import Curl
+
+TLS_STAGES = [('OUT', 'Client hello (1)'), ('IN', 'Server hello (2)'),
+              ('IN', 'Encrypted Extensions (8)'), ('IN', 'Certificate (11)'),
+              ('IN', 'CERT verify (15)'), ('IN', 'Finished (20)'),
+              ('OUT', 'Finished (20)')]
+
+class Clock(object):
+    def __init__(self):
+        self.us = (1*3600 + 2*60 + 3)*1000000
+
+    def __call__(self, step=137):
+        self.us += step
+        s, us = divmod(self.us, 1000000)
+        return '{:02d}:{:02d}:{:02d}.{:06d}'.format(s//3600, s//60 % 60, s % 60, us)
+
+def make_trace(headers=50, streams=1):
+    """
+    A verbose curl trace with a TLS handshake, `headers` request and response headers
+    per transfer and `streams` HTTP/2 transfers multiplexed on the connection
+    """
+    t = Clock()
+    lines = ['{} *   Trying 93.184.216.34:443...'.format(t()),
+             '{} * Connected to example.com (93.184.216.34) port 443 (#0)'.format(t()),
+             '{} * ALPN: offers h2,http/1.1'.format(t())]
+    for direction, stage in TLS_STAGES:
+        lines.append('{} * TLSv1.3 ({}), TLS handshake, {}:'.format(t(), direction, stage))
+        lines.append('{} {} [512 bytes data]'.format(t(), '}' if direction == 'OUT' else '{'))
+    lines.append('{} * SSL connection using TLSv1.3 / TLS_AES_256_GCM_SHA384'.format(t()))
+    lines.append('{} * ALPN: server accepted h2'.format(t()))
+    for stream in range(1, 2*streams, 2):
+        lines.append('{} * [HTTP/2] [{}] OPENED stream for https://example.com/{}'.format(t(), stream, stream))
+        lines.append('{} > GET /{} HTTP/2'.format(t(), stream))
+        lines.append('{} > Host: example.com'.format(t()))
+        for h in range(headers):
+            lines.append('{} > x-request-header-{}: value-{}-{}'.format(t(), h, stream, h))
+        lines.append('{} > '.format(t()))
+    for stream in range(1, 2*streams, 2):
+        lines.append('{} < HTTP/2 200 '.format(t()))
+        for h in range(headers):
+            lines.append('{} < x-response-header-{}: value-{}-{}'.format(t(), h, stream, h))
+        lines.append('{} < '.format(t()))
+        lines.append('{} {{ [1024 bytes data]'.format(t()))
+    lines.append('{} * Connection #0 to host example.com left intact'.format(t()))
+    return '\n'.join(lines) + '\n'
+
+class LegacyCurl(Curl):
+    """The parser as it was before the single pass rewrite"""
+    def parse_log(self):
+        lines = iter(self.lograw.split('\n'))
+        for line in lines:
+            try:
+                time = line.split()[0]
+            except IndexError:
+                pass
+            line = ' '.join(line.split()[1:])
+            if line.startswith('>'):
+                self.parse_req_hdr(line)
+                self.log['client'] += line + '\n'
+            elif line.startswith('<'):
+                self.parse_resp_hdr(line)
+                self.log['srv'] += line + '\n'
+            elif line.startswith('*'):
+                if line.startswith('* TLS'):
+                    self.parse_sslhs([line, next(lines, None)], time)
+                else:
+                    self.parse_info_hdr(line, time)
+                    self.log['info'] += line + '\n'
+
+    def clean_conn_data(self):
+        time_diff_to_connect = datetime.strptime(self.ssl_hs_data[0][1], '%H:%M:%S.%f') - \
+                               datetime.strptime(self.conn_data[0][1], '%H:%M:%S.%f')
+        self.conn_data.append([self.ssl_hs_data[0][0], time_diff_to_connect.microseconds/1000])
+        for n, i in enumerate(self.ssl_hs_data[1:], 1):
+            prev_time = datetime.strptime(self.ssl_hs_data[n-1][1], '%H:%M:%S.%f')
+            now_time = datetime.strptime(i[1], '%H:%M:%S.%f')
+            self.conn_data.append([i[0], (now_time-prev_time).microseconds/1000])
+
+def parse(cls, lograw):
+    curl = cls('https://example.com')
+    curl.lograw = lograw
+    curl.parse_log()
+    curl.clean_conn_data()
+    return curl
+
+def bench(name, lograw, number=20):
+    lines = lograw.count('\n')
+    result = {}
+    for cls in (LegacyCurl, Curl):
+        seconds = min(timeit.repeat(lambda: parse(cls, lograw), number=number, repeat=3))/number
+        result[cls.__name__] = seconds
+    speedup = result['LegacyCurl']/result['Curl']
+    print('{:<28} {:>8} lines  legacy {:>12,.0f} lines/s  new {:>12,.0f} lines/s  {:.2f}x'.format(
+        name, lines, lines/result['LegacyCurl'], lines/result['Curl'], speedup))
+
+if __name__ == '__main__':
+    #The same trace must come out the same from both parsers
+    old, new = parse(LegacyCurl, make_trace(20, 4)), parse(Curl, make_trace(20, 4))
+    assert old.log == new.log and old.d == new.d
+    assert old.req_hdr == new.req_hdr and old.resp_hdr == new.resp_hdr
+    assert old.conn_data == new.conn_data, (old.conn_data, new.conn_data)
+    bench('small (10 headers)', make_trace(10), number=500)
+    bench('big header set (2000)', make_trace(2000))
+    bench('http2 multiplexed (100x50)', make_trace(50, 100))
@@ -0,0 +1,47 @@
+"""
+Benchmark of packing, sorting and classifying large lists of IPs (util.pack_ips, ip_order,
+sortip, classify_ips), against sorting the strings with socket.inet_aton as the key.
+
+    python benchmarks/bench_ips.py [--count 1000000]
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from monitorx.util import classify_ips, ip_order, load_numpy, pack_ips, sortip
+
+def make_ips(count, seed=1):
+    rand = random.Random(seed)
+    return ['{}.{}.{}.{}'.format(rand.randrange(256), rand.randrange(256), rand.randrange(256), rand.randrange(256))
+            for _ in range(count)]
+
+def timed(name, fn, count):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    print('{:<36} {:>8.3f}s  {:>12,.0f} IPs/s'.format(name, seconds, count/seconds))
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000000, help='IPv4 addresses')
+    args = parser.parse_args(argv)
+    if load_numpy() is None:
+        print('NumPy is not installed, the pure Python fallbacks are timed')
+    ips = make_ips(args.count)
+    packed = timed('pack_ips', lambda: pack_ips(ips), len(ips))
+    timed('ip_order (packed)', lambda: ip_order(ips, packed), len(ips))
+    timed('classify_ips (packed)', lambda: classify_ips(ips, packed), len(ips))
+    order = timed('pack_ips + ip_order', lambda: ip_order(ips), len(ips))
+    result = timed('sortip', lambda: sortip(ips), len(ips))
+    expected = timed('sorted(key=inet_aton)', lambda: sorted(ips, key=socket.inet_aton), len(ips))
+    assert result == expected
+    assert [ips[i] for i in list(order)[:1000]] == expected[:1000]
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Parse throughput of ParsePool against parsing in the calling process, on big verbose curl
+traces (HTTP/2, 100 streams) and long mtr text reports. The speedup grows with the number of
+cores, on a single core the pool only adds the IPC.
+
+    python benchmarks/bench_parsepool.py [workers]
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+from monitorx.parsepool import ParsePool, parse_payload
+from suite import fixture, huge_mtr_text, make_trace
+
+def bench(pool, name, kind, raws, extras):
+    lines = sum(raw.count('\n') for raw in raws)
+    start = time.perf_counter()
+    for raw, extra in zip(raws, extras):
+        parse_payload(kind, raw, extra)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    list(pool.map(kind, raws, extras))
+    pooled = time.perf_counter() - start
+    print('{:<24} serial {:>12,.0f} lines/s  pool {:>12,.0f} lines/s  {:.2f}x'.format(
+        name, lines/serial, lines/pooled, serial/pooled))
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    print('{} workers, {} cpus'.format(workers, os.cpu_count()))
+    with ParsePool(max_workers=workers) as pool:
+        #Start the workers before timing
+        list(pool.map('ping', [fixture('ping.txt')]*workers))
+        traces = [make_trace(50, 100)]*(8*workers)
+        bench(pool, 'curl http2 100 streams', 'curl', traces, [fixture('curl_out.txt')]*len(traces))
+        reports = [huge_mtr_text(500)]*(8*workers)
+        bench(pool, 'mtr text 500 reports', 'mtr_text', reports, [None]*len(reports))
@@ -0,0 +1,46 @@
+"""
+Native traces (traceroute.TraceEngine) of many destinations against a simulated network, on
+its virtual clock: how many probes per second the engine itself can push and match, and that
+the lossy hops planted in the topology are the ones found, with count rounds and with the
+adaptive policy (ratecontrol.AdaptivePolicy).
+
+    python benchmarks/bench_traceroute.py [destinations]
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+
+from monitorx.mtrx import MTR
+from monitorx.ratecontrol import AdaptivePolicy
+from monitorx.traceroute import SimulatedNetwork, TraceEngine
+
+def topology(destinations, lossy_every=10):
+    """Three hop routes, every lossy_every-th destination loses 40% past its first hop"""
+    routes = {}
+    for n in range(destinations):
+        dst = '198.18.{}.{}'.format(n//256, n % 256)
+        loss = 0.4 if n % lossy_every == 0 else 0.0
+        routes[dst] = [{'ip': '10.0.0.1', 'latency': 1, 'jitter': 0.2},
+                       {'ip': '10.1.{}.1'.format(n % 250), 'latency': 6, 'jitter': 1, 'loss': loss},
+                       {'ip': dst, 'latency': 9, 'jitter': 1, 'loss': loss}]
+    return routes
+
+def bench(routes, policy=None):
+    net = SimulatedNetwork(routes, seed=1)
+    engine = TraceEngine(net, rate=100000, burst=1000)
+    start = time.perf_counter()
+    mtrs = MTR.run_many(list(routes), count=10, engine=engine, policy=policy)
+    elapsed = time.perf_counter() - start
+    found = sum(1 for n, m in enumerate(mtrs) if (m.lossy_hop == 2) == (n % 10 == 0))
+    print('{:<9} {} destinations, {:,} probes in {:.2f}s ({:,.0f} probes/s), {:.1f}s simulated'.format(
+        'adaptive' if policy else 'count', len(routes), net.sent, elapsed, net.sent/elapsed, net.now))
+    print('          lossy hop right for {}/{} destinations'.format(found, len(routes)))
+
+if __name__ == '__main__':
+    destinations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    routes = topology(destinations)
+    bench(routes)
+    bench(routes, AdaptivePolicy())
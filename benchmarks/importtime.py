@@ -0,0 +1,70 @@
+"""
+Cold-start regression check. Each module is imported in a fresh interpreter with
+`python -X importtime`, the check fails if the total import time is over the budget or if
+one of the heavy modules, which must only be imported when they are used, got loaded.
+
+    python benchmarks/importtime.py [--budget-ms 60] [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+MODULES = ['monitorx.cli', 'monitorx.util', 'monitorx.pingx', 'monitorx.mtrx', 'monitorx.curlx', 'monitorx.export']
+
+#Loaded only when a probe actually needs them
+HEAVY = ['numpy', 'pyarrow', 'orjson', 'sqlite3', 'asyncio', 'ssl', 'http.client', 'subprocess']
+
+def import_times(module):
+    """
+    Import the module in a fresh interpreter
+
+    Returns
+    -------
+    tuple
+       cumulative import time of the module in ms, set of all the modules imported
+    """
+    env = dict(os.environ, PYTHONPATH=SRC, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    total = None
+    imported = set()
+    for line in result.stderr.split('\n'):
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if not cumulative.strip().isdigit():
+            continue #header line
+        imported.add(name)
+        if name == module:
+            total = int(cumulative)/1000
+    return total, imported
+
+def check(budget_ms, repeat):
+    failed = False
+    for module in MODULES:
+        #The best of a few runs, to leave out the noise of a busy machine
+        runs = [import_times(module) for _ in range(repeat)]
+        total = min(t for t, _ in runs)
+        heavy = sorted(set(HEAVY) & runs[0][1])
+        status = 'ok'
+        if total > budget_ms:
+            status = 'OVER BUDGET'
+            failed = True
+        if heavy:
+            status = 'imports ' + ', '.join(heavy)
+            failed = True
+        print('{:<18} {:>8.1f} ms  {}'.format(module, total, status))
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=60, help='maximum import time of each module')
+    parser.add_argument('--repeat', type=int, default=5, help='imports of each module, the fastest counts')
+    args = parser.parse_args()
+    sys.exit(1 if check(args.budget_ms, args.repeat) else 0)
@@ -0,0 +1,250 @@
+"""
+Benchmark suite of the parsers and of the subprocess layer, on the recorded outputs in
+benchmarks/fixtures. The huge inputs (thousands of mtr reports, 10k packet ping logs,
+multiplexed HTTP/2 traces) are built from those recordings.
+
+The subprocess cases run the real probes (Ping.run, MTR.run, Curl.run, util.run_command)
+against fake mtr/ping/curl binaries which only print the fixtures, so the process spawn +
+read + parse overhead is measured offline.
+
+Parsers are reported in lines/s, the subprocess cases in probes/s. The results are compared
+with benchmarks/baseline.json, a case slower than the baseline by more than the tolerance
+fails the run. The rates depend on the machine, so the baseline is not part of the repository:
+the first run on a machine records it (the cases missing from it are added the same way), and
+--save-baseline records it again, e.g. on the commit the changes are compared with.
+
+    python benchmarks/suite.py                  # run and compare with the baseline
+    python benchmarks/suite.py --save-baseline  # run and store the results as the baseline
+    python benchmarks/suite.py -k ping          # only the cases with ping in the name
+"""
+import argparse
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'fixtures')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+from bench_curl import make_trace
+from monitorx.curlx import Curl
+from monitorx.mtrx import MTR, Hop, iter_reports, iter_json_reports
+from monitorx.pingx import Ping
+from monitorx.scheduler import Scheduler
+from monitorx.util import run_command
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+def huge_mtr_text(reports):
+    """The recorded text report, concatenated as in an archived log"""
+    return fixture('mtr_report.txt') * reports
+
+def huge_mtr_ndjson(reports):
+    """The recorded json report, one per line"""
+    line = json.dumps(json.loads(fixture('mtr_report.json'))) + '\n'
+    return (line * reports).encode()
+
+def huge_ping(packets):
+    """A ping log of `packets` replies, with the RTTs of the recorded log"""
+    lines = fixture('ping.txt').split('\n')
+    replies = [l for l in lines if 'icmp_seq=' in l and '(DUP!)' not in l]
+    out = [lines[0]]
+    for seq in range(1, packets + 1):
+        prefix, _, rest = replies[seq % len(replies)].partition('icmp_seq=')
+        out.append('{}icmp_seq={} {}'.format(prefix, seq, rest.split(' ', 1)[1]))
+    out += ['', '--- 1.1.1.1 ping statistics ---',
+            '{0} packets transmitted, {0} received, 0% packet loss, time {1}ms'.format(packets, packets*1000)]
+    return '\n'.join(out) + '\n'
+
+def hop_lines(text):
+    """The hop lines of a report, as Hop takes them"""
+    return [l.replace('.|--', '') for l in text.split('\n') if '.|--' in l]
+
+#Parsers, (name, input, function of the input)
+
+def parse_mtr_text(text):
+    MTR().parse(text)
+
+def parse_mtr_json(text):
+    m = MTR()
+    m.mtr_raw = text
+    m.parse_mtr()
+    m.find_lossy_hop()
+
+def parse_hops(lines):
+    for line in lines:
+        Hop(line)
+
+def count_reports(reports):
+    for _ in reports:
+        pass
+
+def parse_ping(text):
+    p = Ping('1.1.1.1')
+    p.ping_raw = text
+    p.parse_output()
+
+def parse_curl(lograw):
+    c = Curl('https://example.com')
+    c.lograw = lograw
+    c.out = fixture('curl_out.txt')
+    c.parse_log()
+    c.parse_out()
+    c.clean_conn_data()
+
+def parser_cases():
+    mtr_text = fixture('mtr_report.txt')
+    mtr_json = fixture('mtr_report.json')
+    big_mtr = huge_mtr_text(5000)
+    ndjson = huge_mtr_ndjson(5000)
+    ping = fixture('ping.txt')
+    big_ping = huge_ping(10000)
+    curl = fixture('curl_trace.txt')
+    big_curl = make_trace(50, 100)
+    return [('mtr text small', mtr_text, parse_mtr_text),
+            ('mtr text 5k reports', big_mtr, lambda t: count_reports(iter_reports(t))),
+            ('mtr Hop.parse 5k reports', hop_lines(big_mtr), parse_hops),
+            ('mtr json small', mtr_json, parse_mtr_json),
+            ('mtr json 5k reports', ndjson, lambda d: count_reports(iter_json_reports(d.splitlines(True)))),
+            ('ping small', ping, parse_ping),
+            ('ping 10k packets', big_ping, parse_ping),
+            ('curl tls trace', curl, parse_curl),
+            ('curl http2 100 streams', big_curl, parse_curl)]
+
+def line_count(data):
+    if isinstance(data, list):
+        return len(data)
+    return data.count(b'\n' if isinstance(data, bytes) else '\n')
+
+#Subprocess layer, against the fake binaries
+
+FAKE_BINARIES = {
+    'ping': 'cat "{fixtures}/ping.txt"',
+    'mtr': 'cat "{fixtures}/mtr_report.json"',
+    #curl writes the verbose trace to stderr and the -w output to stdout
+    'curl': 'cat "{fixtures}/curl_trace.txt" >&2; cat "{fixtures}/curl_out.txt"',
+}
+
+class FakeBinaries(object):
+    """
+    Directory of fake mtr/ping/curl, put first on PATH while in the with block
+    """
+    def __enter__(self):
+        self.directory = tempfile.mkdtemp(prefix='monitorx-fakebin-')
+        for name, body in FAKE_BINARIES.items():
+            path = os.path.join(self.directory, name)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\n' + body.format(fixtures=FIXTURES) + '\n')
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        self.path = os.environ.get('PATH', '')
+        os.environ['PATH'] = self.directory + os.pathsep + self.path
+        return self
+
+    def __exit__(self, *exc):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def run_probe(probe_class, target):
+    probe_class(target).run()
+
+def probe_cases():
+    targets = ['10.0.0.{}'.format(n) for n in range(64)]
+    scheduler = Scheduler(max_workers=16)
+    return [('run_command ping', 1, lambda: run_command('ping -c 10 1.1.1.1')),
+            ('Ping.run', 1, lambda: run_probe(Ping, '1.1.1.1')),
+            ('MTR.run', 1, lambda: run_probe(MTR, '1.1.1.1')),
+            ('Curl.run', 1, lambda: run_probe(Curl, 'https://example.com')),
+            ('Scheduler.sweep 64 pings', len(targets), lambda: list(scheduler.sweep(Ping, targets)))]
+
+#Running and the baseline
+
+def best_of(fn, number, repeat):
+    return min(timeit.repeat(fn, number=number, repeat=repeat))/number
+
+def calibrate(fn, target=0.2):
+    """Calls per timing so that one timing takes about target seconds"""
+    fn() #warm up, lazy imports and caches
+    seconds = best_of(fn, 1, 3)
+    return max(1, int(target/max(seconds, 1e-6)))
+
+def run(keyword=None, repeat=5):
+    """
+    Returns
+    -------
+    generator
+       (case, {'rate', 'unit'}) as each case finishes
+    """
+    for name, data, fn in parser_cases():
+        if keyword and keyword not in name:
+            continue
+        call = lambda: fn(data)
+        seconds = best_of(call, calibrate(call), repeat)
+        yield name, {'rate': line_count(data)/seconds, 'unit': 'lines/s'}
+    with FakeBinaries():
+        for name, probes, fn in probe_cases():
+            if keyword and keyword not in name:
+                continue
+            seconds = best_of(fn, calibrate(fn), repeat)
+            yield name, {'rate': probes/seconds, 'unit': 'probes/s'}
+
+def load_baseline(path=BASELINE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='keyword', default=None, help='only run the cases with this in their name')
+    parser.add_argument('--repeat', type=int, default=5, help='timings of each case, the fastest counts')
+    parser.add_argument('--baseline', default=BASELINE, help='json file of the baseline results')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='fraction by which a case can be slower than the baseline')
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    new_cases = False
+    results = {}
+    regressions = []
+    print('{:<28} {:>16} {:<9} {:>16} {:>8}'.format('case', 'rate', '', 'baseline', 'ratio'))
+    for name, result in run(args.keyword, args.repeat):
+        results[name] = result
+        base = baseline.get(name, {}).get('rate')
+        ratio = result['rate']/base if base else None
+        if ratio is not None and ratio < 1 - args.tolerance:
+            regressions.append(name)
+        if base is None:
+            new_cases = True
+        print('{:<28} {:>16,.0f} {:<9} {:>16} {:>8}{}'.format(
+            name, result['rate'], result['unit'],
+            '{:,.0f}'.format(base) if base else '-',
+            '{:.2f}x'.format(ratio) if ratio else '-',
+            '  SLOWER' if name in regressions else ''))
+    if args.save_baseline or new_cases:
+        #Only the cases without a baseline are recorded, unless --save-baseline
+        baseline.update(results if args.save_baseline else
+                        {name: result for name, result in results.items() if name not in baseline})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to', args.baseline)
+        if args.save_baseline:
+            return 0
+    if regressions:
+        print('slower than the baseline:', ', '.join(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import ipaddress
+import socketserver
+import sqlite3
+import threading
+import time
+from .util import get_ip_asn_data, WHOIS_SERVER
+from .metrics import METRICS
+
+class ASNCache(object):
+    """
+    Local cache of the IP -> ASN data from whois.cymru.com, stored in a SQLite file.
+
+    The data is cached per BGP prefix, so one lookup answers for every IP in that prefix.
+    IPs are resolved with a longest prefix match against the cached prefixes and only the
+    misses are looked up, all of them in one bulk query. Entries expire after ttl seconds.
+    """
+    def __init__(self, path='asn_cache.sqlite', ttl=86400, server=WHOIS_SERVER, timeout=10):
+        """
+        Input:
+        path: str
+           SQLite file for the cache, ':memory:' keeps it only for the life of the object
+
+        ttl: int
+           seconds after which a cached prefix is looked up again
+
+        server: tuple
+           (host, port) of the whois server
+
+        timeout: int
+           socket timeout for the whois lookups
+        """
+        self.path = path
+        self.ttl = ttl
+        self.server = server
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS prefixes ('
+                        'version INTEGER, plen INTEGER, network BLOB, '
+                        'prefix TEXT, asnum TEXT, company TEXT, expires REAL, '
+                        'PRIMARY KEY (version, plen, network))')
+        self.db.commit()
+        self.load_prefix_lengths()
+
+    def load_prefix_lengths(self):
+        #Only the prefix lengths present in the cache need to be tried for the match
+        self.plens = {4: [], 6: []}
+        for version, plen in self.db.execute('SELECT DISTINCT version, plen FROM prefixes'):
+            self.plens[version].append(plen)
+        for version in self.plens:
+            self.plens[version].sort(reverse=True)
+
+    def longest_prefix_match(self, ip, now=None):
+        """
+        Find the most specific cached prefix containing ip.
+
+        Returns
+        -------
+        dict
+           {'asnum', 'ip', 'prefix', 'company'} or None if it's not cached (or expired)
+        """
+        now = now or time.time()
+        address = ipaddress.ip_address(ip)
+        bits = address.max_prefixlen
+        n = int(address)
+        for plen in self.plens[address.version]:
+            network = (n >> (bits - plen) << (bits - plen)).to_bytes(bits//8, 'big')
+            row = self.db.execute('SELECT prefix, asnum, company, expires FROM prefixes '
+                                  'WHERE version=? AND plen=? AND network=?',
+                                  (address.version, plen, network)).fetchone()
+            if row:
+                #An expired more specific prefix is a miss, a coarser one may not be its ASN
+                if row[3] <= now:
+                    return None
+                return {'asnum': row[1], 'ip': ip, 'prefix': row[0], 'company': row[2]}
+        return None
+
+    def get(self, ip_set):
+        """
+        Same as util.get_ip_asn_data, but served from the cache where possible
+
+        Returns
+        -------
+        dict
+           ip -> {'asnum', 'ip', 'prefix', 'company'}
+        """
+        ip_dict = {}
+        missing = []
+        now = time.time()
+        with self.lock:
+            for ip in set(ip_set):
+                try:
+                    info = self.longest_prefix_match(ip, now)
+                except ValueError:
+                    #Not an IP (??? hops in mtr)
+                    continue
+                if info:
+                    ip_dict[ip] = info
+                else:
+                    missing.append(ip)
+            self.hits += len(ip_dict)
+            self.misses += len(missing)
+        METRICS.inc('monitorx_asn_cache_total', len(ip_dict), result='hit')
+        METRICS.inc('monitorx_asn_cache_total', len(missing), result='miss')
+        if missing:
+            fetched = get_ip_asn_data(missing, server=self.server, prefix=True, timeout=self.timeout)
+            with self.lock:
+                self.add(fetched.values(), now)
+            ip_dict.update(fetched)
+        return ip_dict
+
+    @property
+    def hit_rate(self):
+        """Fraction of the IPs answered from the cache"""
+        total = self.hits + self.misses
+        return self.hits/total if total else None
+
+    def add(self, records, now=None):
+        """Store the records returned by get_ip_asn_data(..., prefix=True)"""
+        expires = (now or time.time()) + self.ttl
+        rows = []
+        for record in records:
+            try:
+                #IPs not in any announced prefix come back as NA, cache them as host routes
+                if record.get('prefix', 'NA') == 'NA':
+                    network = ipaddress.ip_network(record['ip'])
+                else:
+                    network = ipaddress.ip_network(record['prefix'], strict=False)
+            except ValueError:
+                continue
+            rows.append((network.version, network.prefixlen, network.network_address.packed,
+                         record.get('prefix', str(network)), record.get('asnum'), record.get('company'), expires))
+            if network.prefixlen not in self.plens[network.version]:
+                self.plens[network.version].append(network.prefixlen)
+                self.plens[network.version].sort(reverse=True)
+        self.db.executemany('INSERT OR REPLACE INTO prefixes VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.commit()
+
+    def evict(self, now=None):
+        """Remove the expired prefixes from the cache"""
+        with self.lock:
+            self.db.execute('DELETE FROM prefixes WHERE expires <= ?', (now or time.time(),))
+            self.db.commit()
+            self.load_prefix_lengths()
+
+    def close(self):
+        self.db.close()
+
+class StandInWhoisServer(socketserver.ThreadingTCPServer):
+    """
+    Local stand-in for whois.cymru.com answering the bulk queries from a dict of
+    prefix -> (asnum, company), to use the ASNCache without network access (tests, benchmarks)
+
+        server = StandInWhoisServer({'1.1.1.0/24': ('13335', 'CLOUDFLARENET, US')}, port=4343)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ASNCache(':memory:', server=server.server_address)
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, records, host='127.0.0.1', port=43):
+        self.records = {ipaddress.ip_network(prefix): info for prefix, info in records.items()}
+        self.queries = 0
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), StandInWhoisHandler)
+
+    def lookup(self, ip):
+        address = ipaddress.ip_address(ip)
+        best = None
+        for network in self.records:
+            if address in network and (best is None or network.prefixlen > best.prefixlen):
+                best = network
+        if best is None:
+            return 'NA', 'NA', 'NA'
+        asnum, company = self.records[best]
+        return asnum, str(best), company
+
+class StandInWhoisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.queries += 1
+        ips = []
+        prefix = False
+        for line in self.rfile:
+            line = line.decode().strip()
+            if line == 'end':
+                break
+            if line == 'prefix':
+                prefix = True
+            elif line and line != 'begin' and ',' not in line:
+                ips.append(line)
+        out = ['Bulk mode; whois.cymru.com [stand-in]']
+        for ip in ips:
+            asnum, network, company = self.server.lookup(ip)
+            if prefix:
+                out.append('{:<10}| {:<16}| {:<18}| {}'.format(asnum, ip, network, company))
+            else:
+                out.append('{:<10}| {:<16}| {}'.format(asnum, ip, company))
+        self.wfile.write(('\n'.join(out) + '\n').encode())
@@ -0,0 +1,83 @@
+import argparse
+import json
+import sys
+
+#Only argparse and json are imported up front, each command imports its probe module when
+#it runs, so `monitorx ping` never loads curlx/mtrx (or NumPy, asyncio, ssl ...)
+
+def to_json(value):
+    """json.dumps default for the values of the results which aren't plain json"""
+    if hasattr(value, 'tolist'): #array('d')/NumPy arrays
+        return value.tolist()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def ping(args):
+    from .pingx import Ping
+    p = Ping(args.target, count=args.count, timeout=args.timeout,
+             backend='native' if args.native or args.adaptive else 'subprocess', policy=args.adaptive)
+    p.run()
+    return p.ping_results
+
+def mtr(args):
+    from .mtrx import MTR
+    m = MTR(args.target, psize=args.psize, count=args.count, timeout=args.timeout,
+            backend='native' if args.native or args.adaptive else 'mtr', policy=args.adaptive)
+    m.run()
+    return {'destination': m.destination, 'lossy_hop': m.lossy_hop, 'hops': m.mtr_results}
+
+def curl(args):
+    from .curlx import Curl
+    c = Curl(args.target, options=args.options, timeout=args.timeout)
+    c.run()
+    return c.curl_conn_data
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='monitorx', description='Run a single probe and print its results as JSON')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds before the probe is killed')
+    parser.add_argument('--metrics', choices=('prometheus', 'json'), default=None,
+                        help='time the stages of the probe and print the metrics to stderr')
+    parser.add_argument('--pps', type=float, default=None, help='packets per second at the most, native probes')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('ping', help='ping a host')
+    p.add_argument('target')
+    p.add_argument('-c', '--count', type=int, default=10, help='packets to send')
+    p.add_argument('--native', action='store_true', help='ping from this process instead of running ping')
+    p.add_argument('--adaptive', action='store_true', help='native, stop early or send more than count as the replies call for')
+    p.set_defaults(func=ping)
+
+    p = commands.add_parser('mtr', help='mtr report to a host')
+    p.add_argument('target')
+    p.add_argument('-c', '--count', type=int, default=10, help='pings per hop')
+    p.add_argument('-s', '--psize', type=int, default=1500, help='packet size')
+    p.add_argument('--native', action='store_true', help='trace from this process instead of running mtr')
+    p.add_argument('--adaptive', action='store_true', help='native, stop early or probe more than count as the replies call for')
+    p.set_defaults(func=mtr)
+
+    p = commands.add_parser('curl', help='timings of fetching a url')
+    p.add_argument('target')
+    p.add_argument('-o', '--options', default='', help='extra curl options')
+    p.set_defaults(func=curl)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        from .metrics import METRICS
+        METRICS.enable()
+    if args.pps:
+        from .ratecontrol import set_budget
+        set_budget(args.pps)
+    results = args.func(args)
+    json.dump(results, sys.stdout, default=to_json, indent=2)
+    sys.stdout.write('\n')
+    if args.metrics == 'prometheus':
+        sys.stderr.write(METRICS.prometheus())
+    elif args.metrics == 'json':
+        json.dump(METRICS.snapshot(), sys.stderr, indent=2)
+        sys.stderr.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,561 @@
+from collections import defaultdict
+from math import floor
+from datetime import datetime
+from functools import lru_cache
+import time
+from .util import run_command, async_run_command
+from .metrics import stage
+
+class Curl(object):
+    curl_default_options = " -s -v -i -o /dev/null --trace-time -w 'curlout:%{speed_download}:%{time_namelookup}:%{time_connect}:%{time_appconnect}:%{time_pretransfer}:%{time_starttransfer}:%{time_total}' "
+    #For batches, each transfer's -w output is followed by its exit code and number, then its
+    #error message, and a delimiter line is written to stderr (%{stderr}) at the end of each
+    #transfer to split the verbose log per URL. These variables need curl 7.75 or later.
+    curl_batch_options = " -s -v -i --trace-time -w 'curlout:%{speed_download}:%{time_namelookup}:%{time_connect}:%{time_appconnect}:%{time_pretransfer}:%{time_starttransfer}:%{time_total}:%{exitcode}:%{urlnum}\\ncurlerr:%{urlnum}:%{errormsg}\\n%{stderr}curlxfer:%{urlnum}\\n' "
+    curl_batch_version = (7, 75)
+
+    def __init__(self, hostname, options='', custom_hdr=None, curl_command='curl', timeout=None, session=None):
+        """
+        inputs:
+        hostname: URL of the resource to fetch using curl.
+        custom_hdr: Additional custom headers to use (Sometimes it is pragma headers relevant to CDNs)
+        timeout: seconds after which the curl command is killed
+        session: CurlSession to fetch the URL with, in-process over a reused connection
+           instead of running curl. Only the -H headers of custom_hdr are used then.
+
+        attributes:
+        log: 
+        d:
+        command:
+        req_hdr:
+        resp_hdr:
+        curl_conn_data:
+        ssl_hs_data:
+        conn_data:
+        ssl_hs_raw:
+        error: why the transfer failed (curl's exit code or error message), None if it didn't
+        """
+        self.log = {'client': '', 'srv': '', 'info': ''}
+        self.d = {'client': defaultdict(dict),
+             'srv': defaultdict(dict),
+             'ssl': defaultdict(dict)}
+        self.command = ''
+        self.req_hdr = defaultdict(list)
+        self.resp_hdr = defaultdict(list)
+        self.curl_conn_data = {}
+        self.ssl_hs_data = []
+        self.conn_data = []
+        self.ssl_hs_raw = []
+        self.ts = None
+        self.error = None
+        self.timeout = timeout
+        self.hostname = hostname
+        self.custom_hdr = custom_hdr
+        self.session = session
+        options = ' ' + options + ' ' + self.curl_default_options
+        if custom_hdr:
+            options = options + custom_hdr
+        command = '{} {}'.format(curl_command, hostname)
+        command += options
+        self.command = command
+
+    def run(self):
+        if self.session:
+            with stage('curl', 'session'):
+                self.get_url_session()
+            return None
+        with stage('curl', 'run'):
+            self.get_url()
+        with stage('curl', 'parse'):
+            self.parse_log()
+            #A failed transfer's -w timings are all 0, there are none to report
+            if self.error is None:
+                self.parse_out()
+            self.clean_conn_data()
+        
+    def get_url(self):
+        self.ts = datetime.utcnow().strftime('%s')
+        result = run_command(self.command, timeout=self.timeout)
+        self.out = result[0]
+        self.lograw = result[1]
+        self.error = 'curl exited with code {}'.format(result[2]) if result[2] else None
+
+    @classmethod
+    def run_batch(cls, urls, options='', custom_hdr=None, curl_command='curl', timeout=None, parallel_max=None):
+        """
+        Fetch many URLs with a single curl process, one Curl object (parsed the same way as
+        run()) is returned per URL.
+
+        By default the transfers run one after the other, which also lets curl reuse the
+        connections across URLs of the same host. With parallel_max, they run with --parallel;
+        the interleaved verbose log is then split on the transfer ids of --trace-ids, which
+        needs curl 8.2 or later. With an older curl they run one after the other.
+
+        The URLs whose transfer failed have their error set (curl's error message) and no
+        curl_conn_data. Before curl 7.75, which can't report the results of each transfer,
+        each URL is fetched by a curl process of its own with run().
+
+        Raises RuntimeError (with curl's stderr) if curl fails without completing any transfer,
+        like on an unknown option.
+
+        Parameters
+        ----------
+        urls: list
+           URLs to fetch
+        options, custom_hdr, curl_command, timeout:
+           same as for Curl, applied to all the URLs
+        parallel_max: int
+           max number of parallel transfers (--parallel-max)
+
+        Returns
+        -------
+        list
+           Curl objects in the order of urls
+        """
+        import shlex
+        urls = list(urls)
+        curls = [cls(url, options=options, custom_hdr=custom_hdr, curl_command=curl_command, timeout=timeout)
+                 for url in urls]
+        if (curl_version(curl_command) or (0,)) < cls.curl_batch_version:
+            for curl in curls:
+                curl.run()
+            return curls
+        command = curl_command + ' ' + options + cls.curl_batch_options + (custom_hdr or '')
+        if parallel_max and (curl_version(curl_command) or (0,)) < (8, 2):
+            #No --trace-ids to split the interleaved log on
+            parallel_max = None
+        if parallel_max:
+            command += ' --parallel --parallel-max {} --trace-ids'.format(parallel_max)
+        #-o applies to one URL each
+        command += ''.join(' {} -o /dev/null'.format(shlex.quote(url)) for url in urls)
+        ts = datetime.utcnow().strftime('%s')
+        out, lograw, code = run_command(command, timeout=timeout)
+        outs = {}
+        errors = {}
+        for line in out.split('\n'):
+            if line.startswith('curlout:'):
+                outs[int(line.rsplit(':', 1)[1])] = line
+            elif line.startswith('curlerr:'):
+                n, _, message = line[8:].partition(':')
+                errors[int(n)] = message
+        #Failed transfers are reported with exit code != 0 (and 0 timings), but curl failing
+        #before any transfer (bad options) would silently leave all of them without results
+        if code and not outs and 'curlxfer:' not in lograw:
+            raise RuntimeError('curl failed with exit code {}: {}'.format(code, lograw.strip()[-500:]))
+        if parallel_max:
+            logs = split_log_by_id(lograw)
+        else:
+            logs = split_log_by_delimiter(lograw)
+        for n, curl in enumerate(curls):
+            curl.ts = ts
+            curl.command = command
+            curl.out = outs.get(n, '')
+            curl.lograw = logs.get(n, '')
+            exitcode = curl.out.split(':')[8] if curl.out else None
+            if exitcode != '0':
+                curl.error = errors.get(n) or 'curl exited with code {}'.format(exitcode)
+            curl.parse_log()
+            if curl.error is None:
+                curl.parse_out()
+            curl.clean_conn_data()
+        return curls
+
+    def get_url_session(self):
+        self.ts = datetime.utcnow().strftime('%s')
+        headers = header_options(self.custom_hdr) if self.custom_hdr else {}
+        result = self.session.request(self.hostname, headers=headers)
+        self.curl_conn_data = result['timings']
+        self.d['srv']['http'].update({'version': result['version'], 'code': result['code']})
+        for name, value in result['headers']:
+            self.resp_hdr[name].append(value)
+
+    async def arun(self):
+        if self.session:
+            #The session's requests are blocking, they are made in a thread not to block this loop
+            import asyncio
+            await asyncio.get_event_loop().run_in_executor(None, self.run)
+            return None
+        with stage('curl', 'run'):
+            await self.aget_url()
+        with stage('curl', 'parse'):
+            self.parse_log()
+            if self.error is None:
+                self.parse_out()
+            self.clean_conn_data()
+
+    async def aget_url(self):
+        self.ts = datetime.utcnow().strftime('%s')
+        result = await async_run_command(self.command, timeout=self.timeout)
+        self.out = result[0]
+        self.lograw = result[1]
+        self.error = 'curl exited with code {}'.format(result[2]) if result[2] else None
+
+    def parse_out(self):
+        res = self.out.split(':')
+        #From options
+        self.curl_conn_data = conn_timings(*[float(i) for i in res[1:8]])
+
+    def parse_log(self):
+        #Run through each line in the logs once
+        # And based on the start character, use appropriate parse function
+        #The segments of the log are gathered in lists and joined at the end
+        client = []
+        srv = []
+        info = []
+        lines = self.lograw.split('\n')
+        n = len(lines)
+        i = 0
+        time = None
+        while i < n:
+            #Split time and rest, the rest is normalised to single spaces
+            parts = lines[i].split()
+            i += 1
+            if not parts:
+                continue
+            time = parts[0]
+            line = ' '.join(parts[1:])
+            c = line[:1]
+            if c == '>':
+                self.parse_req_hdr(line)
+                client.append(line)
+            elif c == '<':
+                self.parse_resp_hdr(line)
+                srv.append(line)
+            elif c == '*':
+                if line.startswith('* TLS'):
+                    #The time of the next line ({ or } [n bytes data]) records the completion of the stage
+                    next_line = lines[i] if i < n else None
+                    i += 1
+                    self.parse_sslhs([line, next_line], time)
+                else:
+                    self.parse_info_hdr(line, time)
+                    info.append(line)
+        self.log['client'] += ''.join(line + '\n' for line in client)
+        self.log['srv'] += ''.join(line + '\n' for line in srv)
+        self.log['info'] += ''.join(line + '\n' for line in info)
+
+    def parse_req_hdr(self, line):
+        d={}
+        line = line[1:].strip() #Ignore the start character
+        #Ignore empty lines
+        if not line:
+            return None #Also a no body request
+        #Parse the lines with name: value
+        if ':' in line:
+            name, _, value = line.partition(':')
+            name = name.strip()
+            value = value.strip()
+            self.req_hdr[name].append(value) #to handle duplicate header responses
+        elif 'HTTP' in line: #The HTTP request line
+            value = line.split()
+            d['method'] = value[0]
+            d['path'] = value[1]
+            d['version'] = value[2]
+            self.d['client']['http'].update(d)
+    
+    def parse_resp_hdr(self, line):
+        d={}
+        line = line[1:].strip() #Ignore the start character
+        #Ignore empty lines
+        if not line:
+            return None
+        #Parse the lines with name: value
+        if ':' in line:
+            name, _, value = line.partition(':')
+            name = name.strip()
+            value = value.strip()
+            self.resp_hdr[name].append(value) #to handle duplicate header responses
+        elif 'HTTP' in line: #The HTTP request line
+            value = line.split()
+            d['version'] = value[0]
+            d['code'] = value[1]
+            self.d['srv']['http'].update(d)
+
+    def parse_info_hdr(self, line, time=None):
+        line = line[1:].strip() #Ignore the start character
+        if 'Connected' in line:
+            line = line.split()
+            self.d['srv']['ip'] = line[3][1:-1]
+            self.d['srv']['port'] = line[-2]
+            self.d['client']['curl_connection'] = line[-1][1:-1]
+            self.conn_data.append(['connect', time])
+        elif 'SSL connection' in line:
+            line = line.split()
+            self.d['ssl']['proto'] = line[3]
+            self.d['ssl']['cipher'] = line[5]
+
+    def parse_sslhs(self, lines, time):
+        stage = ' '.join(lines[0].split()[5:])
+        #Record the time of completion of sending data OR receiving data
+        #(the time of the TLS line itself if there is no line after it)
+        self.ssl_hs_data.append([stage, lines[1].split(None, 1)[0] if lines[1] else time])
+        self.ssl_hs_raw.append([time, lines])
+
+    def clean_conn_data(self):
+        #No TLS handshake (http) or connection info in the log, nothing to compute
+        if not self.ssl_hs_data or not self.conn_data:
+            return None
+        #connect time is recorded as time from parse_info_hdr, that is the ref point
+        # Use that to find the time to send client_hello
+        connect_us = ts_to_us(self.conn_data[0][1])
+        prev_us = ts_to_us(self.ssl_hs_data[0][1])
+        self.conn_data.append([self.ssl_hs_data[0][0], us_diff(prev_us, connect_us)/1000])
+        #Calculate the time diff on others the same way
+        # now-prev
+        for stage, ts in self.ssl_hs_data[1:]:
+            now_us = ts_to_us(ts)
+            self.conn_data.append([stage, us_diff(now_us, prev_us)/1000])
+            prev_us = now_us
+
+def ts_to_us(ts):
+    """HH:MM:SS.ffffff timestamp of --trace-time as microseconds since midnight"""
+    hms, _, frac = ts.partition('.')
+    h, m, sec = hms.split(':')
+    return ((int(h)*60 + int(m))*60 + int(sec))*1000000 + int((frac + '000000')[:6])
+
+def us_diff(now_us, prev_us):
+    #The timestamps wrap around at midnight
+    diff = now_us - prev_us
+    if diff < 0:
+        diff += 86400*1000000
+    return diff
+
+def conn_timings(speed_download, namelookup, connect, appconnect, pretransfer, starttransfer, total):
+    """
+    Breakdown of the request into its phases (in ms), from curl's cumulative -w timings (in s)
+    """
+    c = {}
+    c['tput_Mbps'] = speed_download*8/(10**6)
+    #https://blog.cloudflare.com/a-question-of-timing/
+    #namelookup is dns time
+    c['dns'] = floor(namelookup*1000)
+    #tcp = time_connect - time_namelookup (time to receive SYN-ACK)
+    c['tcp'] = floor(connect*1000)-floor(namelookup*1000)
+    #ssl = time_appconnect - time_connect (to complete SSL HS)
+    c['ssl'] = floor(appconnect*1000)-floor(connect*1000)
+    #req = time_pretransfer - time_appconnect (to start sending headers)
+    c['req'] = floor(pretransfer*1000) - floor(appconnect*1000)
+    #hdr_sent->first_byte_resp; tat = time_starttransfer - time_pretransfer
+    c['tat'] = floor(starttransfer*1000) - floor(pretransfer*1000)
+    #first_byte->last_byte; xf = time_total - time_starttransfer
+    c['xf'] = floor(total*1000) - floor(starttransfer*1000)
+    return c
+
+@lru_cache(maxsize=None)
+def curl_version(curl_command='curl'):
+    """
+    Version of curl as a tuple of ints, like (8, 5, 0), None if it can't be told.
+    Found once per curl_command.
+    """
+    import shlex
+    try:
+        out, _, _ = run_command(shlex.split(curl_command)[0] + ' --version')
+    except OSError:
+        return None
+    words = out.split()
+    if len(words) < 2 or words[0] != 'curl':
+        return None
+    version = []
+    for part in words[1].split('.'):
+        digits = ''.join(c for c in part if c.isdigit())
+        if not digits:
+            break
+        version.append(int(digits))
+    return tuple(version) or None
+
+def split_log_by_delimiter(lograw):
+    """
+    Split the verbose log of sequential transfers on the curlxfer:<urlnum> lines written at
+    the end of each transfer
+
+    Returns
+    -------
+    dict
+       urlnum -> log of that transfer
+    """
+    logs = {}
+    lines = []
+    for line in lograw.split('\n'):
+        if line.startswith('curlxfer:'):
+            logs[int(line[9:])] = '\n'.join(lines) + '\n'
+            lines = []
+        else:
+            lines.append(line)
+    return logs
+
+def split_log_by_id(lograw):
+    """
+    Split the interleaved verbose log of parallel transfers on the transfer id of each line,
+    HH:MM:SS.ffffff [<xfer>-<conn>] ... with --trace-ids. The ids are dropped from the lines.
+
+    Returns
+    -------
+    dict
+       transfer id -> log of that transfer
+    """
+    lines = defaultdict(list)
+    for line in lograw.split('\n'):
+        parts = line.split(None, 2)
+        if len(parts) < 2 or not parts[1].startswith('['):
+            continue
+        xfer = parts[1][1:].split('-', 1)[0]
+        if xfer.isdigit():
+            lines[int(xfer)].append(parts[0] + ' ' + (parts[2] if len(parts) > 2 else ''))
+    return {xfer: '\n'.join(l) + '\n' for xfer, l in lines.items()}
+
+def header_options(options):
+    """The headers passed with -H/--header in curl options, as a dict"""
+    import shlex
+    headers = {}
+    tokens = shlex.split(options)
+    for n, token in enumerate(tokens[:-1]):
+        if token in ('-H', '--header'):
+            name, _, value = tokens[n+1].partition(':')
+            headers[name.strip()] = value.strip()
+    return headers
+
+class CurlSession(object):
+    """
+    In-process HTTP client which keeps the connections open across requests, for repeated
+    checks against the same endpoints. The DNS + TCP + TLS handshake is done only when
+    there is no idle connection to the host in the pool.
+
+    The timings are measured the same way as curl's -w timings, so the results have the
+    same curl_conn_data breakdown, the phases of a reused connection (dns, tcp, ssl) are 0.
+
+        session = CurlSession()
+        for url in urls:
+            Curl(url, session=session).run()
+    """
+    def __init__(self, timeout=10, verify=True, max_idle=4):
+        """
+        Input:
+        timeout: int
+           socket timeout in seconds
+
+        verify: bool
+           verify the TLS certificate of the servers
+
+        max_idle: int
+           idle connections kept per host
+        """
+        #ssl and http.client are slow to import, only the sessions need them
+        import ssl
+        import threading
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ssl_context = ssl.create_default_context()
+        if not verify:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.pool = defaultdict(list)
+        self.lock = threading.Lock()
+        self.connections = 0 #new connections made
+        self.requests = 0
+
+    def request(self, url, headers=None, method='GET'):
+        """
+        Fetch the url
+
+        Returns
+        -------
+        dict
+           timings - curl_conn_data breakdown along with reused (bool)
+           version, code - of the response
+           headers - list of (name, value) of the response headers
+           size - bytes of the body
+        """
+        import http.client
+        from urllib.parse import urlsplit
+        if '://' not in url:
+            url = 'http://' + url #Same as curl
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        key = (scheme, host, port)
+        with self.lock:
+            self.requests += 1
+            conn = self.pool[key].pop() if self.pool[key] else None
+        if conn:
+            try:
+                return self.send(key, conn, method, path, headers, time.perf_counter(), True)
+            except (http.client.HTTPException, ConnectionError, BrokenPipeError):
+                #Server closed the idle connection, make a fresh one
+                conn.close()
+        start = time.perf_counter()
+        conn = self.connect(key, start)
+        return self.send(key, conn, method, path, headers, start, False)
+
+    def connect(self, key, start):
+        import http.client
+        import socket
+        scheme, host, port = key
+        addrinfo = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        namelookup = time.perf_counter()
+        error = None
+        for family, socktype, proto, _, sockaddr in addrinfo:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(self.timeout)
+            #curl sets TCP_NODELAY by default too
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                sock.connect(sockaddr)
+                break
+            except OSError as e:
+                sock.close()
+                error = e
+        else:
+            raise error
+        connect = time.perf_counter()
+        if scheme == 'https':
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=host)
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        appconnect = time.perf_counter() if scheme == 'https' else 0
+        #The connection is already made, http.client will use the socket as it is
+        conn.sock = sock
+        with self.lock:
+            self.connections += 1
+        conn.phases = (namelookup - start, connect - start, appconnect and appconnect - start)
+        return conn
+
+    def send(self, key, conn, method, path, headers, start, reused):
+        if reused:
+            namelookup = connect = appconnect = 0
+        else:
+            namelookup, connect, appconnect = conn.phases
+        pretransfer = time.perf_counter() - start
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        starttransfer = time.perf_counter() - start
+        body = response.read()
+        total = time.perf_counter() - start
+        #Keep the connection for the next request, unless the server is closing it
+        if response.will_close:
+            conn.close()
+        else:
+            with self.lock:
+                if len(self.pool[key]) < self.max_idle:
+                    self.pool[key].append(conn)
+                else:
+                    conn.close()
+        timings = conn_timings(len(body)/total if total else 0.0, namelookup, connect,
+                               appconnect or connect, pretransfer, starttransfer, total)
+        timings['reused'] = reused
+        return {'timings': timings,
+                'version': 'HTTP/{:.1f}'.format(response.version/10),
+                'code': str(response.status),
+                'headers': response.getheaders(),
+                'size': len(body)}
+
+    def close(self):
+        with self.lock:
+            for conns in self.pool.values():
+                for conn in conns:
+                    conn.close()
+            self.pool.clear()
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from array import array
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from .curlx import Curl
+from .mtrx import MTR
+from .pingx import Ping
+from .metrics import METRICS
+from .ratecontrol import set_budget
+from .util import log
+
+PROBES = {'ping': Ping, 'mtr': MTR, 'curl': Curl}
+
+class RingBuffer(object):
+    """
+    Fixed size time-series of (timestamp, value) kept in two typed arrays, in timestamp
+    order. The oldest samples are overwritten once it's full.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.ts = array('d', bytes(8*size))
+        self.values = array('d', bytes(8*size))
+        self.head = 0 #where the next sample goes
+        self.count = 0
+
+    def append(self, ts, value):
+        full = self.count == self.size
+        if full and ts < self.ts[self.head]:
+            #Older than all the samples kept
+            return None
+        #A sample older than the newest ones (a probe which finished late) is moved back to its
+        #place, the newer ones are shifted up. The oldest sample (at head) is dropped when full.
+        i = self.head
+        for _ in range(self.size - 1 if full else self.count):
+            prev = (i - 1) % self.size
+            if self.ts[prev] <= ts:
+                break
+            self.ts[i] = self.ts[prev]
+            self.values[i] = self.values[prev]
+            i = prev
+        self.ts[i] = ts
+        self.values[i] = value
+        self.head = (self.head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def since(self, start):
+        """
+        Samples with timestamp >= start, oldest first. Walks back from the newest sample and
+        stops at the first older one, so it's O(samples in the window).
+
+        Returns
+        -------
+        list
+           (timestamp, value) tuples
+        """
+        samples = []
+        i = self.head
+        for _ in range(self.count):
+            i = (i - 1) % self.size
+            if self.ts[i] < start:
+                break
+            samples.append((self.ts[i], self.values[i]))
+        samples.reverse()
+        return samples
+
+    def last(self, seconds, now=None):
+        """Samples of the last `seconds`"""
+        return self.since((now or time.time()) - seconds)
+
+def probe_metrics(kind, probe):
+    """
+    The metrics recorded for each kind of probe after a run
+
+    Returns
+    -------
+    dict
+       metric -> float, None values are not recorded
+    """
+    if kind == 'ping':
+        r = probe.ping_results
+        return {m: r.get(m) for m in ('loss', 'avg', 'min', 'max', 'stddev')}
+    if kind == 'mtr':
+        if not probe.mtr_results:
+            return {}
+        last_hop = probe.mtr_results[max(probe.mtr_results)]
+        return {'loss': last_hop['Loss%'],
+                'avg': last_hop['Avg'],
+                'hops': len(probe.mtr_results),
+                'lossy_hop': probe.lossy_hop}
+    if kind == 'curl':
+        return {m: v for m, v in probe.curl_conn_data.items() if m != 'reused'}
+    return {}
+
+class ProbeDaemon(object):
+    """
+    Runs the probes of a schedule forever, each on its own interval with some jitter so that
+    the probes don't all fire at once. The recent metrics of each (probe, target, metric) are
+    kept in memory in ring buffers and can be queried with query()/summary(). The same metric
+    of different probes isn't mixed, e.g. ping's loss is a fraction and mtr's a percentage.
+
+    The schedule is a list of jobs like
+        {"probe": "ping", "target": "1.1.1.1", "interval": 60, "options": {"count": 20}}
+    options are passed as is to Ping/MTR/Curl, e.g. {"backend": "native", "policy": true} for
+    the adaptive native ping/mtr.
+    """
+    def __init__(self, schedule, buffer_size=1440, jitter=0.1, max_running=64):
+        """
+        Input:
+        schedule: list
+           jobs to run, see above
+
+        buffer_size: int
+           samples kept per probe, target and metric (a day of samples at 1 per minute by default)
+
+        jitter: float
+           fraction of the interval by which each run is randomly moved
+
+        max_running: int
+           maximum number of probes running at the same time
+        """
+        self.schedule = schedule
+        self.buffer_size = buffer_size
+        self.jitter = jitter
+        self.max_running = max_running
+        self.buffers = {} #(probe, target, metric) -> RingBuffer
+        self.errors = defaultdict(int) #target -> count of failed runs
+        self.lock = threading.Lock()
+
+    def record(self, probe, target, metrics, ts=None):
+        """Record the metrics of a run of the probe (ping, mtr, curl) against the target"""
+        ts = ts or time.time()
+        with self.lock:
+            for metric, value in metrics.items():
+                if value is None:
+                    continue
+                key = (probe, target, metric)
+                buffer = self.buffers.get(key)
+                if buffer is None:
+                    buffer = self.buffers[key] = RingBuffer(self.buffer_size)
+                buffer.append(ts, float(value))
+
+    def query(self, probe, target, metric, minutes=5, now=None):
+        """(timestamp, value) samples of the metric of the probe's target, in the last N minutes"""
+        with self.lock:
+            buffer = self.buffers.get((probe, target, metric))
+            if buffer is None:
+                return []
+            return buffer.last(minutes*60, now)
+
+    def summary(self, probe, target, metric, minutes=5, now=None):
+        """count, min, avg, max of the metric in the last N minutes"""
+        values = [v for _, v in self.query(probe, target, metric, minutes, now)]
+        if not values:
+            return {'count': 0, 'min': None, 'avg': None, 'max': None}
+        return {'count': len(values), 'min': min(values), 'avg': sum(values)/len(values), 'max': max(values)}
+
+    async def run_job(self, job, semaphore):
+        kind = job['probe']
+        target = job['target']
+        interval = job.get('interval', 60)
+        options = job.get('options', {})
+        #Spread the first runs over the interval
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            start = time.time()
+            async with semaphore:
+                probe = PROBES[kind](target, **options)
+                try:
+                    await probe.arun()
+                    #Recorded when the run completes, the samples of each buffer come in order
+                    self.record(kind, target, probe_metrics(kind, probe))
+                except Exception as e:
+                    self.errors[target] += 1
+                    log('{} {} failed: {!r}'.format(kind, target, e))
+            delay = interval * (1 + random.uniform(-self.jitter, self.jitter)) - (time.time() - start)
+            await asyncio.sleep(max(delay, 0))
+
+    async def arun(self):
+        semaphore = asyncio.Semaphore(self.max_running)
+        await asyncio.gather(*[self.run_job(job, semaphore) for job in self.schedule])
+
+    def run(self):
+        asyncio.run(self.arun())
+
+    def serve(self, host='127.0.0.1', port=8787):
+        """
+        Answer queries over HTTP from a background thread, as JSON
+            GET /query?probe=ping&target=1.1.1.1&metric=avg&minutes=10
+            GET /summary?probe=ping&target=1.1.1.1&metric=avg&minutes=10
+            GET /targets (target -> probe -> metrics)
+        and the self metrics of the probes (when enabled) in the Prometheus text format
+            GET /metrics
+        """
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == '/metrics':
+                    self.reply(METRICS.prometheus().encode(), 'text/plain; version=0.0.4')
+                    return None
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                minutes = float(params.get('minutes', 5))
+                key = (params.get('probe'), params.get('target'), params.get('metric'))
+                if url.path == '/query':
+                    body = daemon.query(*key, minutes=minutes)
+                elif url.path == '/summary':
+                    body = daemon.summary(*key, minutes=minutes)
+                elif url.path == '/targets':
+                    body = defaultdict(lambda: defaultdict(list))
+                    with daemon.lock:
+                        for probe, target, metric in sorted(daemon.buffers):
+                            body[target][probe].append(metric)
+                else:
+                    self.send_error(404)
+                    return None
+                self.reply(json.dumps(body).encode(), 'application/json')
+
+            def reply(self, data, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def load_schedule(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the probes of a schedule and keep their recent results in memory')
+    parser.add_argument('schedule', help='JSON file with the list of jobs')
+    parser.add_argument('--buffer-size', type=int, default=1440, help='samples kept per probe, target and metric')
+    parser.add_argument('--jitter', type=float, default=0.1, help='fraction of the interval to jitter the runs by')
+    parser.add_argument('--max-running', type=int, default=64, help='probes running at the same time')
+    parser.add_argument('--listen', default=None, help='host:port to answer the queries on')
+    parser.add_argument('--metrics', action='store_true', help='collect the self metrics of the probes, served on /metrics')
+    parser.add_argument('--pps', type=float, default=None, help='packets per second of all the native probes at the most')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        METRICS.enable()
+    if args.pps:
+        set_budget(args.pps)
+    daemon = ProbeDaemon(load_schedule(args.schedule), buffer_size=args.buffer_size,
+                         jitter=args.jitter, max_running=args.max_running)
+    if args.listen:
+        host, _, port = args.listen.rpartition(':')
+        daemon.serve(host or '127.0.0.1', int(port))
+    daemon.run()
+
+if __name__ == '__main__':
+    main()
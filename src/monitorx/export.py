@@ -0,0 +1,210 @@
+import csv
+import os
+import time
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from .mtrx import hop_ip, hop_name
+
+@lru_cache(maxsize=None)
+def has_pyarrow():
+    """pyarrow is optional, without it the batches are written as CSV"""
+    from importlib.util import find_spec
+    return find_spec('pyarrow') is not None
+
+@lru_cache(maxsize=None)
+def load_pyarrow():
+    """pyarrow (with pyarrow.parquet), imported when the first parquet batch is written"""
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow
+
+#Column name -> array typecode, 's' are kept in lists (strings)
+MTR_COLUMNS = [('ts', 'd'), ('destination', 's'), ('hop', 'q'), ('ip', 's'), ('name', 's'),
+               ('loss', 'd'), ('snt', 'q'), ('last', 'd'), ('avg', 'd'), ('best', 'd'),
+               ('wrst', 'd'), ('stdev', 'd'), ('is_lossy', 'b')]
+PING_COLUMNS = [('ts', 'd'), ('target', 's'), ('sent', 'q'), ('recv', 'q'), ('loss', 'd'),
+                ('min', 'd'), ('avg', 'd'), ('max', 'd'), ('stddev', 'd')]
+CURL_COLUMNS = [('ts', 'd'), ('url', 's'), ('dns', 'q'), ('tcp', 'q'), ('ssl', 'q'), ('req', 'q'),
+                ('tat', 'q'), ('xf', 'q'), ('tput_Mbps', 'd'), ('reused', 'b')]
+
+#Missing values in the typed columns
+MISSING = {'d': float('nan'), 'q': -1, 'b': -1}
+
+def new_part(prefix, fmt):
+    """
+    Create the file of a new part, <prefix>-<UTC time>.<fmt> (with -<n> added if another session
+    has the same name), which only this session writes to
+
+    Returns
+    -------
+    str
+       path of the (empty) file
+    """
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    n = 0
+    while True:
+        path = '{}-{}{}.{}'.format(prefix, stamp, '-{}'.format(n) if n else '', fmt)
+        try:
+            open(path, 'x').close()
+            return path
+        except FileExistsError:
+            n += 1
+
+class ColumnBuffer(object):
+    """
+    Buffers rows of one kind of result in typed columns and writes them out in batches,
+    as Parquet (pyarrow) or CSV. Each ColumnBuffer writes a file (part) of its own, made at the
+    first write, so that the existing files are neither overwritten nor appended to. Parquet
+    files can't be appended to, CSV files are handled the same way.
+    """
+    def __init__(self, prefix, columns, batch_size=100000, fmt=None):
+        """
+        Input:
+        prefix: str
+           path of the files without the part name and extension, see new_part
+
+        columns: list
+           (name, typecode) of the columns
+
+        batch_size: int
+           rows buffered before they are written
+
+        fmt: str
+           parquet or csv, parquet when pyarrow is installed by default
+        """
+        self.fmt = fmt or ('parquet' if has_pyarrow() else 'csv')
+        if self.fmt == 'parquet' and not has_pyarrow():
+            raise ImportError('pyarrow is needed to write parquet')
+        self.prefix = prefix
+        self.path = None #the part, once something has been written
+        self.columns = columns
+        self.batch_size = batch_size
+        self.writer = None
+        self.rows = 0
+        self.reset()
+
+    def reset(self):
+        self.data = {name: [] if code == 's' else array(code) for name, code in self.columns}
+        self.pending = 0
+
+    def append(self, row):
+        """Add a row, a dict of column -> value, missing columns are filled in"""
+        for name, code in self.columns:
+            value = row.get(name)
+            if value is None and code != 's':
+                value = MISSING[code]
+            self.data[name].append(value)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return None
+        if self.path is None:
+            self.path = new_part(self.prefix, self.fmt)
+        if self.fmt == 'parquet':
+            self.write_parquet()
+        else:
+            self.write_csv()
+        self.rows += self.pending
+        self.reset()
+
+    def write_parquet(self):
+        pyarrow = load_pyarrow()
+        table = pyarrow.table({name: self.arrow_column(pyarrow, name, code) for name, code in self.columns})
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def arrow_column(self, pyarrow, name, code):
+        if code == 's':
+            return pyarrow.array(self.data[name], type=pyarrow.string())
+        #The typed arrays are handed to arrow as buffers, without building Python objects
+        types = {'d': pyarrow.float64(), 'q': pyarrow.int64(), 'b': pyarrow.int8()}
+        return pyarrow.Array.from_buffers(types[code], len(self.data[name]),
+                                          [None, pyarrow.py_buffer(self.data[name])])
+
+    def write_csv(self):
+        #The header goes before the first batch of the part
+        header = os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='') as f:
+            w = csv.writer(f)
+            if header:
+                w.writerow([name for name, _ in self.columns])
+            w.writerows(zip(*[self.data[name] for name, _ in self.columns]))
+
+    def close(self):
+        self.flush()
+        if self.fmt == 'parquet' and self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class Exporter(object):
+    """
+    Columnar export of MTR, Ping and Curl results. Each kind of result goes to its own files
+    under directory, one row per hop for MTR and one row per probe for Ping and Curl. Each
+    Exporter writes new files (parts), like mtr-20210220T065756.parquet, the directory can
+    be read as a dataset of all of them, e.g. pyarrow.dataset.dataset(directory).
+
+        exporter = Exporter('/var/lib/monitorx')
+        for result in scheduler.sweep(Ping, targets):
+            exporter.add(result.probe)
+        exporter.close()
+    """
+    def __init__(self, directory, batch_size=100000, fmt=None):
+        os.makedirs(directory, exist_ok=True)
+        self.buffers = {'mtr': ColumnBuffer(os.path.join(directory, 'mtr'), MTR_COLUMNS, batch_size, fmt),
+                        'ping': ColumnBuffer(os.path.join(directory, 'ping'), PING_COLUMNS, batch_size, fmt),
+                        'curl': ColumnBuffer(os.path.join(directory, 'curl'), CURL_COLUMNS, batch_size, fmt)}
+
+    def add(self, probe, ts=None):
+        """Add the results of a probe which has been run (MTR, Ping or Curl)"""
+        ts = ts or time.time()
+        if hasattr(probe, 'mtr_results'):
+            self.add_mtr(probe, ts)
+        elif hasattr(probe, 'ping_results'):
+            self.add_ping(probe, ts)
+        elif hasattr(probe, 'curl_conn_data'):
+            self.add_curl(probe, ts)
+
+    def add_mtr(self, mtr, ts):
+        if getattr(mtr, 'timestamp', None):
+            ts = mtr.timestamp.timestamp()
+        buffer = self.buffers['mtr']
+        for hop_n in sorted(mtr.mtr_results):
+            hop = mtr.mtr_results[hop_n]
+            buffer.append({'ts': ts,
+                           'destination': mtr.destination,
+                           'hop': hop_n,
+                           'ip': hop_ip(hop),
+                           'name': hop_name(hop),
+                           'loss': hop['Loss%'],
+                           'snt': hop['Snt'],
+                           'last': hop['Last'],
+                           'avg': hop['Avg'],
+                           'best': hop['Best'],
+                           'wrst': hop['Wrst'],
+                           'stdev': hop['StDev'],
+                           'is_lossy': None if hop.get('is_lossy') is None else int(hop['is_lossy'])})
+
+    def add_ping(self, ping, ts):
+        row = dict(ping.ping_results, ts=ts, target=ping.source)
+        self.buffers['ping'].append(row)
+
+    def add_curl(self, curl, ts):
+        if curl.ts:
+            ts = float(curl.ts)
+        row = dict(curl.curl_conn_data, ts=ts, url=curl.hostname)
+        if 'reused' in row:
+            row['reused'] = int(row['reused'])
+        self.buffers['curl'].append(row)
+
+    def flush(self):
+        for buffer in self.buffers.values():
+            buffer.flush()
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.close()
@@ -0,0 +1,198 @@
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+#Self metrics of the probes: time spent in each stage (spawn, run, parse, enrich ...), the
+#subprocesses run and the ASN cache hits/misses. Collection is off unless enable() is called
+#(or MONITORX_METRICS=1 is set), when it's off the hooks cost one attribute check.
+
+#Upper bounds (seconds) of the histogram buckets, from 50us to 2 minutes
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram(object):
+    """Counts of the observed values per bucket, along with their count and sum"""
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets) + 1) #the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, count of values <= it) for each bucket, as Prometheus reports them"""
+        total = 0
+        out = []
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+    def quantile(self, q):
+        """Estimate of the q-quantile (0-1), the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q*self.count
+        for le, total in self.cumulative():
+            if total >= rank:
+                return le
+        return float('inf')
+
+class Timer(object):
+    """Context manager which observes the time spent in the with block"""
+    __slots__ = ('histogram', 'lock', 'start')
+
+    def __init__(self, histogram, lock):
+        self.histogram = histogram
+        self.lock = lock
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        with self.lock:
+            self.histogram.observe(elapsed)
+
+class NullTimer(object):
+    """Stands in for Timer when the metrics are off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class Registry(object):
+    """
+    Histograms and counters, each identified by name and a tuple of (label, value) pairs
+
+        METRICS.enable()
+        with METRICS.timer('monitorx_stage_seconds', probe='mtr', stage='parse'):
+            ...
+        METRICS.inc('monitorx_subprocess_total', command='mtr')
+        print(METRICS.prometheus())
+    """
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def histogram(self, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def timer(self, name, **labels):
+        """Context manager timing the with block into the histogram name{labels}"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.histogram(name, labels), self.lock)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return None
+        histogram = self.histogram(name, labels)
+        with self.lock:
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return None
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        """
+        The current values, as a json serializable dict
+
+        Returns
+        -------
+        dict
+           histograms - list of {name, labels, count, sum, p50, p90, p99, buckets}
+           counters - list of {name, labels, value}
+        """
+        with self.lock:
+            histograms = [{'name': name,
+                           'labels': dict(labels),
+                           'count': h.count,
+                           'sum': h.sum,
+                           'p50': json_bound(h.quantile(0.5)),
+                           'p90': json_bound(h.quantile(0.9)),
+                           'p99': json_bound(h.quantile(0.99)),
+                           'buckets': [[json_bound(le), n] for le, n in h.cumulative()]}
+                          for (name, labels), h in sorted(self.histograms.items())]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+        return {'histograms': histograms, 'counters': counters}
+
+    def prometheus(self):
+        """The current values in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            seen = set()
+            for (name, labels), h in histograms:
+                if name not in seen:
+                    lines.append('# TYPE {} histogram'.format(name))
+                    seen.add(name)
+                for le, n in h.cumulative():
+                    bound = '+Inf' if le == float('inf') else repr(le)
+                    lines.append('{}_bucket{} {}'.format(name, format_labels(labels + (('le', bound),)), n))
+                lines.append('{}_sum{} {!r}'.format(name, format_labels(labels), h.sum))
+                lines.append('{}_count{} {}'.format(name, format_labels(labels), h.count))
+            for (name, labels), value in counters:
+                if name not in seen:
+                    lines.append('# TYPE {} counter'.format(name))
+                    seen.add(name)
+                lines.append('{}{} {}'.format(name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+def json_bound(le):
+    #json has no infinity, the last bucket is +Inf as in the Prometheus format
+    return '+Inf' if le == float('inf') else le
+
+def format_labels(labels):
+    #Backslash, double quote and line feed are escaped in the label values
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for k, v in labels) + '}'
+
+#The registry the probes report to
+METRICS = Registry(enabled=os.environ.get('MONITORX_METRICS', '') not in ('', '0'))
+
+def stage(probe, name):
+    """Timer of a stage of a probe, into monitorx_stage_seconds{probe, stage}"""
+    if not METRICS.enabled:
+        return NULL_TIMER
+    return METRICS.timer('monitorx_stage_seconds', probe=probe, stage=name)
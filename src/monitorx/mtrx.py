@@ -0,0 +1,659 @@
+import datetime
+import re
+import mmap
+from collections import namedtuple
+from .util import run_command, async_run_command, get_ip_asn_data, haversine_batch
+from .metrics import stage
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def json_backend():
+    """
+    The loads function used for the json reports, imported on first use. orjson is a lot
+    faster at parsing them, it's used when it's installed.
+    """
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        import json
+        return json.loads
+
+def json_loads(data):
+    return json_backend()(data)
+
+# RE for gathering the data from `mtr --report-wide -b` output, matched once per line.
+# Only the hop number is matched, the rest of the line is split
+#  1.|-- router.lan (192.168.1.1)    0.0%    10    0.5   0.6   0.4   0.9   0.1
+#123.|-- ???                        100.0    10    0.0   0.0   0.0   0.0   0.0
+hop_re = re.compile(r' *(\d+)\.\|-- ')
+
+class MTR(object):
+    """
+    Parses results of MTR into a dictionary.
+    If a custom mtr_command is passed, it needs to produce an output same as
+    `mtr --report-wide -b ... `
+    """
+    def __init__(self, destination=None, psize=1500, count=10, mtr_command=None, timeout=None, backend='mtr', interval=1.0,
+                 policy=None):
+        """
+        Input:
+        destination: str
+           list of ip address of the destination as string
+
+        psize: int 
+           packet size value to be passed into mtr options
+        
+        count: int
+           count of packets value to be passed into the mtr options
+
+        timeout: int
+           seconds after which the mtr command is killed
+
+        backend: str
+           mtr runs the mtr command, native traces from this process (traceroute.TraceEngine)
+
+        interval: float
+           seconds between the rounds of probes with the native backend, mtr's default is 1s
+
+        policy: ratecontrol.AdaptivePolicy or True (the default policy)
+           with the native backend, stop before count rounds once the loss and RTT of the
+           destination are known well enough, and go on while there's a lossy hop
+        """
+        self.destination = destination
+        self.psize = psize
+        self.count = count
+        self.mtr_command = mtr_command #if custom mtr command is used
+        self.timeout = timeout
+        self.backend = backend
+        self.interval = interval
+        self.policy = policy
+        self.mtr_info = {} #To store the parsed results
+        self.mtr_results = {} #hop number -> details of the hop
+        self.mtr_meta = {} #options passed to mtr, commands ...
+        self.lossy_hop = None #To indicate the lossy hop
+
+    def run(self):
+        #Run the mtr, each stage is timed when the metrics are enabled
+        if self.backend == 'native':
+            with stage('mtr', 'native'):
+                self.run_native()
+        else:
+            with stage('mtr', 'run'):
+                self.run_mtr()
+            with stage('mtr', 'parse'):
+                self.parse_mtr()
+        with stage('mtr', 'analyse'):
+            self.find_lossy_hop()
+            self.update_mtr_loss_info()
+        return True
+
+    async def arun(self):
+        """Same as run, but the mtr is run on the asyncio event loop"""
+        if self.backend == 'native':
+            #The trace engine runs its own selectors loop, it's run in a thread not to block this one
+            import asyncio
+            return await asyncio.get_event_loop().run_in_executor(None, self.run)
+        with stage('mtr', 'run'):
+            await self.arun_mtr()
+        with stage('mtr', 'parse'):
+            self.parse_mtr()
+        with stage('mtr', 'analyse'):
+            self.find_lossy_hop()
+            self.update_mtr_loss_info()
+        return True
+
+    def get_command(self):
+        if not self.mtr_command:
+            command = "mtr {} -p {} -c {} --report-wide -b -j".format(self.destination,
+                                                                      self.psize,
+                                                                      self.count)
+        else:
+            command = self.mtr_command
+        self.mtr_meta['command'] = command
+        return command
+
+    def run_mtr(self):
+        #Get the current timestamp
+        self.timestamp = datetime.datetime.now()
+        result = run_command(self.get_command(), timeout=self.timeout)
+        self.mtr_raw = result[0]
+
+    def run_native(self, engine=None):
+        """Trace from this process with a traceroute.TraceEngine, mtr_results is the same as with mtr"""
+        from .traceroute import TraceEngine
+        own = engine is None
+        engine = engine or TraceEngine()
+        self.timestamp = datetime.datetime.now()
+        try:
+            self.load_trace(engine.trace([self.destination], self.count, self.interval, deadline=self.timeout,
+                                         policy=self.policy)[0])
+        finally:
+            if own:
+                engine.close()
+
+    @classmethod
+    def run_many(cls, destinations, count=10, interval=1.0, timeout=None, engine=None, policy=None):
+        """
+        Trace many destinations at once over shared sockets, see traceroute.TraceEngine
+
+        Returns
+        -------
+        list
+           MTR objects with their mtr_results and lossy_hop, in the order of destinations
+        """
+        from .traceroute import TraceEngine
+        own = engine is None
+        engine = engine or TraceEngine()
+        mtrs = [cls(destination, count=count, timeout=timeout, backend='native', interval=interval, policy=policy)
+                for destination in destinations]
+        timestamp = datetime.datetime.now()
+        try:
+            with stage('mtr', 'native'):
+                traces = engine.trace(destinations, count, interval, deadline=timeout, policy=policy)
+        finally:
+            if own:
+                engine.close()
+        with stage('mtr', 'analyse'):
+            for mtr, trace in zip(mtrs, traces):
+                mtr.timestamp = timestamp
+                mtr.load_trace(trace)
+                mtr.find_lossy_hop()
+                mtr.update_mtr_loss_info()
+        return mtrs
+
+    def load_trace(self, trace):
+        """Populate the results from a trace of traceroute.TraceEngine"""
+        self.mtr_results = trace['hops']
+        self.mtr_meta = trace['meta']
+
+    async def arun_mtr(self):
+        self.timestamp = datetime.datetime.now()
+        result = await async_run_command(self.get_command(), timeout=self.timeout)
+        self.mtr_raw = result[0]
+        
+    def parse_mtr(self, output_type='json'):
+        #If mtr's json output format is used
+        if output_type == 'json':
+            self.load_report(json_loads(self.mtr_raw))
+        #Otherwise parsing the mtr data (options to mtr needs to be --report-wide -b)
+        else:
+            self.parse(self.mtr_raw)
+        
+    def load_report(self, data):
+        """Populate the results from mtr's parsed json output"""
+        json_data = data['report']
+        self.mtr_results = {}
+        for hop in json_data['hubs']:
+            self.mtr_results[hop['count']] = hop
+        self.mtr_meta = json_data['mtr']
+
+    def enrich(self, asn_lookup=get_ip_asn_data, geo_lookup=None):
+        """Annotate the hops with asn, company and distance, see enrich_traces"""
+        with stage('mtr', 'enrich'):
+            enrich_traces([self], asn_lookup=asn_lookup, geo_lookup=geo_lookup)
+
+    def get_lossy_hop(self):
+        """method to get the attribute of lossy_hop"""
+        return self.lossy_hop
+
+    def get_hop_details(self, hop_n):
+        """method to get the details of the hop"""
+        try:
+            return self.mtr_results[hop_n]
+        except KeyError:
+            return None
+
+    def find_lossy_hop(self):
+        """Finds the lossy hop"""
+        #Clear the result of any previous run
+        self.lossy_hop = None
+        if not self.mtr_results:
+            return None
+        # We will assume that the trace is lossy and start with the first hop
+        current_lossy_hop = 1
+        last_hop_n = 0
+        for hop, hop_info in self.mtr_results.items():
+            # check the loss of the hop, if its 0, it means all previous hops were clean
+            if hop_info['Loss%'] == 0 and hop > current_lossy_hop:
+                current_lossy_hop = hop
+            if hop > last_hop_n:
+                last_hop_n = hop
+
+        # if the current_lossy_hop was recorded as the last hop
+        # and if it wasn't lossy, then return None as the trace won't be lossy
+        last_hop = self.mtr_results[last_hop_n]
+        if (current_lossy_hop == last_hop['count'] and last_hop['Loss%'] == 0):
+            return None
+
+        # the current_lossy_hop records the latest hop which had 0 loss
+        # if it isn't the last hop (checked earlier), then it should be the next hop
+        self.lossy_hop = current_lossy_hop + 1
+
+    def update_mtr_loss_info(self):
+        """
+        method to add one more key to the dict(mtr_results) mentioning if that hop
+        was lossy or not, boolean True or False
+        """
+        for hop in self.mtr_results.keys():
+            # if the route was determined to be lossy, lets mark all hops including
+            # lossy_hop and after that as lossy
+            if self.lossy_hop and hop >= self.lossy_hop:
+                self.mtr_results[hop].update({'is_lossy' : True})
+            # otherwise its not
+            else:
+                self.mtr_results[hop].update({'is_lossy' : False})
+
+    def parse(self, mtr_data):
+        """
+        Parse the mtr data into a dictonary where keys are hop numbers and values
+        are details of the hop.
+        
+        Output: dict
+        """
+        self.mtr_results = {}
+        #The hops are built straight as dicts, skipping the HopRecords
+        for report in iter_reports(mtr_data, hop_factory=hop_dict):
+            if report.timestamp:
+                self.timestamp = report.timestamp
+            if report.headers:
+                self.headers = report.headers
+            for hop in report.hops:
+                self.mtr_results[hop['count']] = hop
+        return self.mtr_results
+
+    @classmethod
+    def from_report(cls, report, destination=None):
+        """MTR object for a report from iter_reports"""
+        mtr = cls(destination=destination)
+        mtr.timestamp = report.timestamp
+        mtr.headers = report.headers
+        mtr.mtr_results = {hop.count: hop.as_dict() for hop in report.hops}
+        mtr.find_lossy_hop()
+        mtr.update_mtr_loss_info()
+        return mtr
+
+def iter_lines(source):
+    """
+    Lines (bytes) of a file, memory mapped when source is a path, or of an already open
+    binary file or any iterable of bytes lines (gzip.open(...), sys.stdin.buffer)
+    """
+    if not isinstance(source, str):
+        yield from source
+        return None
+    with open(source, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #Empty file, can't be mapped
+            return None
+        with mm:
+            readline = mm.readline
+            line = readline()
+            while line:
+                yield line
+                line = readline()
+
+def iter_json_reports(source):
+    """
+    Parse an archive of `mtr -j` reports one report at a time, so memory use is bounded by
+    the size of one report and not by the archive. The reports can be one per line (ndjson)
+    or pretty printed (as mtr writes them) one after another.
+
+    Parameters
+    ----------
+    source: str or iterable
+       path of the archive (it's memory mapped), or an open binary file / iterable of lines
+
+    Returns
+    -------
+    generator
+       MTR objects, with mtr_results, mtr_meta, lossy_hop populated
+    """
+    lines = []
+    for line in iter_lines(source):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if not lines and stripped[:1] == b'{' and stripped[-1:] == b'}':
+            #A whole report on one line
+            data = stripped
+        else:
+            lines.append(line)
+            #A pretty printed report ends with the closing brace at the first column
+            if line[:1] != b'}':
+                continue
+            data = b''.join(lines)
+            lines = []
+        mtr = MTR()
+        mtr.load_report(json_loads(data))
+        mtr.destination = mtr.mtr_meta.get('dst')
+        mtr.find_lossy_hop()
+        mtr.update_mtr_loss_info()
+        yield mtr
+
+class HopRecord(namedtuple('HopRecord', ['count', 'name', 'ip', 'loss', 'snt', 'last', 'avg', 'best', 'wrst', 'stdev'])):
+    """Compact record of a hop, as_dict() gives the same dict as Hop"""
+    __slots__ = ()
+
+    def as_dict(self):
+        return hop_dict(*self)
+
+def hop_dict(count, name, ip, loss, snt, last, avg, best, wrst, stdev):
+    """The dict of a hop, same as Hop.get_hop_info()"""
+    return {'count': count,
+            'Loss%': loss,
+            'Snt': snt,
+            'Last': last,
+            'Avg': avg,
+            'Best': best,
+            'Wrst': wrst,
+            'StDev': stdev,
+            'name': name,
+            'ip': ip}
+
+MTRReport = namedtuple('MTRReport', ['timestamp', 'headers', 'hops'])
+
+def parse_hop_line(line, hop_factory=HopRecord):
+    """HopRecord (or what hop_factory makes of the fields) of a hop line, or None if it isn't one"""
+    m = hop_re.match(line)
+    if not m:
+        return None
+    data = line[m.end():].split()
+    if len(data) < 8:
+        return None
+    loss = data[-7]
+    if loss[-1] == '%':
+        loss = loss[:-1]
+    # The IP details almost always appears as name (IP), with IP/name being optional
+    # if there is none, it will be ???
+    if len(data) == 8:
+        name = '-'
+        ip = data[0]
+    else:
+        name = data[0]
+        ip = data[1].strip('()')
+    return hop_factory(int(m.group(1)), name, ip, float(loss), int(data[-6]), float(data[-5]),
+                       float(data[-4]), float(data[-3]), float(data[-2]), float(data[-1]))
+
+def parse_start(line):
+    #Start: 2021-02-20T06:57:56+0000, the offset is dropped
+    try:
+        return datetime.datetime.strptime(line[7:].strip()[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        return None
+
+def iter_reports(stream, hop_factory=HopRecord):
+    """
+    Parse many `mtr --report-wide -b` reports concatenated in one stream (archived logs),
+    yielding them one at a time. A new report begins at each Start: line.
+
+    Parameters
+    ----------
+    stream: str or iterable
+       the text, or an iterable of lines like an open file
+    hop_factory: callable
+       builds the hop from its fields, hop_dict gives the dicts of mtr_results
+
+    Returns
+    -------
+    generator
+       MTRReport(timestamp, headers, hops), hops is a list of HopRecord
+    """
+    if isinstance(stream, str):
+        stream = stream.split('\n')
+    timestamp = None
+    headers = None
+    hops = []
+    for line in stream:
+        if line.startswith('Start: '):
+            if hops:
+                yield MTRReport(timestamp, headers, hops)
+            timestamp = parse_start(line)
+            headers = None
+            hops = []
+        elif line.startswith('HOST: '):
+            headers = line[6:].split()
+        else:
+            hop = parse_hop_line(line, hop_factory)
+            if hop:
+                hops.append(hop)
+    if hops:
+        yield MTRReport(timestamp, headers, hops)
+
+def parse_reports(stream):
+    """Same as iter_reports, but yields MTR objects"""
+    for report in iter_reports(stream):
+        yield MTR.from_report(report)
+
+class HopBaseline(object):
+    """EWMA of the loss and latency of a hop, along with the EW variance of the latency"""
+    __slots__ = ('ip', 'asn', 'loss', 'avg', 'avg_var', 'n')
+
+    def __init__(self, ip, asn=None):
+        self.ip = ip
+        self.asn = asn
+        self.loss = 0.0
+        self.avg = 0.0
+        self.avg_var = 0.0
+        self.n = 0
+
+    def update(self, loss, avg, alpha):
+        if self.n == 0:
+            self.loss = loss
+            self.avg = avg
+        else:
+            self.loss += alpha*(loss - self.loss)
+            diff = avg - self.avg
+            incr = alpha*diff
+            self.avg += incr
+            self.avg_var = (1 - alpha)*(self.avg_var + diff*incr)
+        self.n += 1
+
+class PathTracker(object):
+    """
+    Tracks the path to each destination across MTR runs, for destinations which are traced
+    repeatedly. Each run is compared with the previous one of the destination to report the
+    path changes, and the loss/latency of each hop is compared with the EWMA baseline of that
+    hop. A hop is flagged as lossy only when its loss deviates from its baseline. Each update
+    is O(hops), no history is kept other than the previous path and the baselines.
+    """
+    def __init__(self, alpha=0.2, loss_threshold=10.0, latency_threshold=3.0, min_latency_change=5.0, warmup=3):
+        """
+        Input:
+        alpha: float
+           weight of the latest run in the EWMA
+
+        loss_threshold: float
+           percentage points of loss above the baseline to consider the hop lossy
+
+        latency_threshold: float
+           number of (EW) standard deviations above the baseline to consider the latency high
+
+        min_latency_change: float
+           ms above the baseline the latency has to be at least, to consider it high
+
+        warmup: int
+           runs of a hop needed before it's compared against its baseline
+        """
+        self.alpha = alpha
+        self.loss_threshold = loss_threshold
+        self.latency_threshold = latency_threshold
+        self.min_latency_change = min_latency_change
+        self.warmup = warmup
+        self.paths = {} #destination -> {hop_n: HopBaseline}
+
+    def update(self, mtr, destination=None):
+        """
+        Compare the MTR run with the previous runs to the destination, and update the baselines
+
+        Returns
+        -------
+        dict
+           changes - list of (change, hop_n, old, new), change is one of hop_count, ip, asn
+           deviations - list of (hop_n, metric, value, baseline), metric is Loss% or Avg
+           lossy_hop - first hop whose loss deviates from its baseline when the loss carries
+              on to the last hop, else None
+        """
+        destination = destination or mtr.destination
+        hops = mtr.mtr_results
+        previous = self.paths.get(destination)
+        baselines = previous or {}
+        changes = []
+        deviations = []
+        if previous is not None and len(previous) != len(hops):
+            changes.append(('hop_count', None, len(previous), len(hops)))
+        loss_deviating = {}
+        for hop_n, hop in hops.items():
+            ip = hop_ip(hop)
+            asn = hop.get('asn')
+            baseline = baselines.get(hop_n)
+            if baseline is not None and baseline.ip != ip:
+                changes.append(('ip', hop_n, baseline.ip, ip))
+                if asn != baseline.asn:
+                    changes.append(('asn', hop_n, baseline.asn, asn))
+                #A different router, its baseline has to be learnt again
+                baseline = None
+            if baseline is None:
+                baseline = baselines[hop_n] = HopBaseline(ip, asn)
+            loss_deviating[hop_n] = False
+            if baseline.n >= self.warmup:
+                if hop['Loss%'] - baseline.loss > self.loss_threshold:
+                    loss_deviating[hop_n] = True
+                    deviations.append((hop_n, 'Loss%', hop['Loss%'], baseline.loss))
+                if hop['Avg'] - baseline.avg > max(self.latency_threshold*baseline.avg_var**0.5, self.min_latency_change):
+                    deviations.append((hop_n, 'Avg', hop['Avg'], baseline.avg))
+            baseline.update(hop['Loss%'], hop['Avg'], self.alpha)
+        #Hops which aren't in the path anymore
+        for hop_n in [n for n in baselines if n not in hops]:
+            del baselines[hop_n]
+        self.paths[destination] = baselines
+        lossy_hop = None
+        if hops and loss_deviating[max(hops)]:
+            for hop_n in sorted(loss_deviating):
+                if loss_deviating[hop_n]:
+                    lossy_hop = hop_n
+                    break
+        return {'changes': changes, 'deviations': deviations, 'lossy_hop': lossy_hop}
+
+class Hop(object):
+    """
+    Parses each line of the mtr result, used to parse and extract info for the MTR class
+    """
+    __slots__ = ('hop_info',)
+
+    def __init__(self, hop_data):
+        self.hop_info = {}        
+        self.parse(hop_data)
+        
+    def parse(self, hop_data):
+        parsed_hop = hop_data.split()
+        self.hop_info = {'count' : int(parsed_hop[0]),
+                         'Loss%' : float(parsed_hop[-7].replace('%','')),
+                         'Snt' : int(parsed_hop[-6]),
+                         'Last' : float(parsed_hop[-5]),
+                         'Avg' : float(parsed_hop[-4]),
+                         'Best' : float(parsed_hop[-3]),
+                         'Wrst' : float(parsed_hop[-2]),
+                         'StDev' : float(parsed_hop[-1])}
+        #Consider everyting after num and before loss data as part of the hop details for ip/name
+        # The IP details almost always appears as name(IP), with IP/name being optional
+        # if there is none, it will be ???
+        self.hop_info.update(self.get_ip_name(parsed_hop[1:-7]))
+
+    def set_hop_info(self, key, value):
+        self.hop_info[key] = value
+        
+    def get_hop_info(self):
+        return self.hop_info
+
+    def get_ip_name(self, data):
+        #If we have only one element passed, then it is highly likely it's just IP without name
+        if len(data) == 1:
+            name = '-'
+            ip = data[0]
+        else:
+            name = data[0]
+            ip = data[1].strip('()')
+        return {'name' : name, 'ip': ip}
+
+
+def hop_ip(hop):
+    """IP of the hop, from the parsed text report (ip) or mtr's json (host, which can be name (ip))"""
+    if 'ip' in hop:
+        return hop['ip']
+    host = hop.get('host', '')
+    if '(' in host:
+        return host[host.index('(')+1:].rstrip(')')
+    return host
+
+def hop_name(hop):
+    """Name of the hop, from the parsed text report (name) or mtr's json (host), - if it has none"""
+    if 'name' in hop:
+        return hop['name']
+    host = hop.get('host', '')
+    if '(' in host:
+        return host[:host.index('(')].strip()
+    return '-'
+
+def enrich_traces(traces, asn_lookup=get_ip_asn_data, geo_lookup=None):
+    """
+    Annotate the hops of many traces with asn, company and the distance (km) from the previous
+    located hop.
+
+    The unique hop IPs across all the traces are collected first and each one is resolved only
+    once, with a single call to asn_lookup and geo_lookup. The distances of all the hop pairs are
+    then computed in one batch.
+
+    Parameters
+    ----------
+    traces: list
+       MTR objects whose mtr_results are populated
+    asn_lookup: callable
+       takes a set of IPs and returns ip -> {'asnum', 'company', ...}, like util.get_ip_asn_data
+       or ASNCache.get
+    geo_lookup: callable or dict
+       IP -> (latitude, longitude), distances are None when it's not given or the IP is unknown
+
+    Returns
+    -------
+    list
+       the same traces
+    """
+    ips = set()
+    for trace in traces:
+        for hop in trace.mtr_results.values():
+            ip = hop_ip(hop)
+            if ip and ip != '???':
+                ips.add(ip)
+    asn_data = asn_lookup(ips) if ips else {}
+    if geo_lookup is None:
+        geo = {}
+    elif callable(geo_lookup):
+        geo = geo_lookup(ips) if ips else {}
+    else:
+        geo = geo_lookup
+    #Gather the pairs of consecutive hops with a known location, to compute their distance in one go
+    pairs = []
+    p1s = []
+    p2s = []
+    for trace in traces:
+        prev = None
+        for hop_n in sorted(trace.mtr_results):
+            hop = trace.mtr_results[hop_n]
+            ip = hop_ip(hop)
+            info = asn_data.get(ip, {})
+            hop['asn'] = info.get('asnum')
+            hop['company'] = info.get('company')
+            hop['distance'] = None
+            loc = geo.get(ip)
+            if loc and prev:
+                pairs.append(hop)
+                p1s.append(prev)
+                p2s.append(loc)
+            #Hops without a location (??? or unknown) are skipped over
+            if loc:
+                prev = loc
+    for hop, distance in zip(pairs, haversine_batch(p1s, p2s)):
+        hop['distance'] = distance
+    return traces
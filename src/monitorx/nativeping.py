@@ -0,0 +1,311 @@
+import heapq
+import selectors
+import socket
+import struct
+import time
+from array import array
+from collections import deque
+from .ratecontrol import AdaptivePolicy, TokenBucket, budget
+
+#In-process pinger, many destinations are pinged from one event loop over a few sockets
+#instead of forking a ping per destination.
+#
+#icmp: unprivileged ICMP datagram sockets (SOCK_DGRAM, IPPROTO_ICMP), one per address family.
+#      On Linux the group of the process must be in net.ipv4.ping_group_range.
+#udp:  fallback when ICMP sockets aren't allowed, a datagram is sent to a closed high port on
+#      a connected UDP socket and the ICMP port unreachable it triggers comes back as
+#      ECONNREFUSED. Only hosts which answer with port unreachable (not filtered) are seen.
+#      It takes a socket per target while the target is being pinged.
+
+ICMP_ECHO = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ICMP_ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+ICMP_PROTO = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+UDP_PORT = 33434
+
+def checksum(data):
+    """Internet checksum (RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!{}H'.format(len(data)//2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def echo_request(family, seq, payload):
+    """ICMP echo request, the identifier is set by the kernel for datagram sockets"""
+    packet = struct.pack('!BBHHH', ICMP_ECHO[family], 0, 0, 0, seq) + payload
+    #Only ICMPv4 needs the checksum, the kernel fills in the ICMPv6 one
+    if family == socket.AF_INET:
+        packet = packet[:2] + struct.pack('!H', checksum(packet)) + packet[4:]
+    return packet
+
+def parse_echo_reply(family, data):
+    """Sequence number of an ICMP echo reply, None for any other message"""
+    #Some platforms (macOS) hand over the IPv4 header too, an ICMP message never starts with 0x4_
+    if family == socket.AF_INET and data and data[0] >> 4 == 4:
+        data = data[(data[0] & 0x0f)*4:]
+    if len(data) < 8:
+        return None
+    kind, _, _, _, seq = struct.unpack_from('!BBHHH', data)
+    if kind != ICMP_ECHO_REPLY[family]:
+        return None
+    return seq
+
+def resolve(target):
+    """(family, sockaddr) of the target, None if it can't be resolved"""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, target)
+            return family, (target, 0)
+        except (OSError, TypeError):
+            pass
+    try:
+        family, _, _, _, sockaddr = socket.getaddrinfo(target, None, type=socket.SOCK_DGRAM)[0]
+    except (socket.gaierror, UnicodeError, IndexError):
+        #UnicodeError: names which aren't valid IDNA, like a..b
+        return None
+    return family, sockaddr
+
+def icmp_available(family=socket.AF_INET):
+    try:
+        socket.socket(family, socket.SOCK_DGRAM, ICMP_PROTO[family]).close()
+    except OSError:
+        return False
+    return True
+
+class Pinger(object):
+    """
+    Pings many destinations concurrently from a single selectors loop.
+
+        samples = Pinger().ping(['1.1.1.1', '8.8.8.8'], count=10)
+
+    Every target is sent count echo requests, interval seconds apart, the targets are spread
+    over the interval so the packets don't all go out at once. rate caps the packets per second
+    across all the targets (the budget shared by all the probes caps them too when it's set,
+    see ratecontrol.set_budget).
+    """
+    def __init__(self, mode='auto', wait=2.0, rate=None, payload_size=56):
+        """
+        Input:
+        mode: str
+           icmp, udp, or auto (icmp if the ICMP sockets are allowed, else udp)
+
+        wait: float
+           seconds to wait for the reply of each packet
+
+        rate: float
+           maximum packets per second, across all the targets
+
+        payload_size: int
+           bytes of payload in each packet, same as ping's -s
+        """
+        if mode == 'auto':
+            mode = 'icmp' if icmp_available() else 'udp'
+        self.mode = mode
+        self.wait = wait
+        self.rate = rate
+        self.payload = bytes(payload_size)
+        self.seq = 0
+
+    def ping(self, targets, count=10, interval=1.0, deadline=None, policy=None):
+        """
+        Parameters
+        ----------
+        targets: list
+           IPs or host names
+        count: int
+           packets per target
+        interval: float
+           seconds between the packets to each target
+        deadline: float
+           seconds after which no more packets are sent and the replies aren't waited for
+        policy: AdaptivePolicy
+           to decide the number of packets per target from its replies, count for all without
+
+        Returns
+        -------
+        list
+           for each target, {'sent': int, 'times': array('d') of RTTs in ms, 'seqs': array('q')
+           of the sequence numbers (from 1) of the replies}. The targets which can't be resolved
+           are not pinged, they come back with all count packets lost and an 'error'.
+        """
+        targets = list(targets)
+        results = [{'sent': 0, 'times': array('d'), 'seqs': array('q')} for _ in targets]
+        addrs = [resolve(t) for t in targets]
+        for i, addr in enumerate(addrs):
+            if addr is None:
+                results[i]['sent'] = count
+                results[i]['error'] = 'cannot resolve {}'.format(targets[i])
+        selector = selectors.DefaultSelector()
+        sockets = {} #family (icmp) or target index (udp) -> socket
+        outstanding = {} #(ip, seq) (icmp) or target index (udp) -> (target index, round, sent at)
+        sent_order = deque() #(sent at, key), to expire the unanswered packets in order
+        inflight = [0]*len(targets) #packets of each target not answered or given up on yet
+        finished = [False]*len(targets) #no more packets to send to the target
+
+        def done(i):
+            #The udp sockets are closed as soon as their target is done, to bound the open files
+            if finished[i] and not inflight[i] and i in sockets and self.mode == 'udp':
+                selector.unregister(sockets[i])
+                sockets.pop(i).close()
+
+        def resolved(i):
+            inflight[i] -= 1
+            done(i)
+
+        start = time.perf_counter()
+        end = start + deadline if deadline else None
+        bucket = budget() or (TokenBucket(self.rate, 1, start) if self.rate else None)
+        policy = AdaptivePolicy.get(policy)
+        limit = (policy.max_count or 3*count) if policy else count
+        spread = interval/len(targets) if targets else 0
+        #(due, target index, round)
+        schedule = [(start + i*spread, i, 0) for i, addr in enumerate(addrs) if addr and count]
+        heapq.heapify(schedule)
+        try:
+            while schedule or outstanding:
+                now = time.perf_counter()
+                if end and now >= end:
+                    break
+                #Give up on the packets which weren't answered in time, before sending so
+                #that a udp target waiting on its packet in flight can go on
+                while sent_order and sent_order[0][0] + self.wait <= now:
+                    sent_at, key = sent_order.popleft()
+                    if key in outstanding and outstanding[key][2] == sent_at:
+                        resolved(outstanding.pop(key)[0])
+                #Send what's due, as the rate allows
+                while schedule and schedule[0][0] <= now:
+                    due, i, n = heapq.heappop(schedule)
+                    if self.mode == 'udp' and i in outstanding:
+                        #One packet in flight per udp socket, the refusal can't be told apart
+                        heapq.heappush(schedule, (outstanding[i][2] + self.wait, i, n))
+                        continue
+                    if policy and not policy.more(results[i]['sent'] - inflight[i], results[i]['times'], count):
+                        finished[i] = True
+                        done(i)
+                        continue
+                    if bucket and not bucket.take(now):
+                        heapq.heappush(schedule, (due, i, n))
+                        break
+                    key = self.send(selector, sockets, addrs[i], i, now)
+                    results[i]['sent'] += 1
+                    if key is not None:
+                        inflight[i] += 1
+                        outstanding[key] = (i, n, now)
+                        sent_order.append((now, key))
+                    if n + 1 < limit:
+                        heapq.heappush(schedule, (due + interval, i, n + 1))
+                    else:
+                        finished[i] = True
+                        done(i)
+                #The answered packets stay in sent_order until they expire, nothing to wait for then
+                timeouts = [self.wait + sent_order[0][0]] if sent_order and outstanding else []
+                if schedule:
+                    due = schedule[0][0]
+                    timeouts.append(max(due, now + bucket.wait(now)) if bucket and due <= now else due)
+                if not timeouts:
+                    #Nothing left to send or to wait for
+                    break
+                if end:
+                    timeouts.append(end)
+                timeout = max(min(timeouts) - time.perf_counter(), 0)
+                for key, _ in selector.select(timeout):
+                    for i in self.receive(key.fileobj, key.data, outstanding, results):
+                        resolved(i)
+        finally:
+            selector.close()
+            for sock in sockets.values():
+                sock.close()
+        return results
+
+    def send(self, selector, sockets, addr, i, now):
+        """Send a packet to the target i, returns the key its reply will be matched with"""
+        family, sockaddr = addr
+        if self.mode == 'icmp':
+            sock = sockets.get(family)
+            if sock is None:
+                try:
+                    sock = socket.socket(family, socket.SOCK_DGRAM, ICMP_PROTO[family])
+                except OSError:
+                    #ICMP sockets of that family aren't allowed (or no IPv6), the packet is lost
+                    return None
+                sockets[family] = sock
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ, family)
+            self.seq = (self.seq + 1) & 0xffff
+            try:
+                sock.sendto(echo_request(family, self.seq, self.payload), sockaddr)
+            except OSError:
+                #Unreachable network ... the packet is lost
+                return None
+            return (sockaddr[0], self.seq)
+        sock = sockets.get(i)
+        if sock is None:
+            try:
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+            except OSError:
+                #Out of file descriptors, the packet is counted as lost
+                return None
+            sockets[i] = sock
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, i)
+            try:
+                sock.connect((sockaddr[0], UDP_PORT) + tuple(sockaddr[2:]))
+            except OSError:
+                return None
+        try:
+            sock.send(self.payload)
+        except ConnectionRefusedError:
+            #Refusal of a packet which was given up on, this one still went out
+            try:
+                sock.send(self.payload)
+            except OSError:
+                return None
+        except OSError:
+            return None
+        return i
+
+    def receive(self, sock, data, outstanding, results):
+        """
+        Match the replies waiting on the socket to the packets in flight
+
+        Returns
+        -------
+        list
+           indexes of the targets whose packets were answered (or found to be lost)
+        """
+        done = []
+        while True:
+            now = time.perf_counter()
+            try:
+                if self.mode == 'icmp':
+                    packet, sockaddr = sock.recvfrom(65536)
+                    seq = parse_echo_reply(data, packet)
+                    if seq is None:
+                        continue
+                    key = (sockaddr[0], seq)
+                else:
+                    key = data
+                    sock.recv(65536) #Something is listening on the port, that's an answer too
+            except (BlockingIOError, InterruptedError):
+                return done
+            except ConnectionRefusedError:
+                #Port unreachable from the host, the udp ping's reply
+                key = data
+            except OSError:
+                #Host/network unreachable, the packet is lost
+                if self.mode == 'udp' and data in outstanding:
+                    done.append(outstanding.pop(data)[0])
+                return done
+            packet = outstanding.pop(key, None)
+            if packet is None:
+                #Late or duplicate reply
+                if self.mode == 'udp':
+                    return done
+                continue
+            i, n, sent_at = packet
+            results[i]['times'].append((now - sent_at)*1000)
+            results[i]['seqs'].append(n + 1)
+            done.append(i)
+            if self.mode == 'udp':
+                return done
@@ -0,0 +1,208 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from .metrics import stage
+
+#Parsing large curl traces and mtr reports is CPU bound and holds the GIL, so with many probes
+#running it's done in a pool of worker processes. The raw outputs are handed to the workers
+#through shared memory instead of being pickled down the pool's pipe, and only the parsed
+#results (the records below) come back.
+
+MTRRecord = namedtuple('MTRRecord', ['mtr_results', 'mtr_meta', 'lossy_hop', 'timestamp', 'headers'])
+PingRecord = namedtuple('PingRecord', ['ping_results', 'seqs', 'seq_base'])
+CurlRecord = namedtuple('CurlRecord', ['curl_conn_data', 'req_hdr', 'resp_hdr', 'd', 'ssl_hs_data', 'conn_data',
+                                       'log', 'ssl_hs_raw'])
+
+def read_payload(payload):
+    """The raw output, from the shared memory block when it's passed as ('shm', name, size)"""
+    if not isinstance(payload, tuple):
+        return payload
+    from multiprocessing.shared_memory import SharedMemory
+    _, name, size = payload
+    shm = SharedMemory(name=name)
+    try:
+        with shm.buf[:size] as view:
+            return str(view, 'utf-8')
+    finally:
+        shm.close()
+
+def parse_payload(kind, payload, extra=None):
+    """
+    Parse a raw output in the worker process
+
+    Parameters
+    ----------
+    kind: str
+       mtr, mtr_text, ping or curl
+    payload: str or tuple
+       the output, or where to find it in shared memory
+    extra: str
+       curl's stdout (the -w timings), its stderr is the payload
+
+    Returns
+    -------
+    namedtuple
+       MTRRecord, PingRecord or CurlRecord
+    """
+    raw = read_payload(payload)
+    if kind in ('mtr', 'mtr_text'):
+        from .mtrx import MTR
+        m = MTR()
+        m.mtr_raw = raw
+        m.parse_mtr('json' if kind == 'mtr' else 'text')
+        m.find_lossy_hop()
+        m.update_mtr_loss_info()
+        return MTRRecord(m.mtr_results, m.mtr_meta, m.lossy_hop,
+                         getattr(m, 'timestamp', None), getattr(m, 'headers', None))
+    if kind == 'ping':
+        from .pingx import Ping
+        p = Ping(None)
+        p.ping_raw = raw
+        p.parse_output()
+        return PingRecord(p.ping_results, p.seqs, p.seq_base)
+    if kind == 'curl':
+        from .curlx import Curl
+        c = Curl('')
+        c.lograw = raw
+        c.out = extra
+        c.parse_log()
+        #No -w timings are passed for a failed transfer
+        if c.out:
+            c.parse_out()
+        c.clean_conn_data()
+        return CurlRecord(c.curl_conn_data, c.req_hdr, c.resp_hdr, c.d, c.ssl_hs_data, c.conn_data,
+                          c.log, c.ssl_hs_raw)
+    raise ValueError('Unknown kind of output {!r}'.format(kind))
+
+class ParsePool(object):
+    """
+    Pool of worker processes which parse the raw outputs of the probes, so that the parsing
+    of many probes runs on all the cores instead of one.
+
+        with ParsePool() as pool:
+            scheduler = Scheduler(max_workers=256, parse_pool=pool)
+            for result in scheduler.sweep(Curl, urls):
+                ...
+
+    or, for outputs which have already been collected
+        records = list(pool.map('curl', lograws, outs))
+    """
+    def __init__(self, max_workers=None, min_shared=65536):
+        """
+        Input:
+        max_workers: int
+           worker processes, the number of CPUs by default
+
+        min_shared: int
+           outputs of this many bytes or more are passed through shared memory, the smaller
+           ones are cheaper to pickle
+        """
+        self.min_shared = min_shared
+        try:
+            from multiprocessing import resource_tracker
+            from multiprocessing.shared_memory import SharedMemory
+            #The workers have to share our resource tracker, else each of them starts its own
+            #which takes the blocks they open for leaks and unlinks them when it exits
+            resource_tracker.ensure_running()
+        except ImportError:
+            #Python < 3.8, everything is pickled
+            SharedMemory = None
+        self.SharedMemory = SharedMemory
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def submit(self, kind, raw, extra=None):
+        """
+        Parse a raw output in the pool, see parse_payload
+
+        Returns
+        -------
+        Future
+           of the MTRRecord, PingRecord or CurlRecord
+        """
+        data = raw.encode('utf-8')
+        if self.SharedMemory is None or len(data) < self.min_shared:
+            return self.executor.submit(parse_payload, kind, raw, extra)
+        shm = self.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            future = self.executor.submit(parse_payload, kind, ('shm', shm.name, len(data)), extra)
+        except BaseException:
+            release(shm)
+            raise
+        #The block is freed once the worker is done with it
+        future.add_done_callback(lambda _: release(shm))
+        return future
+
+    def map(self, kind, raws, extras=None):
+        """Records of many raw outputs of one kind, in their order"""
+        extras = extras or [None]*len(raws)
+        futures = [self.submit(kind, raw, extra) for raw, extra in zip(raws, extras)]
+        for future in futures:
+            yield future.result()
+
+    def run(self, probe):
+        """
+        Same as probe.run(), except that the output of the tool is parsed in the pool. The
+        calling thread waits for the parsed results, without holding the GIL. Probes with the
+        native backend run no tool, they are run as they are.
+        """
+        if getattr(probe, 'backend', None) == 'native':
+            probe.run()
+        elif hasattr(probe, 'mtr_results'):
+            with stage('mtr', 'run'):
+                probe.run_mtr()
+            with stage('mtr', 'parse'):
+                apply(probe, self.submit('mtr', probe.mtr_raw).result())
+        elif hasattr(probe, 'ping_results'):
+            with stage('ping', 'run'):
+                probe.run_ping()
+            with stage('ping', 'parse'):
+                apply(probe, self.submit('ping', probe.ping_raw).result())
+        elif hasattr(probe, 'curl_conn_data') and not probe.session:
+            with stage('curl', 'run'):
+                probe.get_url()
+            with stage('curl', 'parse'):
+                apply(probe, self.submit('curl', probe.lograw, probe.out if probe.error is None else '').result())
+        else:
+            #Nothing to parse (curl sessions) or not a probe this knows of
+            probe.run()
+        return probe
+
+def release(shm):
+    shm.close()
+    shm.unlink()
+
+def apply(probe, record):
+    """Set the parsed results of a record on the probe, as if it had parsed its output itself"""
+    if isinstance(record, MTRRecord):
+        probe.mtr_results = record.mtr_results
+        probe.mtr_meta = record.mtr_meta
+        probe.lossy_hop = record.lossy_hop
+        #The json reports have no timestamp, the one from run_mtr is kept
+        if record.timestamp:
+            probe.timestamp = record.timestamp
+        if record.headers:
+            probe.headers = record.headers
+    elif isinstance(record, PingRecord):
+        probe.ping_results = record.ping_results
+        probe.times = record.ping_results['times']
+        probe.seqs = record.seqs
+        probe.seq_base = record.seq_base
+    elif isinstance(record, CurlRecord):
+        probe.curl_conn_data = record.curl_conn_data
+        probe.req_hdr = record.req_hdr
+        probe.resp_hdr = record.resp_hdr
+        probe.d = record.d
+        probe.ssl_hs_data = record.ssl_hs_data
+        probe.conn_data = record.conn_data
+        probe.log = record.log
+        probe.ssl_hs_raw = record.ssl_hs_raw
+    return probe
@@ -0,0 +1,306 @@
+import re
+from array import array
+from math import sqrt
+from .util import run_command, async_run_command, AsyncCommand
+from .stats import rtt_stats
+from .metrics import stage
+
+# 64 bytes from 1.1.1.1: icmp_seq=40 ttl=253 time=95.450 ms
+reply_re = re.compile(r'icmp_seq=(\d+) ttl=(\d+) time=([0-9.]+)')
+
+def seq_base(header):
+    """
+    Sequence number of the first packet from ping's first line, BSD/macOS (and busybox) ping
+    count from 0
+     PING 1.1.1.1 (1.1.1.1) 56(84) bytes of data.   (Linux, from 1)
+     PING 1.1.1.1 (1.1.1.1): 56 data bytes          (BSD, from 0)
+    """
+    return 0 if header.rstrip().endswith('data bytes') else 1
+
+class RunningStats(object):
+    """
+    Keeps min/avg/max/stddev of the RTTs updated in O(1) per sample (Welford's algorithm),
+    without holding on to the samples.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta/self.n
+        self.m2 += delta*(x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    @property
+    def stddev(self):
+        #ping reports the population stddev
+        if not self.n:
+            return None
+        return sqrt(self.m2/self.n)
+
+class Ping(object):
+    def __init__(self, source, count=10, timeout=None, backend='subprocess', interval=1.0, policy=None):
+        """
+        Input:
+        source: str
+           host to ping
+
+        count: int
+           packets to send
+
+        timeout: int or float
+           seconds after which the ping is stopped
+
+        backend: str
+           subprocess runs the ping command, native pings from this process (nativeping)
+
+        interval: float
+           seconds between the packets with the native backend, ping's default is 1s
+
+        policy: ratecontrol.AdaptivePolicy or True (the default policy)
+           with the native backend, stop before count packets once the loss and RTT are known
+           well enough, and send more while there's loss
+        """
+        self.source = source
+        self.count = count
+        self.timeout = timeout
+        self.backend = backend
+        self.interval = interval
+        self.policy = policy
+        self.ping_results = {}
+        self.times = array('d') #RTT samples of the last run
+        self.seqs = array('q') #sequence numbers of those samples
+        self.seq_base = 1 #sequence number of the first packet, 0 with BSD ping
+        self.subscribers = [] #callbacks for the per packet events in streaming mode
+        self.reset_stream()
+
+    def run(self):
+        if self.backend == 'native':
+            with stage('ping', 'native'):
+                self.run_native()
+            return None
+        with stage('ping', 'run'):
+            self.run_ping()
+        with stage('ping', 'parse'):
+            self.parse_output()
+
+    def run_native(self, pinger=None):
+        """Ping from this process with a nativeping.Pinger, ping_results is the same as with ping"""
+        from .nativeping import Pinger
+        pinger = pinger or Pinger()
+        self.load_samples(pinger.ping([self.source], self.count, self.interval, deadline=self.timeout,
+                                      policy=self.policy)[0])
+
+    @classmethod
+    def run_many(cls, targets, count=10, interval=1.0, timeout=None, pinger=None, policy=None):
+        """
+        Ping many targets at once from one event loop, see nativeping.Pinger
+
+        Returns
+        -------
+        list
+           Ping objects with their ping_results, in the order of targets
+        """
+        from .nativeping import Pinger
+        pinger = pinger or Pinger()
+        pings = [cls(target, count=count, timeout=timeout, backend='native', interval=interval, policy=policy)
+                 for target in targets]
+        with stage('ping', 'native'):
+            samples = pinger.ping(targets, count, interval, deadline=timeout, policy=policy)
+        for ping, sample in zip(pings, samples):
+            ping.load_samples(sample)
+        return pings
+
+    def load_samples(self, samples):
+        self.times = samples['times']
+        self.seqs = samples['seqs']
+        self.set_results(samples['sent'], len(self.times))
+        if 'error' in samples:
+            self.ping_results['error'] = samples['error']
+
+    async def arun(self):
+        if self.backend == 'native':
+            #The pinger runs its own selectors loop, it's run in a thread not to block this one
+            import asyncio
+            await asyncio.get_event_loop().run_in_executor(None, self.run)
+            return None
+        with stage('ping', 'run'):
+            await self.arun_ping()
+        with stage('ping', 'parse'):
+            self.parse_output()
+
+    def get_command(self):
+        return 'ping -c {} {}'.format(self.count, self.source)
+
+    def run_stream(self):
+        """
+        Streaming mode, the ping output is consumed line by line as ping writes it.
+        Subscribers are called for every reply and the running stats are available
+        from get_live_results() while ping is still running. The RTTs are not kept,
+        so ping_results['times'] will be an empty array.
+        """
+        import asyncio
+        asyncio.run(self.arun_stream())
+
+    async def arun_stream(self):
+        self.reset_stream()
+        async with AsyncCommand(self.get_command(), timeout=self.timeout) as command:
+            #Nothing much is written to stderr by ping, only stdout needs to be read
+            async for line in command.stdout_lines():
+                self.feed(line)
+        if self.summary is None and self.first_seq is None:
+            self.set_no_output()
+        else:
+            self.ping_results = self.get_live_results()
+
+    def subscribe(self, callback):
+        """
+        Register callback(ping, packet) to be called for each reply in the streaming mode.
+        packet is a dict with seq, ttl and time (in ms) of the reply.
+        """
+        self.subscribers.append(callback)
+
+    def reset_stream(self):
+        self.stats = RunningStats()
+        self.seqs = array('q') #the sequence numbers are kept for the loss bursts, not the RTTs
+        self.first_seq = None
+        self.last_seq = None
+        self.summary = None
+
+    def feed(self, line):
+        """Update the running stats with a line of ping's output"""
+        if 'bytes from' in line:
+            if '(DUP!)' in line:
+                return None
+            m = reply_re.search(line)
+            if not m:
+                return None
+            seq = int(m.group(1))
+            time = float(m.group(3))
+            if self.first_seq is None:
+                self.first_seq = seq
+            if self.last_seq is None or seq > self.last_seq:
+                self.last_seq = seq
+            self.seqs.append(seq)
+            self.stats.add(time)
+            if self.subscribers:
+                packet = {'seq': seq, 'ttl': int(m.group(2)), 'time': time}
+                for callback in self.subscribers:
+                    callback(self, packet)
+        #100 packets transmitted, 59 packets received, +2 duplicates, 41.0% packet loss
+        elif 'packets transmitted' in line:
+            info = line.split()
+            self.summary = (int(info[0]), int(info[3]))
+        elif line.startswith('PING '):
+            self.seq_base = seq_base(line)
+
+    def get_live_results(self):
+        """ping_results computed from what has been streamed so far"""
+        if self.summary:
+            sent, recv = self.summary
+        else:
+            #Packets sent so far is estimated from the sequence numbers of the replies
+            sent = self.last_seq - self.seq_base + 1 if self.first_seq is not None else 0
+            recv = self.stats.n
+        loss = round(float((sent-recv)/sent), 2) if sent else 0.0
+        return {'sent': sent,
+                'recv': recv,
+                'loss': loss,
+                'min': self.stats.min,
+                'avg': self.stats.mean if self.stats.n else None,
+                'max': self.stats.max,
+                'stddev': self.stats.stddev,
+                'times': array('d')}
+
+    def run_ping(self):
+        result = run_command(self.get_command(), timeout=self.timeout)
+        self.ping_raw = result[0]
+
+    async def arun_ping(self):
+        result = await async_run_command(self.get_command(), timeout=self.timeout)
+        self.ping_raw = result[0]
+
+    def parse_output(self):
+        """
+        Parse ping's output into ping_results. The RTTs are kept as floats in a typed array
+        (self.times, along with their sequence numbers in self.seqs) and the stats are
+        computed from those samples.
+        """
+        self.times = array('d')
+        self.seqs = array('q')
+        self.seq_base = 1
+        summary = None
+        rtt = None
+        for line in self.ping_raw.split('\n'):
+            #To Handle these lines
+            # 64 bytes from 1.1.1.1: icmp_seq=40 ttl=253 time=95.450 ms
+            # 64 bytes from 1.1.1.1: icmp_seq=40 ttl=253 time=98.275 ms (DUP!)
+            # 64 bytes from 1.1.1.1: icmp_seq=41 ttl=253 time=96.287 ms
+            if 'bytes from' in line and '(DUP!)' not in line:
+                m = reply_re.search(line)
+                if m:
+                    self.seqs.append(int(m.group(1)))
+                    self.times.append(float(m.group(3)))
+            #100 packets transmitted, 59 packets received, +2 duplicates, 41.0% packet loss
+            elif 'packets transmitted' in line:
+                info = line.split()
+                summary = (int(info[0]), int(info[3]))
+            #rtt min/avg/max/mdev = 10.114/11.980/13.962/1.107 ms (Linux)
+            #round-trip min/avg/max/stddev = 10.114/11.980/13.962/1.107 ms (BSD, macOS)
+            elif line.startswith(('rtt ', 'round-trip ')):
+                rtt = [float(v) for v in line.partition('=')[2].split()[0].split('/')]
+            elif line.startswith('PING '):
+                self.seq_base = seq_base(line)
+        if summary:
+            sent, recv = summary
+        elif self.seqs:
+            #ping was killed before it could print the summary
+            sent = max(self.seqs) - self.seq_base + 1
+            recv = len(self.times)
+        else:
+            self.set_no_output()
+            return None
+        self.set_results(sent, recv)
+        if rtt and not self.times:
+            #Quiet (-q) output, only the summary has the RTTs
+            self.ping_results.update(zip(('min', 'avg', 'max', 'stddev'), rtt))
+
+    def set_no_output(self):
+        """
+        ping gave neither replies nor its summary (unknown host, no ping command, killed at
+        once), the count packets are taken as lost, as the native backend does
+        """
+        self.set_results(self.count, 0)
+        self.ping_results['error'] = 'no replies or summary from ping'
+
+    def set_results(self, sent, recv):
+        """ping_results from the RTT samples"""
+        stats = rtt_stats(self.times, sent=sent, percentiles=())
+        self.ping_results = {'sent': sent,
+                             'recv': recv,
+                             'loss': round(float((sent-recv)/sent), 2) if sent else 0.0,
+                             'min': stats['min'],
+                             'avg': stats['avg'],
+                             'max': stats['max'],
+                             'stddev': stats['stddev'],
+                             'times': self.times}
+
+    def get_stats(self, percentiles=(50, 90, 99)):
+        """
+        Percentiles, jitter and loss bursts over the RTT samples of the last run, see stats.rtt_stats
+        """
+        stats = rtt_stats(self.times, self.seqs, sent=self.ping_results.get('sent'), percentiles=percentiles,
+                          base=self.seq_base)
+        recv = self.ping_results.get('recv', 0)
+        if len(self.times) < recv:
+            #Streamed, the RTTs weren't kept, only the running stats are known
+            stats.update({m: self.ping_results[m] for m in ('min', 'avg', 'max', 'stddev', 'loss')}, count=recv)
+        return stats
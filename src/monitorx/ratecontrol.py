@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from math import sqrt
+
+#Rate control of the native probes (nativeping.Pinger, traceroute.TraceEngine).
+#
+#TokenBucket: paces the packets. One bucket can be shared by all the probes of the process,
+#             set_budget(pps) (or MONITORX_PPS=<pps>) caps the packets per second across all
+#             the targets, whichever probe or thread they're sent from.
+#AdaptivePolicy: decides per target whether to send more packets. Healthy and down targets
+#             are stopped as soon as that's clear from the replies so far, the targets with
+#             loss are sampled more to measure it.
+
+class TokenBucket(object):
+    """rate tokens per second, up to burst of them can be taken at once"""
+    def __init__(self, rate, burst=None, now=0.0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate/100)
+        self.tokens = self.burst
+        self.updated = now
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+            self.updated = now
+
+    def take(self, now):
+        """Take a token if there is one"""
+        with self.lock:
+            self.refill(now)
+            #Tolerance for the rounding of the refill, else a wait() can fall just short of a token
+            if self.tokens >= 1 - 1e-9:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait(self, now):
+        """Seconds until a token can be taken"""
+        with self.lock:
+            self.refill(now)
+            return max(1 - self.tokens, 0)/self.rate
+
+_budget = None
+
+def set_budget(pps, burst=None):
+    """
+    Cap the packets per second of all the native probes of the process, None to remove the cap
+
+    Returns
+    -------
+    TokenBucket
+       the shared bucket, None without a cap
+    """
+    global _budget
+    _budget = TokenBucket(pps, burst, time.perf_counter()) if pps else None
+    return _budget
+
+def budget():
+    """The shared bucket of set_budget, None when there's no cap"""
+    return _budget
+
+if os.environ.get('MONITORX_PPS'):
+    set_budget(float(os.environ['MONITORX_PPS']))
+
+def wilson_interval(lost, sent, z):
+    """Wilson score interval of the loss ratio, (low, high)"""
+    if not sent:
+        return 0.0, 1.0
+    p = lost/sent
+    z2 = z*z
+    centre = (p + z2/(2*sent))/(1 + z2/sent)
+    half = z*sqrt(p*(1 - p)/sent + z2/(4*sent*sent))/(1 + z2/sent)
+    return max(centre - half, 0.0), min(centre + half, 1.0)
+
+class AdaptivePolicy(object):
+    """
+    Early termination and extra sampling of the probes, on the confidence intervals of the
+    loss (Wilson score) and of the mean RTT.
+
+    A target is done once it's
+      down:    no replies, and the loss is above down_threshold with confidence
+      healthy: the loss is below loss_threshold and the mean RTT is known within rtt_precision
+      measured: the loss is known within +-loss_width and the mean RTT within rtt_precision
+    but no sooner than min_count packets. Targets without any loss stop at count packets at
+    the most, the ones with loss go on up to max_count. For mtr that's the loss of the
+    destination, which is also what find_lossy_hop needs to find a lossy hop.
+
+        Ping(target, count=10, backend='native', policy=AdaptivePolicy()).run()
+    """
+    def __init__(self, min_count=3, max_count=None, z=1.2816, loss_threshold=0.2,
+                 down_threshold=0.5, loss_width=0.1, rtt_precision=0.25):
+        """
+        Input:
+        min_count: int
+           packets to send before stopping
+
+        max_count: int
+           packets to send at the most to a target with loss, 3 times count by default
+
+        z: float
+           of the confidence intervals, 1.2816 for 90% confidence in each bound, 1.645 for 95%
+
+        loss_threshold: float
+           loss ratio under which a target is healthy
+
+        down_threshold: float
+           loss ratio over which a target without replies is down
+
+        loss_width: float
+           half width of the loss interval at which the loss is measured well enough
+
+        rtt_precision: float
+           half width of the mean RTT interval, relative to the mean, at which it's known well enough
+        """
+        self.min_count = min_count
+        self.max_count = max_count
+        self.z = z
+        self.loss_threshold = loss_threshold
+        self.down_threshold = down_threshold
+        self.loss_width = loss_width
+        self.rtt_precision = rtt_precision
+
+    def rtt_known(self, times):
+        n = len(times)
+        if n < 2:
+            return False
+        mean = sum(times)/n
+        if mean <= 0:
+            return True
+        stdev = sqrt(sum((t - mean)**2 for t in times)/(n - 1))
+        return self.z*stdev/sqrt(n) <= self.rtt_precision*mean
+
+    def settled(self, sent, times):
+        """If the loss and RTT of the target are known well enough from sent packets and their RTTs"""
+        received = len(times)
+        low, high = wilson_interval(sent - received, sent, self.z)
+        if not received:
+            return low >= self.down_threshold
+        if not self.rtt_known(times):
+            return False
+        return high <= self.loss_threshold or high - low <= 2*self.loss_width
+
+    def more(self, sent, times, count):
+        """
+        Parameters
+        ----------
+        sent: int
+           packets sent which were answered or given up on
+        times: list
+           RTTs of the replies
+        count: int
+           packets to send to a target without loss at the most
+
+        Returns
+        -------
+        bool
+           if more packets should be sent to the target
+        """
+        if sent < self.min_count:
+            return True
+        if len(times) < sent:
+            limit = self.max_count or 3*count
+        else:
+            limit = count
+        if sent >= limit:
+            return False
+        return not self.settled(sent, times)
+
+    @classmethod
+    def get(cls, policy):
+        """The policy for a probe's policy option: None, True (the default policy) or a policy"""
+        if policy is True:
+            return cls()
+        return policy or None
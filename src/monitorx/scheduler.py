@@ -0,0 +1,150 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class ProbeResult(object):
+    """
+    Outcome of running a single probe, handed back by the Scheduler as soon as the probe finishes
+    """
+    def __init__(self, target, probe, error=None, elapsed=None):
+        self.target = target
+        self.probe = probe
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return 'ProbeResult(target={!r}, ok={}, elapsed={})'.format(self.target, self.ok, self.elapsed)
+
+class Scheduler(object):
+    """
+    Runs the MTR, Ping and Curl probes against many targets concurrently.
+
+    The probes spend nearly all of their time waiting on the subprocess, so a pool of
+    worker threads is enough to overlap them. A whole sweep takes about as long as the
+    slowest probe rather than the sum of all of them.
+
+    arun/asweep do the same on an asyncio event loop using the probes' arun() methods,
+    which avoids a thread per subprocess for very large target lists.
+
+    With a parse_pool (parsepool.ParsePool), the outputs of the probes run by run/sweep are
+    parsed in worker processes, so that parsing doesn't serialize the threads on the GIL.
+    """
+    def __init__(self, max_workers=32, timeout=None, parse_pool=None):
+        """
+        Input:
+        max_workers: int
+           maximum number of probes running at the same time
+
+        timeout: int or float
+           per target timeout in seconds, the probe's command is killed after that.
+           Probes which already have a timeout of their own keep it.
+
+        parse_pool: ParsePool
+           pool of processes to parse the outputs in, they are parsed in the threads if None
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.parse_pool = parse_pool
+
+    def run(self, probes):
+        """
+        Run the probes and yield a ProbeResult for each of them as they finish.
+
+        Parameters
+        ----------
+        probes: list
+           list of (target, probe) tuples, probe is any object with a run() method
+           (MTR, Ping, Curl objects)
+
+        Returns
+        -------
+        generator
+           ProbeResult objects in the order of completion
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for target, probe in probes:
+                if self.timeout and getattr(probe, 'timeout', None) is None:
+                    probe.timeout = self.timeout
+                futures[executor.submit(self._run_probe, probe, self.parse_pool)] = (target, probe)
+            try:
+                for future in as_completed(futures):
+                    target, probe = futures[future]
+                    error, elapsed = future.result()
+                    yield ProbeResult(target, probe, error=error, elapsed=elapsed)
+            finally:
+                #Stopped early (break out of the for or the generator closed), the probes which
+                #haven't started aren't run, only the running ones are waited for
+                for future in futures:
+                    future.cancel()
+
+    def sweep(self, probe_class, targets, **options):
+        """
+        Build a probe of probe_class for each target and run them all.
+
+        Parameters
+        ----------
+        probe_class: class
+           MTR, Ping or Curl, the target is passed as the first argument
+        targets: list
+           destinations to probe
+        options: dict
+           any other arguments for the probe_class
+
+        Returns
+        -------
+        generator
+           ProbeResult objects in the order of completion
+        """
+        return self.run((target, probe_class(target, **options)) for target in targets)
+
+    async def arun(self, probes):
+        """
+        Same as run, but the probes are run with their arun() method on the running event loop.
+        Use it as `async for result in scheduler.arun(probes)`
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run_probe(target, probe):
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    await probe.arun()
+                except Exception as e:
+                    return ProbeResult(target, probe, error=e, elapsed=time.monotonic() - start)
+                return ProbeResult(target, probe, elapsed=time.monotonic() - start)
+
+        tasks = []
+        for target, probe in probes:
+            if self.timeout and getattr(probe, 'timeout', None) is None:
+                probe.timeout = self.timeout
+            tasks.append(asyncio.ensure_future(run_probe(target, probe)))
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            #Stopped early (break out of the async for) or failed, the probes still running are
+            #cancelled and waited for so that their commands are killed and reaped
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def asweep(self, probe_class, targets, **options):
+        """asyncio version of sweep"""
+        return self.arun((target, probe_class(target, **options)) for target in targets)
+
+    @staticmethod
+    def _run_probe(probe, parse_pool=None):
+        start = time.monotonic()
+        try:
+            if parse_pool is not None:
+                parse_pool.run(probe)
+            else:
+                probe.run()
+        except Exception as e:
+            return e, time.monotonic() - start
+        return None, time.monotonic() - start
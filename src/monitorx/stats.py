@@ -0,0 +1,143 @@
+#Statistics over RTT samples kept in typed arrays (array('d')).
+#NumPy is used when it is installed, the arrays are viewed in place with np.frombuffer
+#so that no per sample Python objects are created. Without NumPy the same values are
+#computed in plain Python. NumPy is only imported the first time it's needed.
+from array import array
+from math import sqrt, floor, ceil
+from .util import load_numpy
+
+def percentile(sorted_samples, q):
+    """
+    q-th percentile of already sorted samples, linearly interpolated (same as numpy's default)
+    """
+    if not sorted_samples:
+        return None
+    k = (len(sorted_samples) - 1) * q / 100
+    lo, hi = floor(k), ceil(k)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+def loss_bursts(seqs, sent=None, base=None):
+    """
+    Find the runs of lost packets from the sequence numbers of the received replies.
+
+    Parameters
+    ----------
+    seqs: array
+       sequence numbers of the replies, in the order received
+    sent: int
+       number of packets sent, to count the losses before the first reply and after the last
+       one too. Only the gaps between the replies are counted without it.
+    base: int
+       sequence number of the first packet, 1 on Linux, 0 with BSD/macOS ping. Without it,
+       it's 0 if there's a reply with sequence number 0, else 1.
+
+    Returns
+    -------
+    list
+       length of each run of consecutive lost packets
+    """
+    if not len(seqs):
+        return [sent] if sent else []
+    np = load_numpy()
+    if np is not None:
+        s = np.sort(np.frombuffer(seqs, dtype=np.int64) if isinstance(seqs, array) else np.asarray(seqs))
+        gaps = np.diff(s) - 1
+        bursts = gaps[gaps > 0].tolist()
+        first, last = int(s[0]), int(s[-1])
+    else:
+        s = sorted(seqs)
+        bursts = [b - a - 1 for a, b in zip(s, s[1:]) if b - a > 1]
+        first, last = s[0], s[-1]
+    if sent is None:
+        return bursts
+    if base is None:
+        base = 0 if first == 0 else 1
+    if first > base:
+        bursts.insert(0, first - base)
+    #The last packet sent is sent - 1 + base
+    if sent - 1 + base > last:
+        bursts.append(sent - 1 + base - last)
+    return bursts
+
+def rtt_stats(times, seqs=None, sent=None, percentiles=(50, 90, 99), base=None):
+    """
+    Compute the stats of the RTT samples
+
+    Parameters
+    ----------
+    times: array('d')
+       RTT samples in ms
+    seqs: array('q')
+       sequence numbers of the samples, used to find the loss bursts
+    sent: int
+       number of packets sent, used for loss
+    percentiles: tuple
+       percentiles to compute, each is reported as p<N>
+    base: int
+       sequence number of the first packet, see loss_bursts
+
+    Returns
+    -------
+    dict
+       count, min, avg, max, stddev, jitter (mean of the absolute difference between
+       consecutive RTTs), the percentiles and the loss/loss bursts
+    """
+    n = len(times)
+    result = {'count': n, 'min': None, 'avg': None, 'max': None, 'stddev': None, 'jitter': None}
+    for q in percentiles:
+        result['p{}'.format(q)] = None
+    if n:
+        np = load_numpy()
+        if np is not None:
+            t = np.frombuffer(times, dtype=np.float64) if isinstance(times, array) else np.asarray(times, dtype=np.float64)
+            result['min'] = float(t.min())
+            result['avg'] = float(t.mean())
+            result['max'] = float(t.max())
+            result['stddev'] = float(t.std())
+            result['jitter'] = float(np.abs(np.diff(t)).mean()) if n > 1 else 0.0
+            for q, v in zip(percentiles, np.percentile(t, percentiles)):
+                result['p{}'.format(q)] = float(v)
+        else:
+            s = sorted(times)
+            avg = sum(times)/n
+            result['min'] = s[0]
+            result['avg'] = avg
+            result['max'] = s[-1]
+            result['stddev'] = sqrt(sum((x - avg)**2 for x in times)/n)
+            result['jitter'] = sum(abs(b - a) for a, b in zip(times, times[1:]))/(n - 1) if n > 1 else 0.0
+            for q in percentiles:
+                result['p{}'.format(q)] = percentile(s, q)
+    bursts = loss_bursts(seqs, sent, base) if seqs is not None else []
+    result['loss_bursts'] = len(bursts)
+    result['max_loss_burst'] = max(bursts) if bursts else 0
+    if sent is not None:
+        result['sent'] = sent
+        result['loss'] = round(float((sent - n)/sent), 2) if sent else 0.0
+    return result
+
+def aggregate(pings, percentiles=(50, 90, 99)):
+    """
+    Stats across the samples of many Ping runs. The samples are concatenated array to
+    array, no per sample Python objects are built.
+
+    Parameters
+    ----------
+    pings: list
+       Ping objects which have been run
+
+    Returns
+    -------
+    dict
+       same as rtt_stats, loss bursts are counted within each run
+    """
+    times = array('d')
+    sent = 0
+    bursts = []
+    for ping in pings:
+        times.extend(ping.times)
+        sent += ping.ping_results.get('sent', 0)
+        bursts.extend(loss_bursts(ping.seqs, ping.ping_results.get('sent'), getattr(ping, 'seq_base', None)))
+    result = rtt_stats(times, sent=sent, percentiles=percentiles)
+    result['loss_bursts'] = len(bursts)
+    result['max_loss_burst'] = max(bursts) if bursts else 0
+    return result
@@ -0,0 +1,375 @@
+import heapq
+import random
+import selectors
+import socket
+import struct
+import time
+from array import array
+from collections import Counter, deque
+from math import sqrt
+from .mtrx import hop_dict
+from .nativeping import resolve
+from .ratecontrol import AdaptivePolicy, TokenBucket, budget
+
+#In-process traceroute, an alternative to running one mtr per destination. TTL limited probes
+#to all the destinations go out over one shared socket per address family, paced by a token
+#bucket (the budget shared by all the probes if one is set, see ratecontrol), and the ICMP
+#replies are matched back to their probe. The results are the same mtr_results hop dicts as
+#from mtr's report, so find_lossy_hop etc. work as they are.
+#
+#The sockets are behind a transport: UDPTransport sends real probes, SimulatedNetwork answers
+#them from a made up topology, on a virtual clock, for tests and benchmarks.
+
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+MSG_ERRQUEUE = getattr(socket, 'MSG_ERRQUEUE', 0x2000)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+#ICMP destination unreachable, the probe got to the destination (or as far as it can go)
+DEST_UNREACH = {socket.AF_INET: 3, socket.AF_INET6: 1}
+BASE_PORT = 33434
+
+class UDPTransport(object):
+    """
+    UDP probes to high ports, the replies (ICMP time exceeded from the routers, port unreachable
+    from the destination) are read from the socket's error queue (IP_RECVERR), so no privileges
+    are needed. Linux only.
+
+    Each probe goes to its own port, the error queue gives back the destination and port of
+    the probe an ICMP error is about, which is what the probes are matched with.
+    """
+    realtime = True
+
+    def __init__(self, base_port=BASE_PORT, payload_size=32):
+        self.base_port = base_port
+        self.span = 65535 - base_port
+        self.payload = bytes(payload_size)
+        self.sockets = {}
+        self.selector = selectors.DefaultSelector()
+
+    def clock(self):
+        return time.perf_counter()
+
+    def socket(self, family):
+        sock = self.sockets.get(family)
+        if sock is None:
+            sock = self.sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            else:
+                sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+            self.selector.register(sock, selectors.EVENT_READ, family)
+        return sock
+
+    def send(self, dest, ttl, seq):
+        """Send a probe, returns the key its reply will come back with (None if it couldn't be sent)"""
+        family, sockaddr = dest
+        sock = self.socket(family)
+        port = self.base_port + seq % self.span
+        try:
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            else:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+            sock.sendto(self.payload, (sockaddr[0], port) + tuple(sockaddr[2:]))
+        except OSError:
+            return None
+        return (sockaddr[0], port)
+
+    def receive(self, timeout):
+        """
+        Returns
+        -------
+        list
+           (key, IP of the hop which answered, if the destination was reached, time) of the replies
+        """
+        replies = []
+        for key, _ in self.selector.select(timeout):
+            sock, family = key.fileobj, key.data
+            while True:
+                try:
+                    _, ancdata, _, addr = sock.recvmsg(512, 512, MSG_ERRQUEUE)
+                except (BlockingIOError, InterruptedError):
+                    break
+                now = time.perf_counter()
+                for _, _, data in ancdata:
+                    if len(data) < 16:
+                        continue
+                    #struct sock_extended_err, then the address of the host which sent the ICMP
+                    _, origin, icmp_type, _, _, _, _ = struct.unpack_from('=IBBBBII', data)
+                    if origin not in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+                        continue
+                    if family == socket.AF_INET:
+                        hop = socket.inet_ntop(socket.AF_INET, data[20:24])
+                    else:
+                        hop = socket.inet_ntop(socket.AF_INET6, data[24:40])
+                    reached = icmp_type == DEST_UNREACH[family]
+                    replies.append(((addr[0], addr[1]), hop, reached, now))
+            #Anything which actually answered on the port, the destination was reached
+            while True:
+                try:
+                    _, addr = sock.recvfrom(512)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    continue
+                replies.append(((addr[0], addr[1]), addr[0], True, time.perf_counter()))
+        return replies
+
+    def close(self):
+        self.selector.close()
+        for sock in self.sockets.values():
+            sock.close()
+        self.sockets = {}
+
+class SimulatedNetwork(object):
+    """
+    Stand-in for the network, the probes are answered from routes on a virtual clock, so a
+    trace of many cycles takes no real time.
+
+        net = SimulatedNetwork({'203.0.113.9': [{'ip': '10.0.0.1', 'latency': 1},
+                                                None, #doesn't answer
+                                                {'ip': '198.51.100.1', 'latency': 12, 'loss': 0.3},
+                                                {'ip': '203.0.113.9', 'latency': 14}]})
+
+    Each hop has its latency (ms), jitter (ms) and loss (0-1), the last hop of a route is the
+    destination. Destinations without a route don't answer at all.
+    """
+    #Not on the clock of the budget shared by the probes, the engine keeps to its own rate
+    realtime = False
+
+    def __init__(self, routes, seed=0):
+        self.routes = routes
+        self.random = random.Random(seed)
+        self.now = 0.0
+        self.pending = [] #(time, n, reply)
+        self.sent = 0
+        self.n = 0
+
+    def clock(self):
+        return self.now
+
+    def send(self, dest, ttl, seq):
+        self.sent += 1
+        ip = dest[1][0]
+        key = (ip, seq)
+        route = self.routes.get(ip)
+        if not route:
+            return key
+        reached = ttl >= len(route)
+        hop = route[-1] if reached else route[ttl - 1]
+        if hop is None or self.random.random() < hop.get('loss', 0):
+            return key
+        delay = max(hop.get('latency', 1) + self.random.gauss(0, hop.get('jitter', 0)), 0)/1000
+        self.n += 1
+        heapq.heappush(self.pending, (self.now + delay, self.n, (key, hop['ip'], reached)))
+        return key
+
+    def receive(self, timeout):
+        if self.pending and self.pending[0][0] <= self.now + timeout:
+            self.now = max(self.now, self.pending[0][0])
+        else:
+            self.now += timeout
+            return []
+        replies = []
+        while self.pending and self.pending[0][0] <= self.now:
+            _, _, (key, hop, reached) = heapq.heappop(self.pending)
+            replies.append((key, hop, reached, self.now))
+        return replies
+
+    def close(self):
+        pass
+
+class HopStats(object):
+    __slots__ = ('snt', 'inflight', 'times', 'ips')
+
+    def __init__(self):
+        self.snt = 0
+        self.inflight = 0
+        self.times = array('d')
+        self.ips = Counter()
+
+    def hop_dict(self, n):
+        recv = len(self.times)
+        loss = round(100.0*(self.snt - recv)/self.snt, 1) if self.snt else 0.0
+        if not recv:
+            return hop_dict(n, '-', '???', loss, self.snt, 0.0, 0.0, 0.0, 0.0, 0.0)
+        avg = sum(self.times)/recv
+        stdev = sqrt(sum((t - avg)**2 for t in self.times)/recv)
+        return hop_dict(n, '-', self.ips.most_common(1)[0][0], loss, self.snt,
+                        round(self.times[-1], 1), round(avg, 1), round(min(self.times), 1),
+                        round(max(self.times), 1), round(stdev, 1))
+
+class TraceEngine(object):
+    """
+    Traces many destinations at once, mtr style: every cycle each destination gets a probe
+    for every TTL up to its path length (found on the way), cycles are interval seconds apart.
+
+        traces = TraceEngine(rate=2000).trace(['1.1.1.1', '8.8.8.8'], count=10)
+
+    or through MTR, MTR(destination, backend='native').run() and MTR.run_many(destinations)
+
+    With a ratecontrol.AdaptivePolicy the number of cycles is decided per destination from
+    the replies of the destination: cycles stop early once its loss and RTT are known well
+    enough, and go on past count while it shows loss (which is when find_lossy_hop finds a
+    lossy hop).
+    """
+    def __init__(self, transport=None, rate=1000, burst=None, wait=2.0, max_ttl=30, max_unknown=5):
+        """
+        Input:
+        transport: object
+           UDPTransport by default, or a SimulatedNetwork
+
+        rate: float
+           probes per second across all the destinations, unless the budget shared by all
+           the probes is set (ratecontrol.set_budget)
+
+        burst: float
+           probes which can be sent at once, rate/100 by default
+
+        wait: float
+           seconds to wait for the reply of a probe
+
+        max_ttl: int
+           farthest hop to probe
+
+        max_unknown: int
+           after the first round, hops this far past the last one which answered aren't probed
+           any more when the destination wasn't reached (mtr's --max-unknown)
+        """
+        self.transport = transport or UDPTransport()
+        self.rate = rate
+        self.burst = burst
+        self.wait = wait
+        self.max_ttl = max_ttl
+        self.max_unknown = max_unknown
+        self.seq = 0
+
+    def trace(self, destinations, count=10, interval=1.0, deadline=None, policy=None):
+        """
+        Parameters
+        ----------
+        destinations: list
+           IPs or host names
+        count: int
+           probes per hop
+        interval: float
+           seconds between the cycles of probes to each destination
+        deadline: float
+           seconds after which no more probes are sent and the replies aren't waited for
+        policy: AdaptivePolicy
+           to decide the number of cycles per destination, count for all of them without
+
+        Returns
+        -------
+        list
+           for each destination, {'hops': hop number -> hop dict (as in MTR.mtr_results),
+           'meta': dict}
+        """
+        destinations = list(destinations)
+        transport = self.transport
+        addrs = [resolve(d) for d in destinations]
+        path_len = [self.max_ttl]*len(destinations) #shrinks to the TTL the destination answered at
+        reached = [False]*len(destinations)
+        farthest = [0]*len(destinations) #farthest hop which answered
+        rounds = [0]*len(destinations) #cycles sent
+        stats = [{} for _ in destinations] #ttl -> HopStats
+        start = transport.clock()
+        end = start + deadline if deadline else None
+        bucket = (transport.realtime and budget()) or TokenBucket(self.rate, self.burst, start)
+        policy = AdaptivePolicy.get(policy)
+        limit = (policy.max_count or 3*count) if policy else count
+        #Cycles are spread over the interval per destination, (due, destination index, cycle)
+        spread = interval/len(destinations) if destinations else 0
+        cycles = [(start + i*spread, i, 0) for i, addr in enumerate(addrs) if addr and count]
+        heapq.heapify(cycles)
+        queue = deque() #(destination index, ttl) to send
+        outstanding = {} #transport key -> (destination index, ttl, sent at)
+        sent_order = deque() #(sent at, key)
+        while cycles or queue or outstanding:
+            now = transport.clock()
+            if end and now >= end:
+                break
+            while cycles and cycles[0][0] <= now:
+                due, i, n = heapq.heappop(cycles)
+                if policy and n and not policy.more(*self.progress(stats[i], path_len[i], reached[i]), count):
+                    continue
+                rounds[i] += 1
+                last = path_len[i]
+                if n and not reached[i]:
+                    last = min(last, farthest[i] + self.max_unknown)
+                queue.extend((i, ttl) for ttl in range(1, last + 1))
+                if n + 1 < limit:
+                    heapq.heappush(cycles, (due + interval, i, n + 1))
+            while queue:
+                i, ttl = queue[0]
+                if ttl > path_len[i]:
+                    #Past the destination, found after the cycle was queued
+                    queue.popleft()
+                    continue
+                if not bucket.take(now):
+                    break
+                queue.popleft()
+                self.seq += 1
+                key = transport.send(addrs[i], ttl, self.seq)
+                hop_stats = stats[i].setdefault(ttl, HopStats())
+                hop_stats.snt += 1
+                if key is not None:
+                    hop_stats.inflight += 1
+                    outstanding[key] = (i, ttl, now)
+                    sent_order.append((now, key))
+            while sent_order and sent_order[0][0] + self.wait <= now:
+                _, key = sent_order.popleft()
+                probe = outstanding.pop(key, None)
+                if probe is not None:
+                    stats[probe[0]][probe[1]].inflight -= 1
+            timeouts = []
+            if cycles:
+                timeouts.append(cycles[0][0] - now)
+            if queue:
+                timeouts.append(bucket.wait(now))
+            #The answered probes stay in sent_order until they expire, nothing to wait for then
+            if sent_order and outstanding:
+                timeouts.append(sent_order[0][0] + self.wait - now)
+            if not timeouts:
+                break
+            if end:
+                timeouts.append(end - now)
+            for key, hop, at_destination, when in transport.receive(max(min(timeouts), 0)):
+                probe = outstanding.pop(key, None)
+                if probe is None:
+                    #Late or duplicate
+                    continue
+                i, ttl, sent_at = probe
+                hop_stats = stats[i][ttl]
+                hop_stats.inflight -= 1
+                hop_stats.times.append((when - sent_at)*1000)
+                hop_stats.ips[hop] += 1
+                farthest[i] = max(farthest[i], ttl)
+                if at_destination:
+                    reached[i] = True
+                    path_len[i] = min(path_len[i], ttl)
+        return [self.build(destination, stats[i], path_len[i], reached[i], rounds[i])
+                for i, destination in enumerate(destinations)]
+
+    def progress(self, stats, path_len, reached):
+        """(probes answered or given up on, RTTs) of the destination, for the policy"""
+        if reached:
+            hop_stats = stats[path_len]
+            return hop_stats.snt - hop_stats.inflight, hop_stats.times
+        #Not reached (yet), all the probes to the destination are lost, counted off the first
+        #hop which is probed every cycle
+        hop_stats = stats.get(1)
+        return (hop_stats.snt - hop_stats.inflight if hop_stats else 0), ()
+
+    def build(self, destination, stats, path_len, reached, rounds):
+        #Without a reply from the destination, the path ends at the last hop which answered
+        answered = [ttl for ttl, s in stats.items() if s.times]
+        last = path_len if reached else max(answered, default=1)
+        hops = {ttl: stats[ttl].hop_dict(ttl) for ttl in range(1, last + 1) if ttl in stats}
+        return {'hops': hops, 'meta': {'dst': destination, 'tests': rounds, 'backend': 'native',
+                                       'reached': reached}}
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,693 @@
+import os
+from functools import lru_cache
+from .metrics import METRICS
+
+#The heavier modules (asyncio, subprocess, socket, NumPy ...) are imported in the functions
+#which need them, so that the probe scripts start fast
+
+@lru_cache(maxsize=None)
+def load_numpy():
+    """NumPy, imported on first use, or None if it isn't installed"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def run_command(command, timeout=None):
+    """
+    Runs a command in bash shell. 
+
+    This copy exists in all the parse crypts to exist as standalone.
+    So, any changes needs to be copied over to others too for consistency. :(
+
+    Parameters
+    ----------
+    command : str or list
+       command that needs to be run in the bash shell. If its a str, that command will be executed. 
+    If it's a list, the commands will be piped and the final output returned.
+
+    timeout : int or float
+       seconds to wait for the command to complete, the command is killed after that.
+
+    Returns
+    -------
+    tuple
+       1. output - output lines from the command result
+       2. error - error lines from stderr
+       3. err_code - error code of the command result
+    """
+    import shlex
+    import subprocess
+    if type(command) != list:
+        command = [command]
+    cmd = shlex.split(command[0])
+    name = os.path.basename(cmd[0]) if cmd else ''
+    METRICS.inc('monitorx_subprocess_total', len(command), command=name)
+    with METRICS.timer('monitorx_subprocess_seconds', command=name, phase='spawn'):
+        process = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        prev_process = process #Assign this process as prev_process so that the variables make sense later
+        for cmd in command[1:]:
+            cmd = shlex.split(cmd)
+            #prev_process is the process that was run before the current iteration of loop
+            process = subprocess.Popen(cmd, shell=False, stdin=prev_process.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE) 
+            prev_process.stdout.close() #Close the stdout of the previous process, as we don't need it
+            prev_process = process #Assign the process in the current iteration of the loop as the current process
+    #Handling timeouts, kill the process and collect whatever it wrote till then
+    with METRICS.timer('monitorx_subprocess_seconds', command=name, phase='wait'):
+        try:
+            result = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            METRICS.inc('monitorx_subprocess_timeouts_total', command=name)
+            process.kill()
+            result = process.communicate()
+    err_code = process.returncode
+    output = result[0].decode("utf-8")
+    error = result[1].decode("utf-8")
+    return output, error, err_code
+
+class AsyncCommand(object):
+    """
+    asyncio counterpart of run_command, so that many commands can be driven from one event loop.
+
+    Like run_command, a list of commands is piped and the output of the final command is
+    returned. Each command is started in its own process group and the whole group is killed
+    once the deadline (timeout seconds from the start) passes, so no stray children are left
+    behind. stdout/stderr of the final command can be read as async line iterators
+
+        async with AsyncCommand('ping -c 100 1.1.1.1', timeout=120) as command:
+            async for line in command.stdout_lines():
+                ...
+
+    When only one of the streams is being iterated, the other one needs to be read too (or
+    the command must not write much to it), else the command can block on a full pipe.
+    """
+    def __init__(self, command, timeout=None):
+        """
+        Input:
+        command: str or list
+           command to run, if it's a list the commands will be piped
+
+        timeout: int or float
+           seconds after which all the processes are killed
+        """
+        if type(command) != list:
+            command = [command]
+        self.command = command
+        self.timeout = timeout
+        self.processes = []
+        self.process = None
+        self.stdout = None #StreamReaders of the final command's output
+        self.stderr = None
+        self.transports = []
+        self.deadline = None
+        self.timed_out = False
+        self.name = None #first command of the pipeline, set when it's started
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.process and self.process.returncode is None:
+            self.kill()
+        try:
+            await self.wait()
+        finally:
+            self.close()
+
+    async def start(self):
+        import asyncio
+        import shlex
+        loop = asyncio.get_running_loop()
+        if self.timeout:
+            self.deadline = loop.time() + self.timeout
+        #Name of the first command, the metrics are labelled with it
+        self.name = os.path.basename(shlex.split(self.command[0])[0]) if self.command else ''
+        METRICS.inc('monitorx_subprocess_total', len(self.command), command=self.name)
+        fds = [] #our ends of the pipes, until they're closed or handed over
+        try:
+            with METRICS.timer('monitorx_subprocess_seconds', command=self.name, phase='spawn'):
+                stdin = None
+                for n, cmd in enumerate(self.command):
+                    #Only the final command's output is read, the others are piped into the next one.
+                    #It's read from pipes of our own rather than asyncio's PIPE, on Python < 3.12 a
+                    #process cancelled before its asyncio pipes are connected is never seen to exit
+                    #and the cancellation hangs.
+                    if n == len(self.command) - 1:
+                        out_fd, stdout = self.pipe(fds)
+                        err_fd, stderr = self.pipe(fds)
+                        read_fd = None
+                    else:
+                        read_fd, stdout = self.pipe(fds)
+                        stderr = asyncio.subprocess.DEVNULL
+                    process = await asyncio.create_subprocess_exec(*shlex.split(cmd), stdin=stdin, stdout=stdout,
+                                                                   stderr=stderr, start_new_session=True)
+                    self.processes.append(process)
+                    #The child has its copies of the pipe ends, close ours
+                    for fd in (stdin, stdout, stderr):
+                        if fd in fds:
+                            fds.remove(fd)
+                            os.close(fd)
+                    stdin = read_fd
+            self.stdout = await self.connect(loop, out_fd, fds)
+            self.stderr = await self.connect(loop, err_fd, fds)
+        except BaseException:
+            #Spawning failed or was cancelled half way, nothing started is left behind
+            self.kill()
+            for fd in fds:
+                os.close(fd)
+            self.close()
+            raise
+        self.process = self.processes[-1]
+        return self
+
+    @staticmethod
+    def pipe(fds):
+        read_fd, write_fd = os.pipe()
+        fds.extend((read_fd, write_fd))
+        return read_fd, write_fd
+
+    async def connect(self, loop, fd, fds):
+        """StreamReader of the read end of a pipe"""
+        import asyncio
+        reader = asyncio.StreamReader()
+        fds.remove(fd)
+        pipe = os.fdopen(fd, 'rb', 0)
+        try:
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        except BaseException:
+            pipe.close()
+            raise
+        self.transports.append(transport)
+        return reader
+
+    def close(self):
+        """Close our ends of the output pipes"""
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+
+    def kill(self):
+        """Kill the process group of every command in the pipeline"""
+        import signal
+        for process in self.processes:
+            if process.returncode is not None:
+                continue
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    async def until_deadline(self, aw):
+        """Await aw, killing the commands and raising asyncio.TimeoutError if the deadline passes"""
+        import asyncio
+        if self.deadline is None:
+            return await aw
+        remaining = max(self.deadline - asyncio.get_running_loop().time(), 0)
+        try:
+            return await asyncio.wait_for(aw, remaining)
+        except asyncio.TimeoutError:
+            if not self.timed_out:
+                METRICS.inc('monitorx_subprocess_timeouts_total', command=self.name)
+            self.timed_out = True
+            self.kill()
+            raise
+
+    async def lines(self, stream):
+        import asyncio
+        while True:
+            try:
+                line = await self.until_deadline(stream.readline())
+            except asyncio.TimeoutError:
+                break
+            if not line:
+                break
+            yield line.decode('utf-8')
+
+    def stdout_lines(self):
+        return self.lines(self.stdout)
+
+    def stderr_lines(self):
+        return self.lines(self.stderr)
+
+    async def read(self, stream):
+        import asyncio
+        chunks = []
+        while True:
+            try:
+                chunk = await self.until_deadline(stream.read(65536))
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def wait(self):
+        """Wait for all the commands to exit and return the error code of the final one"""
+        import asyncio
+        if not self.processes:
+            return None
+        try:
+            await self.until_deadline(self.process.wait())
+        except asyncio.TimeoutError:
+            pass
+        for process in self.processes:
+            await process.wait()
+        return self.process.returncode
+
+    async def communicate(self):
+        """
+        Returns
+        -------
+        tuple
+           same as run_command, output, error and err_code of the final command
+        """
+        import asyncio
+        output, error = await asyncio.gather(self.read(self.stdout), self.read(self.stderr))
+        err_code = await self.wait()
+        return output.decode("utf-8"), error.decode("utf-8"), err_code
+
+async def async_run_command(command, timeout=None):
+    """
+    asyncio version of run_command, see AsyncCommand.
+
+    Returns
+    -------
+    tuple
+       1. output - output lines from the command result
+       2. error - error lines from stderr
+       3. err_code - error code of the command result
+    """
+    async with AsyncCommand(command, timeout=timeout) as process:
+        with METRICS.timer('monitorx_subprocess_seconds', command=process.name, phase='wait'):
+            return await process.communicate()
+
+def clean_split(line):
+    return list(map(lambda x:x.strip(), line.split()))
+
+WHOIS_SERVER = ('whois.cymru.com', 43)
+
+def get_ip_asn_data(ip_set, server=WHOIS_SERVER, prefix=False, timeout=None):
+    """
+    Usage doc : https://team-cymru.com/community-services/ip-asn-mapping/
+
+    All the IPs are looked up with one bulk query.
+
+    Parameters
+    ----------
+    ip_set : iterable
+       IPs to lookup
+    server : tuple
+       (host, port) of the whois server, a local stand-in can be used for tests
+    prefix : bool
+       also get the BGP prefix the IP belongs to, it's added as 'prefix' in the results
+    timeout : int or float
+       socket timeout in seconds
+
+    Returns
+    -------
+    dict
+       ip -> {'asnum', 'ip', 'company'} (and 'prefix')
+    """
+    import socket
+    ip_set = set(ip_set)
+    if not ip_set:
+        return {}
+    METRICS.inc('monitorx_asn_lookups_total', len(ip_set))
+    with METRICS.timer('monitorx_stage_seconds', probe='asn', stage='whois'):
+        cy = socket.create_connection(server, timeout=timeout)
+        query = 'begin\n' + ('prefix\n' if prefix else 'asname,asnumber\n') + '\n'.join(ip_set) + '\nend\n'
+        cy.sendall(query.encode('utf-8'))
+        chunks = []
+        while True:
+            r = cy.recv(65536)
+            if not r:
+                break
+            chunks.append(r)
+        cy.close()
+    response = b''.join(chunks).decode('utf-8', 'replace')
+    if prefix:
+        labels = ['asnum', 'ip', 'prefix', 'company']
+    else:
+        labels = ['asnum', 'ip', 'company']
+    ip_dict = {}
+    for line in response.split('\n'):
+        if line == '' or line.startswith('Bulk'):
+            continue
+        info = [word.strip() for word in line.split('|')]
+        ip_dict[info[1]] = dict(zip(labels, info))
+        #company name in output includes the country of the company, remove it
+        ip_dict[info[1]]['company'] = ','.join(ip_dict[info[1]].get('company', '').split(',')[:-1])
+    return ip_dict
+
+def haversine(p1=None, p2=None):
+    """
+    Compute the distance between 2 points in a globe. The points are represented as a tuple
+    of latitide and longitude of the location. Code from https://stackoverflow.com/a/21623206
+
+    Parameters
+    ----------
+    p1: tuple
+       Latitude and Longitude values of point1
+
+    p2: tuple
+       Latitude and Longitude values of point2
+
+    Returns
+    -------
+    float
+       The distance between those points (calculated using the haversine formula
+    """
+    from math import asin, cos, sqrt, pi
+    lat1, lon1 = p1
+    lat2, lon2 = p2
+    p = pi/180
+    a = 0.5 - cos((lat2-lat1)*p)/2 + cos(lat1*p) * cos(lat2*p) * (1-cos((lon2-lon1)*p))/2    
+    return 12742 * asin(sqrt(a)) #2*R*asin...
+
+def haversine_arrays(lat1, lon1, lat2, lon2):
+    """haversine over NumPy arrays of latitudes and longitudes (in degrees), they are broadcast"""
+    np = load_numpy()
+    if np is None:
+        raise ImportError('haversine_arrays needs NumPy, use haversine_batch without it')
+    p = np.pi/180
+    lat1 = lat1*p
+    lat2 = lat2*p
+    a = 0.5 - np.cos(lat2-lat1)/2 + np.cos(lat1) * np.cos(lat2) * (1-np.cos((lon2-lon1)*p))/2
+    return 12742 * np.arcsin(np.sqrt(a))
+
+def haversine_batch(p1s, p2s):
+    """
+    haversine for many pairs of points in one go, vectorized with NumPy when it is installed
+
+    Parameters
+    ----------
+    p1s: list or array
+       (latitude, longitude) of the first point of each pair, N x 2
+    p2s: list or array
+       (latitude, longitude) of the second point of each pair, N x 2
+
+    Returns
+    -------
+    list
+       distance between each pair of points
+    """
+    np = load_numpy()
+    if not len(p1s):
+        return []
+    if np is None:
+        return [haversine(p1, p2) for p1, p2 in zip(p1s, p2s)]
+    a1 = np.asarray(p1s, dtype=np.float64)
+    a2 = np.asarray(p2s, dtype=np.float64)
+    return haversine_arrays(a1[:, 0], a1[:, 1], a2[:, 0], a2[:, 1]).tolist()
+
+def haversine_consecutive(points):
+    """
+    Distance between each point and the next one (like the hops of a path)
+
+    Parameters
+    ----------
+    points: array
+       N x 2 array of (latitude, longitude)
+
+    Returns
+    -------
+    array
+       N-1 distances (a list without NumPy)
+    """
+    np = load_numpy()
+    if np is None:
+        return [haversine(tuple(p1), tuple(p2)) for p1, p2 in zip(points[:-1], points[1:])]
+    a = np.asarray(points, dtype=np.float64)
+    return haversine_arrays(a[:-1, 0], a[:-1, 1], a[1:, 0], a[1:, 1])
+
+def haversine_pairwise(points, others=None):
+    """
+    Distance between every pair of points
+
+    Parameters
+    ----------
+    points: array
+       N x 2 array of (latitude, longitude)
+    others: array
+       M x 2 array of (latitude, longitude), points is used when it's not given
+
+    Returns
+    -------
+    array
+       N x M matrix of the distances (a list of lists without NumPy)
+    """
+    np = load_numpy()
+    if np is None:
+        others = points if others is None else others
+        return [[haversine(tuple(p1), tuple(p2)) for p2 in others] for p1 in points]
+    a = np.asarray(points, dtype=np.float64)
+    b = a if others is None else np.asarray(others, dtype=np.float64)
+    return haversine_arrays(a[:, 0, None], a[:, 1, None], b[None, :, 0], b[None, :, 1])
+
+def is_ip(address):
+    """Check if its a valid IP address.                                                                                                                                         
+    http://stackoverflow.com/questions/319279/how-to-validate-ip-address-in-python                                                                                              
+    """
+    import socket
+    try:
+        socket.inet_pton(socket.AF_INET, address)
+    except socket.error:
+        try:
+            socket.inet_pton(socket.AF_INET6, address)
+        except socket.error:
+            return False
+    return True
+
+#IPv4 addresses are packed as IPv4-mapped IPv6 addresses (::ffff:a.b.c.d), so that IPv4 and
+#IPv6 can be packed, sorted and classified together as 128 bit integers (or hi/lo 64 bit halves)
+IPV4_MAPPED = b'\x00'*10 + b'\xff'*2
+INVALID_IP = b'\xff'*16 #Anything which isn't an IP (??? hops), sorts last
+
+def pack_ip(ip):
+    """IP as 16 bytes (IPv4 is IPv4-mapped)"""
+    import socket
+    try:
+        return IPV4_MAPPED + socket.inet_pton(socket.AF_INET, ip)
+    except OSError:
+        try:
+            return socket.inet_pton(socket.AF_INET6, ip)
+        except OSError:
+            return INVALID_IP
+
+def ip_to_int(ip):
+    return int.from_bytes(pack_ip(ip), 'big')
+
+def parse_ipv4(np, ips):
+    """
+    Parse IPv4 addresses in one go with NumPy, None if any of them isn't a (canonical) IPv4
+    address. Much faster than an inet_pton per IP for large lists.
+    """
+    import warnings
+    try:
+        with warnings.catch_warnings():
+            #Older NumPy warns instead of raising on text it can't parse
+            warnings.simplefilter('error', DeprecationWarning)
+            octets = np.fromstring('.'.join(ips), dtype=np.int64, sep='.')
+    except (ValueError, DeprecationWarning):
+        return None
+    if len(octets) != 4*len(ips) or not len(ips):
+        return None
+    octets = octets.reshape(-1, 4)
+    if octets.min() < 0 or octets.max() > 255:
+        return None
+    #Every IP must be exactly its 4 octets (without leading zeros) and 3 dots. A string with more
+    #or less than 4 octets shifts the octets of the ones after it, the first of them can't match
+    lengths = np.fromiter(map(len, ips), dtype=np.int64, count=len(ips))
+    if (lengths != (octets >= 10).sum(axis=1) + (octets >= 100).sum(axis=1) + 7).any():
+        return None
+    return (octets[:, 0] << 24 | octets[:, 1] << 16 | octets[:, 2] << 8 | octets[:, 3]).astype(np.uint32)
+
+def pack_ipv4(ips):
+    """
+    Pack IPv4 addresses into a NumPy uint32 array (array('I') without NumPy)
+
+    Raises OSError if any of them isn't an IPv4 address
+    """
+    import socket
+    np = load_numpy()
+    inet_pton = socket.inet_pton
+    af = socket.AF_INET
+    if np is None:
+        from array import array
+        return array('I', [int.from_bytes(inet_pton(af, ip), 'big') for ip in ips])
+    if not isinstance(ips, (list, tuple)):
+        ips = list(ips)
+    packed = parse_ipv4(np, ips)
+    if packed is not None:
+        return packed
+    #inet_pton tells what's wrong (or accepts what the fast parser is too strict for)
+    return np.frombuffer(b''.join([inet_pton(af, ip) for ip in ips]), dtype='>u4').astype(np.uint32)
+
+def pack_ips(ips):
+    """
+    Pack IPv4/IPv6 addresses into integers
+
+    Returns
+    -------
+    array
+       N x 2 NumPy uint64 array of the high and low 64 bits of each IP
+       (a list of (high, low) tuples without NumPy)
+    """
+    np = load_numpy()
+    if np is None:
+        return [divmod(ip_to_int(ip), 1 << 64) for ip in ips]
+    if not isinstance(ips, (list, tuple)):
+        ips = list(ips)
+    try:
+        #Fast path, all of them are IPv4
+        v4 = pack_ipv4(ips).astype(np.uint64)
+        packed = np.zeros((len(v4), 2), dtype=np.uint64)
+        packed[:, 1] = v4 | np.uint64(0xffff00000000)
+        return packed
+    except OSError:
+        return np.frombuffer(b''.join([pack_ip(ip) for ip in ips]), dtype='>u8').reshape(-1, 2).astype(np.uint64)
+
+def ip_order(ips, packed=None):
+    """
+    Sort order of IPv4/IPv6 addresses (on their packed integer values), for the bulk callers
+    which don't need the sorted list of strings, e.g. to reorder other columns of the same rows.
+    packed (from pack_ips) can be passed to avoid packing the IPs again.
+
+    Returns
+    -------
+    array
+       NumPy array of the indexes of ips in sorted order (a list without NumPy)
+    """
+    np = load_numpy()
+    if np is None:
+        ips = ips if isinstance(ips, (list, tuple)) else list(ips)
+        return sorted(range(len(ips)), key=lambda i: pack_ip(ips[i]))
+    if packed is None:
+        packed = pack_ips(ips)
+    if packed[:, 0].any():
+        return np.lexsort((packed[:, 1], packed[:, 0]))
+    #All of them are IPv4, the low 64 bits are enough. Equal keys are equal IPs, so the
+    #(much faster) unstable sort is fine
+    return np.argsort(packed[:, 1])
+
+def sortip(ips, packed=None):
+    """
+    Sort IPv4/IPv6 addresses, on their packed integer values.
+    packed (from pack_ips) can be passed to avoid packing the IPs again. Building the sorted
+    list of strings is most of the time for large lists, see ip_order to do without it.
+    """
+    np = load_numpy()
+    ips = list(ips)
+    if np is None:
+        return sorted(ips, key=pack_ip)
+    return [ips[i] for i in ip_order(ips, packed).tolist()]
+
+IP_CLASSES = ('public', 'private', 'loopback', 'cgnat', 'linklocal')
+SPECIAL_NETWORKS = [('10.0.0.0/8', 'private'),
+                    ('172.16.0.0/12', 'private'),
+                    ('192.168.0.0/16', 'private'),
+                    ('fc00::/7', 'private'),
+                    ('127.0.0.0/8', 'loopback'),
+                    ('::1/128', 'loopback'),
+                    ('100.64.0.0/10', 'cgnat'),
+                    ('169.254.0.0/16', 'linklocal'),
+                    ('fe80::/10', 'linklocal')]
+
+def network_mask(network):
+    """(network, mask) of a network in CIDR notation, as 128 bit integers"""
+    ip, _, plen = network.partition('/')
+    plen = int(plen)
+    if ':' not in ip:
+        plen += 96
+    mask = ((1 << plen) - 1) << (128 - plen)
+    return ip_to_int(ip) & mask, mask
+
+@lru_cache(maxsize=None)
+def special_masks():
+    """Masks of the special networks as (class code, network, mask), computed once on first use"""
+    return [(IP_CLASSES.index(cls),) + network_mask(net) for net, cls in SPECIAL_NETWORKS]
+
+def classify_ips(ips, packed=None):
+    """
+    Classify many IPs as public, private, loopback, cgnat or linklocal.
+    packed (from pack_ips) can be passed to avoid packing the IPs again.
+
+    Returns
+    -------
+    array
+       index into IP_CLASSES for each IP (NumPy int8 array, or a list without NumPy)
+    """
+    np = load_numpy()
+    if np is None:
+        codes = []
+        for ip in ips:
+            n = ip_to_int(ip)
+            code = 0
+            for cls, net, mask in special_masks():
+                if n & mask == net:
+                    code = cls
+                    break
+            codes.append(code)
+        return codes
+    if packed is None:
+        packed = pack_ips(ips)
+    hi, lo = packed[:, 0], packed[:, 1]
+    codes = np.zeros(len(packed), dtype=np.int8)
+    for cls, net, mask in reversed(special_masks()):
+        match = ((hi & np.uint64(mask >> 64)) == np.uint64(net >> 64)) & \
+                ((lo & np.uint64(mask & 0xffffffffffffffff)) == np.uint64(net & 0xffffffffffffffff))
+        codes[match] = cls
+    return codes
+
+def is_private_batch(ips):
+    """IsPrivateIP for many IPs, returns a boolean NumPy array (a list without NumPy)"""
+    np = load_numpy()
+    if np is None:
+        return [code > 0 for code in classify_ips(ips)]
+    return np.asarray(classify_ips(ips)) > 0
+
+def addressInNetwork(ip, network):
+    net, mask = network_mask(network)
+    return ip_to_int(ip) & mask == net
+
+def pretty_print_table(result, heading=False):
+    """
+    Prints the query result in a human friendly format
+    """
+    # If the data is not in string, then it is likely a text format
+    if type(result) == 'str':
+        result = result.split('\n')
+        result = [line.split() for line in result]
+    #Remove empty items
+    result = [row for row in result if row!=['']]
+
+    columns = len(result[0])  #Get the number of columns, this is used for row formatting
+    row_format = '' #variable to construct the row formatting
+    
+    # Calculating the max length for each column
+    for i in range(0, columns):
+        # picking the length of the longest element
+        #Need to convert the elements into string
+        MAX_LEN = len(max([str(row[i]) for row in result], key=len))
+        # Constructing the string formatting
+        row_format += "{:<" + str(MAX_LEN) + "} | "
+
+    pretty_result = ''
+    if heading:
+        pretty_result = row_format.format(*result[0]) + '\n'
+        pretty_result += len(row_format.format(*result[0])) * "-" + '\n'
+        result = result[1:]
+    for row in result:
+        pretty_result += row_format.format(*row) + '\n'
+    return pretty_result
+
+def IsPrivateIP(ip):
+    """Borrowed from log_analysis.py"""
+    return addressInNetwork(ip, "10.0.0.0/8") or addressInNetwork(ip, "172.16.0.0/12") or addressInNetwork(ip, "192.168.0.0/16") or addressInNetwork(ip, "127.0.0.1/32") or addressInNetwork(ip, "100.64.0.0/10")
+
+def log(info=None):
+    import datetime
+    print('[{}] : {}'.format(datetime.datetime.now(), info))
@@ -0,0 +1,13 @@
+import os
+import pytest
+
+#The recorded outputs of the benchmarks are the fixtures of the tests too
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures')
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+@pytest.fixture
+def fixture():
+    return read_fixture
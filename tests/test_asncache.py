@@ -0,0 +1,64 @@
+import threading
+import pytest
+from monitorx.asncache import ASNCache, StandInWhoisServer
+
+RECORDS = {'1.1.1.0/24': ('13335', 'CLOUDFLARENET, US'),
+           '10.0.0.0/16': ('64500', 'PROVIDER, US'),
+           '10.0.7.0/24': ('64501', 'CUSTOMER, US'),
+           '2606:4700::/32': ('13335', 'CLOUDFLARENET, US')}
+
+@pytest.fixture
+def server():
+    server = StandInWhoisServer(RECORDS, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def cache(server):
+    cache = ASNCache(':memory:', server=server.server_address, timeout=5)
+    yield cache
+    cache.close()
+
+def test_hit_and_miss(cache, server):
+    info = cache.get(['1.1.1.1', '2606:4700::1111', '???'])
+    assert (info['1.1.1.1']['asnum'], info['1.1.1.1']['prefix']) == ('13335', '1.1.1.0/24')
+    assert info['2606:4700::1111']['asnum'] == '13335'
+    assert '???' not in info
+    assert (cache.hits, cache.misses, server.queries) == (0, 2, 1)
+    #Another IP of a cached prefix is a hit, no query
+    info = cache.get(['1.1.1.2'])
+    assert info['1.1.1.2']['prefix'] == '1.1.1.0/24'
+    assert (cache.hits, server.queries) == (1, 1)
+    assert cache.hit_rate == pytest.approx(1/3)
+
+def test_single_bulk_query_per_batch(cache, server):
+    ips = ['1.1.1.{}'.format(n) for n in range(1, 4)] + ['10.0.{}.1'.format(n) for n in range(5, 10)]
+    cache.get(ips)
+    assert server.queries == 1
+    cache.get(ips + ['10.0.200.1', '10.1.0.1'])
+    #10.0.200.1 is in the cached /16, 10.1.0.1 (NA) is looked up, in one more query
+    assert server.queries == 2
+
+def test_longest_prefix_match(cache):
+    info = cache.get(['10.0.1.1', '10.0.7.1'])
+    assert (info['10.0.1.1']['asnum'], info['10.0.7.1']['asnum']) == ('64500', '64501')
+    assert cache.longest_prefix_match('10.0.7.200')['prefix'] == '10.0.7.0/24'
+    assert cache.longest_prefix_match('10.0.8.1')['prefix'] == '10.0.0.0/16'
+    assert cache.longest_prefix_match('192.0.2.1') is None
+
+def test_expiry(cache, server):
+    cache.get(['10.0.1.1'])
+    cache.add([{'asnum': '64501', 'ip': '10.0.7.1', 'prefix': '10.0.7.0/24', 'company': 'CUSTOMER, US'}],
+              now=1.0)
+    #The customer /24 expired, the provider /16 mustn't answer for it
+    assert cache.longest_prefix_match('10.0.7.1') is None
+    assert cache.longest_prefix_match('10.0.1.1')['asnum'] == '64500'
+    queries = server.queries
+    assert cache.get(['10.0.7.1'])['10.0.7.1']['asnum'] == '64501'
+    assert server.queries == queries + 1
+    assert cache.longest_prefix_match('10.0.7.1')['asnum'] == '64501'
+    cache.evict(now=1e12)
+    assert cache.longest_prefix_match('10.0.1.1') is None
@@ -0,0 +1,167 @@
+import asyncio
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from monitorx import curlx
+from monitorx.curlx import Curl, CurlSession
+
+needs_curl = pytest.mark.skipif(shutil.which('curl') is None, reason='curl is not installed')
+
+class BaselineCurl(Curl):
+    """parse_log as it was before the single pass rewrite, the output must not change"""
+    def parse_log(self):
+        lines = iter(self.lograw.split('\n'))
+        for line in lines:
+            try:
+                time = line.split()[0]
+            except IndexError:
+                pass
+            line = ' '.join(line.split()[1:])
+            if line.startswith('>'):
+                self.parse_req_hdr(line)
+                self.log['client'] += line + '\n'
+            elif line.startswith('<'):
+                self.parse_resp_hdr(line)
+                self.log['srv'] += line + '\n'
+            elif line.startswith('*'):
+                if line.startswith('* TLS'):
+                    self.parse_sslhs([line, next(lines, None)], time)
+                else:
+                    self.parse_info_hdr(line, time)
+                    self.log['info'] += line + '\n'
+
+def parsed(cls, lograw):
+    curl = cls('https://example.com')
+    curl.lograw = lograw
+    curl.parse_log()
+    return curl
+
+def assert_same_as_baseline(lograw):
+    old, new = parsed(BaselineCurl, lograw), parsed(Curl, lograw)
+    assert new.log == old.log
+    assert new.d == old.d
+    assert (new.req_hdr, new.resp_hdr) == (old.req_hdr, old.resp_hdr)
+    assert (new.conn_data, new.ssl_hs_data, new.ssl_hs_raw) == (old.conn_data, old.ssl_hs_data, old.ssl_hs_raw)
+    return new
+
+def test_parse_log_same_as_baseline(fixture):
+    curl = assert_same_as_baseline(fixture('curl_trace.txt'))
+    assert '*   Trying' not in curl.log['info'] and '* Trying 93.184.216.34:443...\n' in curl.log['info']
+    assert curl.log['client'].endswith('>\n')
+    assert curl.d['srv']['ip'] == '93.184.216.34'
+    assert curl.d['ssl']['proto'] == 'TLSv1.3'
+
+def test_parse_log_whitespace():
+    assert_same_as_baseline('01:02:03.000001 *   Trying   1.2.3.4:443...\n'
+                            '\n'
+                            '   \n'
+                            '01:02:03.000002\n'
+                            '01:02:03.000003 >   GET  /  HTTP/1.1 \n'
+                            '01:02:03.000004 >  Host:   example.com\n'
+                            '01:02:03.000005 > \n'
+                            '01:02:03.000006 <  HTTP/1.1   200  OK\n'
+                            '01:02:03.000007 < \n'
+                            '01:02:03.000008 * TLSv1.2 (IN), TLS header, Finished (20):\n'
+                            '01:02:03.000009 {  [5 bytes data]\n')
+
+def test_clean_conn_data(fixture):
+    curl = parsed(Curl, fixture('curl_trace.txt'))
+    curl.clean_conn_data()
+    #Milliseconds between the connect and the client hello, then between each TLS stage
+    assert curl.conn_data[0][0] == 'connect'
+    assert [c[1] for c in curl.conn_data[1:]] == [0.411] + [0.274]*6
+
+@needs_curl
+def test_run_batch(tmp_path, monkeypatch):
+    path = tmp_path / 'a.txt'
+    path.write_text('hello')
+    urls = ['file://{}'.format(path), 'file://{}/missing'.format(tmp_path), 'file://{}'.format(path)]
+    curls = Curl.run_batch(urls)
+    assert [c.hostname for c in curls] == urls
+    assert all(c.out.startswith('curlout:') for c in curls)
+    #The missing file is reported as failed, without timings
+    assert [c.error is None for c in curls] == [True, False, True]
+    assert 'missing' in curls[1].error and curls[1].curl_conn_data == {}
+    assert curls[0].curl_conn_data and curls[2].curl_conn_data
+    #curl without --trace-ids runs them one after the other
+    monkeypatch.setattr(curlx, 'curl_version', lambda curl_command='curl': (7, 88, 1))
+    curls = Curl.run_batch(urls, parallel_max=2)
+    assert '--parallel' not in curls[0].command
+    assert all(c.out.startswith('curlout:') for c in curls)
+    assert [c.error is None for c in curls] == [True, False, True]
+
+@needs_curl
+def test_run_batch_old_curl(tmp_path, monkeypatch):
+    #No %{urlnum} or %{exitcode} before 7.75, each URL is fetched on its own
+    path = tmp_path / 'a.txt'
+    path.write_text('hello')
+    urls = ['file://{}'.format(path), 'file://{}/missing'.format(tmp_path)]
+    monkeypatch.setattr(curlx, 'curl_version', lambda curl_command='curl': (7, 68, 0))
+    curls = Curl.run_batch(urls)
+    assert [c.command.split()[1] for c in curls] == urls
+    assert curls[0].error is None and curls[0].curl_conn_data
+    assert curls[1].error == 'curl exited with code 37' and curls[1].curl_conn_data == {}
+
+@needs_curl
+def test_run_batch_curl_fails():
+    with pytest.raises(RuntimeError, match='--no-such-option-monitorx'):
+        Curl.run_batch(['file:///dev/null'], options='--no-such-option-monitorx')
+
+def test_curl_version():
+    assert curlx.curl_version('no-such-command-monitorx') is None
+    if shutil.which('curl'):
+        assert curlx.curl_version() >= (7,)
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'hello'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Monitorx', self.headers.get('X-Monitorx', ''))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def test_session_reuses_the_connection(http_server):
+    session = CurlSession()
+    try:
+        results = [session.request(http_server, headers={'X-Monitorx': '1'}) for _ in range(3)]
+    finally:
+        session.close()
+    assert [r['timings']['reused'] for r in results] == [False, True, True]
+    assert (session.connections, session.requests) == (1, 3)
+    assert results[0]['code'] == '200' and results[0]['version'] == 'HTTP/1.1'
+    assert ('X-Monitorx', '1') in results[0]['headers']
+    #No handshake on a reused connection
+    assert results[1]['timings']['dns'] == results[1]['timings']['tcp'] == 0
+
+def test_arun_uses_the_session(http_server):
+    session = CurlSession()
+    curls = [Curl(http_server, custom_hdr=" -H 'X-Monitorx: 2'", session=session) for _ in range(2)]
+
+    async def run():
+        for curl in curls:
+            await curl.arun()
+
+    try:
+        asyncio.run(run())
+    finally:
+        session.close()
+    assert (session.connections, session.requests) == (1, 2)
+    assert [c.curl_conn_data['reused'] for c in curls] == [False, True]
+    assert curls[1].d['srv']['http']['code'] == '200'
+    assert curls[1].resp_hdr['X-Monitorx'] == ['2']
@@ -0,0 +1,67 @@
+import asyncio
+import sys
+import pytest
+from monitorx import daemon as daemon_module
+from monitorx.daemon import ProbeDaemon, RingBuffer
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    for ts in range(5):
+        buffer.append(float(ts), ts*10.0)
+    assert buffer.since(0) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+    assert buffer.since(3.5) == [(4.0, 40.0)]
+
+def test_ring_buffer_late_samples():
+    buffer = RingBuffer(4)
+    for ts in (1.0, 3.0, 2.0, 4.0):
+        buffer.append(ts, ts*10.0)
+    assert buffer.since(2.0) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+    #Full, the oldest sample makes room for the late one
+    buffer.append(2.5, 25.0)
+    assert buffer.since(0) == [(2.0, 20.0), (2.5, 25.0), (3.0, 30.0), (4.0, 40.0)]
+    #Older than all of them, dropped
+    buffer.append(1.5, 15.0)
+    assert buffer.since(0) == [(2.0, 20.0), (2.5, 25.0), (3.0, 30.0), (4.0, 40.0)]
+
+def test_metrics_are_kept_per_probe():
+    daemon = ProbeDaemon([])
+    daemon.record('ping', '1.1.1.1', {'loss': 0.1, 'avg': None}, ts=100.0)
+    daemon.record('mtr', '1.1.1.1', {'loss': 10.0}, ts=100.0)
+    assert daemon.query('ping', '1.1.1.1', 'loss', now=110.0) == [(100.0, 0.1)]
+    assert daemon.summary('mtr', '1.1.1.1', 'loss', now=110.0)['max'] == 10.0
+    assert daemon.query('ping', '1.1.1.1', 'avg', now=110.0) == []
+
+def run_for(daemon, seconds):
+    async def main():
+        try:
+            await asyncio.wait_for(daemon.arun(), seconds)
+        except asyncio.TimeoutError:
+            pass
+    asyncio.run(main())
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='the native traceroute needs IP_RECVERR')
+def test_native_jobs():
+    #Pinged and traced from the daemon's process, without the ping and mtr commands
+    options = {'backend': 'native', 'policy': True, 'count': 3, 'interval': 0.02, 'timeout': 5}
+    daemon = ProbeDaemon([{'probe': 'ping', 'target': '127.0.0.1', 'interval': 0.2, 'options': options},
+                          {'probe': 'mtr', 'target': '::1', 'interval': 0.2, 'options': options}],
+                         jitter=0)
+    run_for(daemon, 1.0)
+    assert not daemon.errors
+    assert daemon.summary('ping', '127.0.0.1', 'loss')['count'] >= 1
+    assert daemon.summary('ping', '127.0.0.1', 'loss')['max'] == 0.0
+    assert daemon.summary('mtr', '::1', 'hops')['max'] == 1.0
+
+class FailingProbe(object):
+    def __init__(self, target, **options):
+        self.target = target
+
+    async def arun(self):
+        raise OSError('no route to {}'.format(self.target))
+
+def test_failed_runs_are_logged(monkeypatch, capsys):
+    monkeypatch.setitem(daemon_module.PROBES, 'ping', FailingProbe)
+    daemon = ProbeDaemon([{'probe': 'ping', 'target': '192.0.2.1', 'interval': 0.1}], jitter=0)
+    run_for(daemon, 0.3)
+    assert daemon.errors['192.0.2.1'] >= 1
+    assert "ping 192.0.2.1 failed: OSError('no route to 192.0.2.1')" in capsys.readouterr().out
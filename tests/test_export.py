@@ -0,0 +1,80 @@
+import csv
+import pytest
+from monitorx.export import Exporter, MTR_COLUMNS, has_pyarrow
+from monitorx.mtrx import MTR
+from monitorx.pingx import Ping
+
+def mtr(raw, output_type):
+    m = MTR('1.1.1.1')
+    m.mtr_raw = raw
+    m.parse_mtr(output_type)
+    m.find_lossy_hop()
+    m.update_mtr_loss_info()
+    return m
+
+def ping(raw):
+    p = Ping('1.1.1.1')
+    p.ping_raw = raw
+    p.parse_output()
+    return p
+
+def exported(tmp_path, fmt, *probes):
+    exporter = Exporter(str(tmp_path), fmt=fmt)
+    for probe in probes:
+        exporter.add(probe, ts=1000.0)
+    exporter.close()
+    return exporter
+
+def part(tmp_path, kind, fmt):
+    path, = tmp_path.glob('{}-*.{}'.format(kind, fmt))
+    return str(path)
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_mtr_columns(tmp_path, fixture):
+    #The json reports have "name (ip)" in host, it's split like the text reports
+    exported(tmp_path, 'csv', mtr(fixture('mtr_report.json'), 'json'), mtr(fixture('mtr_report.txt'), 'text'))
+    rows = read_csv(part(tmp_path, 'mtr', 'csv'))
+    assert list(rows[0]) == [name for name, _ in MTR_COLUMNS]
+    json_rows, text_rows = rows[:7], rows[7:]
+    assert [(r['ip'], r['name']) for r in json_rows] == [(r['ip'], r['name']) for r in text_rows]
+    assert (json_rows[0]['ip'], json_rows[0]['name']) == ('192.168.1.1', '_gateway')
+    assert (json_rows[1]['ip'], json_rows[1]['name']) == ('10.20.0.1', '-')
+    assert (json_rows[0]['hop'], json_rows[0]['snt'], json_rows[0]['avg']) == ('1', '10', '0.5')
+
+def test_ping_columns(tmp_path, fixture):
+    exported(tmp_path, 'csv', ping(fixture('ping.txt')))
+    row, = read_csv(part(tmp_path, 'ping', 'csv'))
+    assert (row['target'], row['sent'], row['recv'], row['loss']) == ('1.1.1.1', '20', '18', '0.1')
+    assert row['ts'] == '1000.0'
+
+@pytest.mark.skipif(not has_pyarrow(), reason='pyarrow is not installed')
+def test_parquet(tmp_path, fixture):
+    import pyarrow.parquet
+    exported(tmp_path, 'parquet', mtr(fixture('mtr_report.json'), 'json'), ping(fixture('ping.txt')))
+    table = pyarrow.parquet.read_table(part(tmp_path, 'mtr', 'parquet'))
+    assert table.column_names == [name for name, _ in MTR_COLUMNS]
+    assert table.column('ip').to_pylist()[:2] == ['192.168.1.1', '10.20.0.1']
+    assert table.column('name').to_pylist()[0] == '_gateway'
+    assert table.column('is_lossy').to_pylist() == [0]*7
+    ping_table = pyarrow.parquet.read_table(part(tmp_path, 'ping', 'parquet'))
+    assert ping_table.column('recv').to_pylist() == [18]
+
+@pytest.mark.parametrize('fmt', ['csv', pytest.param('parquet', marks=pytest.mark.skipif(
+    not has_pyarrow(), reason='pyarrow is not installed'))])
+def test_sessions_write_parts(tmp_path, fixture, fmt):
+    #Neither format overwrites nor appends to the files of an earlier Exporter
+    for _ in range(2):
+        exported(tmp_path, fmt, ping(fixture('ping.txt')))
+    parts = sorted(tmp_path.glob('ping-*.{}'.format(fmt)))
+    assert len(parts) == 2
+    for path in parts:
+        if fmt == 'csv':
+            assert [row['recv'] for row in read_csv(str(path))] == ['18']
+        else:
+            import pyarrow.parquet
+            assert pyarrow.parquet.read_table(str(path)).column('recv').to_pylist() == [18]
+    #Nothing was written for mtr and curl
+    assert not list(tmp_path.glob('mtr-*')) and not list(tmp_path.glob('curl-*'))
@@ -0,0 +1,81 @@
+import json
+import pytest
+from conftest import FIXTURES
+from monitorx import metrics
+from monitorx.metrics import NULL_TIMER, Registry, stage
+from monitorx.pingx import Ping
+
+@pytest.fixture
+def registry():
+    return Registry(enabled=True, buckets=(0.1, 1.0))
+
+@pytest.fixture
+def global_metrics():
+    metrics.METRICS.reset()
+    metrics.METRICS.enable()
+    yield metrics.METRICS
+    metrics.METRICS.disable()
+    metrics.METRICS.reset()
+
+def test_counters(registry):
+    registry.inc('monitorx_subprocess_total', command='mtr')
+    registry.inc('monitorx_subprocess_total', 2, command='mtr')
+    registry.inc('monitorx_subprocess_total', command='ping')
+    assert registry.prometheus() == ('# TYPE monitorx_subprocess_total counter\n'
+                                     'monitorx_subprocess_total{command="mtr"} 3\n'
+                                     'monitorx_subprocess_total{command="ping"} 1\n')
+
+def test_histograms(registry):
+    for value in (0.05, 0.1, 0.5, 5.0):
+        registry.observe('monitorx_stage_seconds', value, probe='mtr', stage='parse')
+    registry.observe('monitorx_stage_seconds', 0.5, stage='run', probe='mtr')
+    #The buckets are cumulative, le is the inclusive upper bound and the labels are sorted
+    assert registry.prometheus() == ('# TYPE monitorx_stage_seconds histogram\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="parse",le="0.1"} 2\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="parse",le="1.0"} 3\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="parse",le="+Inf"} 4\n'
+                                     'monitorx_stage_seconds_sum{probe="mtr",stage="parse"} 5.65\n'
+                                     'monitorx_stage_seconds_count{probe="mtr",stage="parse"} 4\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="run",le="0.1"} 0\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="run",le="1.0"} 1\n'
+                                     'monitorx_stage_seconds_bucket{probe="mtr",stage="run",le="+Inf"} 1\n'
+                                     'monitorx_stage_seconds_sum{probe="mtr",stage="run"} 0.5\n'
+                                     'monitorx_stage_seconds_count{probe="mtr",stage="run"} 1\n')
+
+def test_label_escaping(registry):
+    registry.inc('monitorx_subprocess_total', command='a"b\\c\nd')
+    assert registry.prometheus().split('\n')[1] == r'monitorx_subprocess_total{command="a\"b\\c\nd"} 1'
+
+def test_json(registry):
+    for value in (0.05, 0.5, 5.0):
+        registry.observe('monitorx_stage_seconds', value, probe='ping', stage='parse')
+    registry.inc('monitorx_asn_cache_total', result='hit')
+    snapshot = json.loads(json.dumps(registry.snapshot(), allow_nan=False))
+    histogram, = snapshot['histograms']
+    assert histogram['labels'] == {'probe': 'ping', 'stage': 'parse'}
+    #Strict json, the values in the last bucket are +Inf
+    assert (histogram['count'], histogram['p50'], histogram['p99']) == (3, 1.0, '+Inf')
+    assert histogram['buckets'] == [[0.1, 1], [1.0, 2], ['+Inf', 3]]
+    assert snapshot['counters'] == [{'name': 'monitorx_asn_cache_total', 'labels': {'result': 'hit'}, 'value': 1}]
+
+def test_disabled():
+    registry = Registry()
+    assert registry.timer('monitorx_stage_seconds', probe='ping', stage='run') is NULL_TIMER
+    registry.inc('monitorx_subprocess_total', command='ping')
+    registry.observe('monitorx_stage_seconds', 1.0, probe='ping', stage='run')
+    assert registry.prometheus() == '\n'
+    assert registry.snapshot() == {'histograms': [], 'counters': []}
+
+def test_stage_timers(global_metrics):
+    assert stage('ping', 'run') is not NULL_TIMER
+    p = Ping('1.1.1.1')
+    p.get_command = lambda: 'cat {}/ping.txt'.format(FIXTURES)
+    p.run()
+    stages = {(h['labels']['probe'], h['labels']['stage']): h['count']
+              for h in global_metrics.snapshot()['histograms'] if h['name'] == 'monitorx_stage_seconds'}
+    assert stages == {('ping', 'run'): 1, ('ping', 'parse'): 1}
+    text = global_metrics.prometheus()
+    assert 'monitorx_stage_seconds_count{probe="ping",stage="parse"} 1\n' in text
+    assert 'monitorx_subprocess_total{command="cat"} 1\n' in text
+    global_metrics.disable()
+    assert stage('ping', 'run') is NULL_TIMER
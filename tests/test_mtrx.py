@@ -0,0 +1,122 @@
+import datetime
+import pytest
+from monitorx.mtrx import MTR, PathTracker, enrich_traces, iter_json_reports, iter_reports, parse_hop_line, parse_reports
+
+def parsed(raw, output_type):
+    m = MTR()
+    m.mtr_raw = raw
+    m.parse_mtr(output_type)
+    m.find_lossy_hop()
+    m.update_mtr_loss_info()
+    return m
+
+def test_text_report(fixture):
+    m = parsed(fixture('mtr_report.txt'), 'text')
+    assert m.timestamp == datetime.datetime(2021, 2, 20, 6, 57, 56)
+    assert sorted(m.mtr_results) == [1, 2, 3, 4, 5, 6, 7]
+    assert m.mtr_results[1] == {'count': 1, 'Loss%': 0.0, 'Snt': 10, 'Last': 0.5, 'Avg': 0.5, 'Best': 0.4,
+                                'Wrst': 0.8, 'StDev': 0.1, 'name': '_gateway', 'ip': '192.168.1.1',
+                                'is_lossy': False}
+    #IP only, and no answer
+    assert (m.mtr_results[2]['name'], m.mtr_results[2]['ip']) == ('-', '10.20.0.1')
+    assert (m.mtr_results[4]['ip'], m.mtr_results[4]['Loss%']) == ('???', 100.0)
+    #The loss of hops 4 and 5 doesn't go on to the destination
+    assert m.lossy_hop is None
+
+def test_json_report(fixture):
+    m = parsed(fixture('mtr_report.json'), 'json')
+    assert m.mtr_meta['dst'] == '1.1.1.1'
+    assert m.mtr_results[1]['host'] == '_gateway (192.168.1.1)'
+    assert m.mtr_results[5]['Loss%'] == 10.0
+    assert m.lossy_hop is None
+
+def test_lossy_hop():
+    text = ('Start: 2021-02-20T06:57:56+0000\n'
+            '  1.|-- 10.0.0.1    0.0%    10    0.5   0.5   0.4   0.8   0.1\n'
+            '  2.|-- 10.0.0.2   20.0%    10    3.3   3.1   2.5   4.7   0.3\n'
+            '  3.|-- 10.0.0.3   20.0%    10    9.3   8.9   7.1  13.4   0.9\n')
+    m = parsed(text, 'text')
+    assert m.lossy_hop == 2
+    assert [m.mtr_results[n]['is_lossy'] for n in (1, 2, 3)] == [False, True, True]
+
+def test_parse_hop_line():
+    assert parse_hop_line('HOST: x  Loss%   Snt') is None
+    hop = parse_hop_line('  4.|-- ???    100.0%    10    0.0   0.0   0.0   0.0   0.0')
+    assert (hop.count, hop.name, hop.ip, hop.loss, hop.snt) == (4, '-', '???', 100.0, 10)
+
+def test_concatenated_reports(fixture):
+    text = fixture('mtr_report.txt')
+    reports = list(iter_reports(text*3))
+    assert len(reports) == 3
+    assert all(len(r.hops) == 7 for r in reports)
+    mtrs = list(parse_reports(text*2))
+    assert mtrs[1].mtr_results == parsed(text, 'text').mtr_results
+
+def test_json_archive(fixture, tmp_path):
+    path = tmp_path / 'archive.json'
+    path.write_text(fixture('mtr_report.json')*2)
+    mtrs = list(iter_json_reports(str(path)))
+    assert [m.destination for m in mtrs] == ['1.1.1.1', '1.1.1.1']
+    assert mtrs[0].mtr_results[7]['Avg'] == 15.3
+
+def test_enrich_traces(fixture):
+    text, json_trace = parsed(fixture('mtr_report.txt'), 'text'), parsed(fixture('mtr_report.json'), 'json')
+    calls = []
+    def asn_lookup(ips):
+        calls.append(set(ips))
+        return {ip: {'asnum': 'AS' + ip.split('.')[0], 'company': 'ISP ' + ip} for ip in ips}
+    geo = {'192.168.1.1': (0.0, 0.0), '10.20.0.1': (0.0, 90.0), '1.1.1.1': (90.0, 0.0)}
+    traces = enrich_traces([text, json_trace, text], asn_lookup, geo)
+    #One lookup for the union of the hop IPs of all the traces, ??? left out
+    assert len(calls) == 1
+    ips = {hop['ip'] for hop in text.mtr_results.values()} - {'???'}
+    assert calls[0] == ips
+    assert traces[0] is text
+    gateway = json_trace.mtr_results[1]
+    assert (gateway['asn'], gateway['company']) == ('AS192', 'ISP 192.168.1.1')
+    assert text.mtr_results[4]['asn'] is None
+    #Distances from the previous located hop, the unlocated ones are skipped over
+    assert gateway['distance'] is None
+    assert json_trace.mtr_results[2]['distance'] == pytest.approx(10007.5, abs=1)
+    assert json_trace.mtr_results[7]['distance'] == pytest.approx(10007.5, abs=1)
+    assert json_trace.mtr_results[3]['distance'] is None
+
+def mtr_run(hops):
+    """Parsed text report of (ip, loss, avg) hops"""
+    lines = ['Start: 2021-02-20T06:57:56+0000']
+    for n, (ip, loss, avg) in enumerate(hops, 1):
+        lines.append('  {}.|-- {}  {:.1f}%    10    {avg}   {avg}   {avg}   {avg}   0.1'.format(n, ip, loss, avg=avg))
+    return parsed('\n'.join(lines) + '\n', 'text')
+
+PATH = [('10.0.0.1', 0.0, 0.5), ('10.0.0.2', 0.0, 3.1), ('10.0.0.3', 0.0, 8.9)]
+
+def test_path_tracker_route_change():
+    tracker = PathTracker(warmup=2)
+    assert tracker.update(mtr_run(PATH), '1.1.1.1') == {'changes': [], 'deviations': [], 'lossy_hop': None}
+    assert tracker.update(mtr_run(PATH), '1.1.1.1')['changes'] == []
+    rerouted = [PATH[0], ('10.9.0.2', 0.0, 3.1), PATH[2]]
+    assert tracker.update(mtr_run(rerouted), '1.1.1.1')['changes'] == [('ip', 2, '10.0.0.2', '10.9.0.2')]
+    #The new hop is the baseline now, and each destination has a path of its own
+    assert tracker.update(mtr_run(rerouted), '1.1.1.1')['changes'] == []
+    assert tracker.update(mtr_run(rerouted[:2]), '1.1.1.1')['changes'] == [('hop_count', None, 3, 2)]
+    assert tracker.update(mtr_run(PATH[:2]), '8.8.8.8')['changes'] == []
+
+def test_path_tracker_loss_deviation():
+    tracker = PathTracker(warmup=2, loss_threshold=10.0)
+    lossy = [PATH[0], ('10.0.0.2', 30.0, 3.1), ('10.0.0.3', 30.0, 8.9)]
+    #Not compared before the warmup
+    assert tracker.update(mtr_run(lossy), '1.1.1.1')['deviations'] == []
+    tracker = PathTracker(warmup=2, loss_threshold=10.0)
+    for _ in range(2):
+        tracker.update(mtr_run(PATH), '1.1.1.1')
+    result = tracker.update(mtr_run(lossy), '1.1.1.1')
+    assert result['changes'] == []
+    assert result['deviations'] == [(2, 'Loss%', 30.0, 0.0), (3, 'Loss%', 30.0, 0.0)]
+    assert result['lossy_hop'] == 2
+    #Loss of a hop which doesn't carry on to the destination isn't a lossy hop
+    tracker = PathTracker(warmup=2, loss_threshold=10.0)
+    for _ in range(2):
+        tracker.update(mtr_run(PATH), '1.1.1.1')
+    result = tracker.update(mtr_run([PATH[0], ('10.0.0.2', 30.0, 3.1), PATH[2]]), '1.1.1.1')
+    assert result['deviations'] == [(2, 'Loss%', 30.0, 0.0)]
+    assert result['lossy_hop'] is None
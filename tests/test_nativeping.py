@@ -0,0 +1,51 @@
+import asyncio
+import socket
+import pytest
+from monitorx import nativeping
+from monitorx.nativeping import Pinger, checksum, echo_request, parse_echo_reply, resolve
+from monitorx.pingx import Ping
+
+def test_echo_request():
+    packet = echo_request(socket.AF_INET, 7, b'abcd')
+    assert checksum(packet) == 0
+    reply = bytes([0]) + packet[1:]
+    assert parse_echo_reply(socket.AF_INET, reply) == 7
+    assert parse_echo_reply(socket.AF_INET, packet) is None
+
+def test_resolve():
+    assert resolve('127.0.0.1') == (socket.AF_INET, ('127.0.0.1', 0))
+    assert resolve('::1')[0] == socket.AF_INET6
+    assert resolve('bad..name') is None
+
+def test_udp_loopback():
+    #The closed port of the loopback answers with port unreachable
+    samples = Pinger(mode='udp', wait=1.0).ping(['127.0.0.1'], count=3, interval=0.02)
+    assert samples[0]['sent'] == 3
+    assert list(samples[0]['seqs']) == [1, 2, 3]
+    assert all(0 < t < 1000 for t in samples[0]['times'])
+
+def test_unresolvable_is_all_lost():
+    samples = Pinger(mode='udp', wait=0.5).ping(['bad..name', '127.0.0.1'], count=2, interval=0.02)
+    assert (samples[0]['sent'], len(samples[0]['times'])) == (2, 0)
+    assert 'bad..name' in samples[0]['error']
+    assert len(samples[1]['times']) == 2
+    p = Ping('bad..name', count=2, backend='native', interval=0.02)
+    p.run()
+    assert (p.ping_results['loss'], p.ping_results['error']) == (1.0, 'cannot resolve bad..name')
+
+def test_icmp_socket_not_allowed(monkeypatch):
+    real_socket = socket.socket
+    def no_icmp(family=socket.AF_INET, kind=socket.SOCK_STREAM, proto=0, *args):
+        if proto in (socket.IPPROTO_ICMP, socket.IPPROTO_ICMPV6):
+            raise PermissionError('not allowed')
+        return real_socket(family, kind, proto, *args)
+    monkeypatch.setattr(nativeping.socket, 'socket', no_icmp)
+    samples = Pinger(mode='icmp', wait=0.2).ping(['127.0.0.1', '::1'], count=2, interval=0.02)
+    assert [(s['sent'], len(s['times'])) for s in samples] == [(2, 0), (2, 0)]
+
+def test_arun_native(monkeypatch):
+    monkeypatch.setattr(nativeping, 'icmp_available', lambda family=socket.AF_INET: False)
+    p = Ping('127.0.0.1', count=2, backend='native', interval=0.02)
+    p.get_command = lambda: pytest.fail('the ping command was run')
+    asyncio.run(p.arun())
+    assert (p.ping_results['sent'], p.ping_results['recv']) == (2, 2)
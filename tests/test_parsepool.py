@@ -0,0 +1,49 @@
+from array import array
+import pytest
+from monitorx.curlx import Curl
+from monitorx.parsepool import ParsePool, apply
+from monitorx.pingx import Ping
+from monitorx.scheduler import Scheduler
+
+@pytest.fixture(scope='module')
+def pool():
+    with ParsePool(max_workers=2, min_shared=1024) as pool:
+        yield pool
+
+class NativePing(Ping):
+    """Native ping which doesn't need the network, the ping command must not be run"""
+    def run_native(self, pinger=None):
+        self.load_samples({'sent': self.count, 'times': array('d', [1.0, 2.0]), 'seqs': array('q', [1, 2])})
+
+    def run_ping(self):
+        raise AssertionError('the ping command was run')
+
+def test_map(pool, fixture):
+    #Bigger than min_shared, passed through shared memory
+    raw = fixture('ping.txt')
+    record, = pool.map('ping', [raw])
+    p = Ping('1.1.1.1')
+    p.ping_raw = raw
+    p.parse_output()
+    assert record.ping_results == p.ping_results
+    assert list(record.seqs) == list(p.seqs)
+
+def test_native_backend_is_run_as_is(pool):
+    results = list(Scheduler(parse_pool=pool).sweep(NativePing, ['a', 'b'], count=4, backend='native'))
+    assert all(r.ok for r in results), [r.error for r in results]
+    assert [(r.probe.ping_results['sent'], r.probe.ping_results['recv']) for r in results] == [(4, 2)]*2
+
+def test_curl_record_has_all_the_results(pool, fixture):
+    #Applied on a Curl, the record leaves it the same as parsing the output itself
+    lograw = fixture('curl_trace.txt')
+    out = 'curlout:1250000.000:0.012:0.040:0.110:0.111:0.190:0.250'
+    record, = pool.map('curl', [lograw], [out])
+    pooled = apply(Curl('https://example.com'), record)
+    local = Curl('https://example.com')
+    local.lograw, local.out = lograw, out
+    local.parse_log()
+    local.parse_out()
+    local.clean_conn_data()
+    for name in ('curl_conn_data', 'req_hdr', 'resp_hdr', 'd', 'ssl_hs_data', 'conn_data', 'log', 'ssl_hs_raw'):
+        assert getattr(pooled, name) == getattr(local, name), name
+    assert pooled.log['info'] and pooled.ssl_hs_raw
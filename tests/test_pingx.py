@@ -0,0 +1,113 @@
+import pytest
+from conftest import FIXTURES
+from monitorx.pingx import Ping, RunningStats
+from monitorx.stats import rtt_stats
+
+def parsed(raw):
+    p = Ping('1.1.1.1')
+    p.ping_raw = raw
+    p.parse_output()
+    return p
+
+def streamed(lines, callback=None):
+    p = Ping('1.1.1.1')
+    if callback:
+        p.subscribe(callback)
+    for line in lines:
+        p.feed(line)
+    return p
+
+def test_running_stats():
+    times = [10.0, 12.5, 11.0, 9.5, 14.0]
+    stats = RunningStats()
+    for t in times:
+        stats.add(t)
+    expected = rtt_stats(times, percentiles=())
+    assert (stats.min, stats.max) == (expected['min'], expected['max'])
+    assert stats.mean == pytest.approx(expected['avg'])
+    assert stats.stddev == pytest.approx(expected['stddev'])
+    assert RunningStats().stddev is None
+
+def test_stream_same_as_parse(fixture):
+    raw = fixture('ping.txt')
+    live = streamed(raw.split('\n')).get_live_results()
+    results = parsed(raw).ping_results
+    assert (live['sent'], live['recv'], live['loss']) == (results['sent'], results['recv'], results['loss'])
+    for stat in ('min', 'avg', 'max', 'stddev'):
+        assert live[stat] == pytest.approx(results[stat])
+    #The RTTs aren't kept in the streaming mode
+    assert len(live['times']) == 0
+
+def test_subscribers_skip_duplicates(fixture):
+    packets = []
+    lines = fixture('ping.txt').split('\n')
+    streamed(lines, lambda ping, packet: packets.append(packet))
+    replies = [l for l in lines if 'bytes from' in l and '(DUP!)' not in l]
+    assert any('(DUP!)' in l for l in lines)
+    assert len(packets) == len(replies) == 18
+    assert packets[0] == {'seq': 1, 'ttl': 57, 'time': 11.30}
+    assert len({p['seq'] for p in packets}) == len(packets)
+
+def test_live_loss_before_summary(fixture):
+    replies = [l for l in fixture('ping.txt').split('\n') if 'bytes from' in l and '(DUP!)' not in l]
+    #Replies 1-6, then 9: 7 and 8 are lost so far
+    live = streamed(replies[:7]).get_live_results()
+    assert (live['sent'], live['recv'], live['loss']) == (9, 7, 0.22)
+    assert streamed([]).get_live_results()['sent'] == 0
+
+def test_run_stream(fixture):
+    p = Ping('1.1.1.1')
+    p.get_command = lambda: 'cat {}/ping.txt'.format(FIXTURES)
+    seqs = []
+    p.subscribe(lambda ping, packet: seqs.append(packet['seq']))
+    p.run_stream()
+    assert len(seqs) == 18
+    assert (p.ping_results['sent'], p.ping_results['recv']) == (20, 18)
+
+BSD_OUTPUT = """PING 1.1.1.1 (1.1.1.1): 56 data bytes
+64 bytes from 1.1.1.1: icmp_seq={} ttl=57 time=11.300 ms
+64 bytes from 1.1.1.1: icmp_seq=1 ttl=57 time=10.600 ms
+64 bytes from 1.1.1.1: icmp_seq=2 ttl=57 time=12.600 ms
+64 bytes from 1.1.1.1: icmp_seq=3 ttl=57 time=10.290 ms
+
+--- 1.1.1.1 ping statistics ---
+4 packets transmitted, {} packets received, {}% packet loss
+round-trip min/avg/max/stddev = 10.290/11.198/12.600/0.885 ms
+"""
+
+def test_bsd_sequence_numbers_from_0(tmp_path):
+    clean = BSD_OUTPUT.format(0, 4, '0.0')
+    p = parsed(clean)
+    assert p.seq_base == 0
+    stats = p.get_stats()
+    assert (stats['loss'], stats['loss_bursts']) == (0.0, 0)
+    #The first packet lost, only the header tells it's not a clean run from 1
+    lossy = '\n'.join(l for l in clean.split('\n') if 'icmp_seq=0 ' not in l).replace('4 packets received', '3 packets received')
+    stats = parsed(lossy).get_stats()
+    assert (stats['loss_bursts'], stats['max_loss_burst']) == (1, 1)
+    #Streamed
+    path = tmp_path / 'ping.txt'
+    path.write_text(clean)
+    p = Ping('1.1.1.1')
+    p.get_command = lambda: 'cat {}'.format(path)
+    p.run_stream()
+    stats = p.get_stats()
+    assert (stats['count'], stats['loss'], stats['loss_bursts']) == (4, 0.0, 0)
+    assert stats['avg'] == pytest.approx(11.1975)
+
+def test_linux_stream_stats(fixture):
+    p = Ping('1.1.1.1')
+    p.get_command = lambda: 'cat {}/ping.txt'.format(FIXTURES)
+    p.run_stream()
+    assert p.get_stats()['loss_bursts'] == parsed(fixture('ping.txt')).get_stats()['loss_bursts']
+
+def test_no_output_is_all_lost():
+    p = Ping('no-such-host.invalid', count=5)
+    p.ping_raw = ''
+    p.parse_output()
+    assert (p.ping_results['sent'], p.ping_results['recv'], p.ping_results['loss']) == (5, 0, 1.0)
+    assert 'error' in p.ping_results
+    p = Ping('no-such-host.invalid', count=5)
+    p.get_command = lambda: 'true'
+    p.run_stream()
+    assert (p.ping_results['loss'], 'error' in p.ping_results) == (1.0, True)
@@ -0,0 +1,61 @@
+import pytest
+from monitorx import ratecontrol
+from monitorx.ratecontrol import AdaptivePolicy, TokenBucket, wilson_interval
+
+def test_token_bucket():
+    bucket = TokenBucket(100, burst=2, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [True, True, False]
+    assert bucket.wait(0.0) == pytest.approx(0.01)
+    assert bucket.take(0.01)
+    assert not bucket.take(0.01)
+    #Refilled up to the burst only
+    assert [bucket.take(10.0) for _ in range(3)] == [True, True, False]
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(1000, now=0.0)
+    now, taken = 0.0, 0
+    while now < 1.0:
+        if bucket.take(now):
+            taken += 1
+        else:
+            now += bucket.wait(now)
+    assert 1000 <= taken <= 1000 + bucket.burst + 1
+
+def test_budget(monkeypatch):
+    monkeypatch.setattr(ratecontrol, '_budget', None)
+    assert ratecontrol.budget() is None
+    bucket = ratecontrol.set_budget(500)
+    assert ratecontrol.budget() is bucket and bucket.rate == 500
+    assert ratecontrol.set_budget(None) is None and ratecontrol.budget() is None
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0, 1.96) == (0.0, 1.0)
+    low, high = wilson_interval(5, 100, 1.96)
+    assert low < 0.05 < high
+    assert wilson_interval(0, 100, 1.96)[0] == 0.0
+
+def test_policy():
+    policy = AdaptivePolicy(min_count=3)
+    steady = [10.0, 10.1, 9.9, 10.0, 10.2, 9.8, 10.0]
+    assert policy.more(2, steady[:2], 10)
+    #Healthy, no loss and a steady RTT, once the loss is under loss_threshold with confidence
+    assert policy.more(6, steady[:6], 10)
+    assert not policy.more(7, steady, 10)
+    #Down, nothing comes back
+    assert policy.more(2, [], 10)
+    assert not policy.more(3, [], 10)
+    #Noisy RTT, sampled up to count
+    noisy = [1.0, 50.0, 3.0, 90.0]
+    assert policy.more(4, noisy, 10)
+    assert not policy.more(10, noisy*2 + noisy[:2], 10)
+    #Loss goes on past count, up to max_count
+    lossy = [10.0]*8
+    assert policy.more(10, lossy, 10)
+    assert not policy.more(30, lossy*3, 10)
+    assert not AdaptivePolicy(max_count=12).more(12, lossy, 10)
+
+def test_policy_get():
+    assert isinstance(AdaptivePolicy.get(True), AdaptivePolicy)
+    assert AdaptivePolicy.get(None) is None and AdaptivePolicy.get(False) is None
+    policy = AdaptivePolicy(min_count=5)
+    assert AdaptivePolicy.get(policy) is policy
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from monitorx.scheduler import Scheduler
+
+class FakeProbe(object):
+    def __init__(self, target, delay=0.05, fail=False):
+        self.target = target
+        self.delay = delay
+        self.fail = fail
+        self.timeout = None
+        self.done = False
+
+    def run(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('probe failed')
+        self.done = True
+
+    async def arun(self):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('probe failed')
+        self.done = True
+
+def test_run_overlaps_probes():
+    start = time.monotonic()
+    results = list(Scheduler(max_workers=8).sweep(FakeProbe, ['t{}'.format(n) for n in range(8)], delay=0.2))
+    assert time.monotonic() - start < 1.0
+    assert len(results) == 8 and all(r.ok and r.probe.done for r in results)
+
+def test_errors_and_timeout():
+    probes = [('ok', FakeProbe('ok')), ('bad', FakeProbe('bad', fail=True))]
+    results = {r.target: r for r in Scheduler(timeout=3).run(probes)}
+    assert results['ok'].ok
+    assert isinstance(results['bad'].error, RuntimeError)
+    assert results['ok'].probe.timeout == 3
+
+def test_asweep():
+    async def sweep():
+        return [r async for r in Scheduler(max_workers=2).asweep(FakeProbe, ['a', 'b', 'c'])]
+    results = asyncio.run(sweep())
+    assert sorted(r.target for r in results) == ['a', 'b', 'c']
+    assert all(r.ok for r in results)
+
+def test_run_stopped_early():
+    probes = [FakeProbe('t{}'.format(n), delay=0.1) for n in range(20)]
+    start = time.monotonic()
+    for result in Scheduler(max_workers=2).run([(p.target, p) for p in probes]):
+        break
+    #The 2 running probes are waited for, the queued ones are not run
+    assert time.monotonic() - start < 0.5
+    assert sum(p.done for p in probes) <= 4
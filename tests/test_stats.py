@@ -0,0 +1,48 @@
+from array import array
+import pytest
+from monitorx import stats
+from monitorx.stats import loss_bursts, percentile, rtt_stats
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(stats, 'load_numpy', lambda: None)
+    elif stats.load_numpy() is None:
+        pytest.skip('NumPy is not installed')
+    return request.param
+
+def test_loss_bursts_between_replies(backend):
+    assert loss_bursts(array('q', [1, 2, 5, 6, 10])) == [2, 3]
+    assert loss_bursts(array('q', [3, 1, 2])) == []
+
+def test_loss_bursts_leading_and_trailing(backend):
+    assert loss_bursts(array('q', [1, 2, 3, 4, 5]), sent=10) == [5]
+    assert loss_bursts(array('q', [4, 5, 8]), sent=10) == [3, 2, 2]
+    assert loss_bursts(array('q', [1, 10]), sent=10) == [8]
+    assert loss_bursts(array('q'), sent=4) == [4]
+    assert loss_bursts(array('q'), sent=0) == []
+
+def test_loss_bursts_from_0(backend):
+    assert loss_bursts(array('q', [0, 1, 2, 3]), sent=4) == []
+    assert loss_bursts(array('q', [1, 2, 3]), sent=4, base=0) == [1]
+    assert loss_bursts(array('q', [0, 1]), sent=4) == [2]
+    assert loss_bursts(array('q', [1, 2, 3, 4]), sent=4) == []
+
+def test_rtt_stats(backend):
+    times = array('d', [10.0, 12.0, 11.0, 13.0, 14.0])
+    result = rtt_stats(times, array('q', [1, 2, 3, 4, 5]), sent=10, percentiles=(50,))
+    assert result['count'] == 5
+    assert (result['min'], result['max'], result['avg']) == (10.0, 14.0, 12.0)
+    assert result['p50'] == 12.0
+    assert result['jitter'] == pytest.approx(1.5)
+    assert result['loss'] == 0.5
+    assert (result['loss_bursts'], result['max_loss_burst']) == (1, 5)
+
+def test_rtt_stats_no_samples(backend):
+    result = rtt_stats(array('d'), array('q'), sent=3)
+    assert result['avg'] is None
+    assert (result['loss'], result['loss_bursts'], result['max_loss_burst']) == (1.0, 1, 3)
+
+def test_percentile():
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([], 50) is None
@@ -0,0 +1,45 @@
+import asyncio
+import sys
+import pytest
+from monitorx.mtrx import MTR
+from monitorx.ratecontrol import AdaptivePolicy
+from monitorx.traceroute import SimulatedNetwork, TraceEngine
+
+ROUTES = {'203.0.113.9': [{'ip': '10.0.0.1', 'latency': 1},
+                          None,
+                          {'ip': '198.51.100.1', 'latency': 12, 'jitter': 1},
+                          {'ip': '203.0.113.9', 'latency': 14, 'jitter': 1}]}
+
+def test_simulated_trace():
+    engine = TraceEngine(SimulatedNetwork(ROUTES), rate=10000)
+    mtr, = MTR.run_many(['203.0.113.9'], count=10, engine=engine)
+    hops = mtr.mtr_results
+    assert sorted(hops) == [1, 2, 3, 4]
+    assert [hops[n]['ip'] for n in (1, 2, 3, 4)] == ['10.0.0.1', '???', '198.51.100.1', '203.0.113.9']
+    assert [hops[n]['Snt'] for n in (1, 3, 4)] == [10, 10, 10]
+    assert hops[2]['Loss%'] == 100.0
+    assert 12 < hops[4]['Avg'] < 16
+    assert mtr.lossy_hop is None
+
+def test_adaptive_trace():
+    routes = dict(ROUTES)
+    #Loss from hop 2 on to the destination, a lossy hop
+    routes['192.0.2.7'] = [{'ip': '10.0.0.1', 'latency': 1},
+                           {'ip': '10.0.1.1', 'latency': 5, 'loss': 0.3},
+                           {'ip': '192.0.2.7', 'latency': 8, 'loss': 0.3}]
+    engine = TraceEngine(SimulatedNetwork(routes, seed=1), rate=10000)
+    healthy, lossy = MTR.run_many(['203.0.113.9', '192.0.2.7'], count=10, engine=engine, policy=AdaptivePolicy())
+    #The healthy destination is known well enough before count, the lossy one is sampled past it
+    assert healthy.mtr_results[4]['Snt'] < 10
+    assert healthy.lossy_hop is None
+    assert 10 < lossy.mtr_results[3]['Snt'] <= 30
+    assert lossy.lossy_hop == 2
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='UDPTransport needs IP_RECVERR')
+def test_arun_native_loopback():
+    m = MTR('127.0.0.1', backend='native', count=3, interval=0.02, timeout=10)
+    m.get_command = lambda: pytest.fail('the mtr command was run')
+    assert asyncio.run(m.arun())
+    assert m.mtr_results[1]['ip'] == '127.0.0.1'
+    assert m.mtr_results[1]['Snt'] == 3
+    assert m.lossy_hop is None
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import pytest
+from monitorx import util
+from monitorx.util import AsyncCommand, async_run_command, run_command
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+def run_script(code, timeout=20):
+    """Run code in a fresh interpreter, the hangs being tested for can't hang the tests then"""
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run([sys.executable, '-c', code], env=env, timeout=timeout,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+def running(marker):
+    return subprocess.run(['pgrep', '-f', marker], stdout=subprocess.PIPE).returncode == 0
+
+def test_run_command_pipeline():
+    output, _, code = run_command(['printf "a\\nb\\nc\\n"', 'wc -l'])
+    assert (output.strip(), code) == ('3', 0)
+
+def test_async_pipeline():
+    output, error, code = asyncio.run(async_run_command(['printf "a\\nb\\n"', 'wc -l']))
+    assert (output.strip(), error, code) == ('2', '', 0)
+
+def test_async_timeout_kills_the_pipeline():
+    start = time.monotonic()
+    output, _, code = asyncio.run(async_run_command(['sleep 30.25', 'cat'], timeout=0.3))
+    assert time.monotonic() - start < 5
+    assert code != 0 and output == ''
+    assert not running('sleep 30.25')
+
+def test_async_lines():
+    async def lines():
+        async with AsyncCommand('printf "x\\ny\\n"') as command:
+            return [line async for line in command.stdout_lines()]
+    assert asyncio.run(lines()) == ['x\n', 'y\n']
+
+def test_spawn_failure_leaves_nothing_behind():
+    async def start():
+        command = AsyncCommand(['sleep 30.5', 'no-such-command-monitorx'])
+        try:
+            await command.start()
+        finally:
+            await asyncio.gather(*(p.wait() for p in command.processes))
+    before = len(os.listdir('/proc/self/fd'))
+    try:
+        asyncio.run(start())
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError('the missing command should fail the start')
+    assert not running('sleep 30.5')
+    assert len(os.listdir('/proc/self/fd')) == before
+
+def test_cancelled_while_spawning():
+    #The event loop is shut down while the commands are still being started, asyncio.run must
+    #not hang and the commands must be killed
+    result = run_script('''
+import asyncio
+from monitorx.util import async_run_command
+
+async def main():
+    tasks = [asyncio.ensure_future(async_run_command('sleep 30.75')) for _ in range(3)]
+    await asyncio.sleep(0)
+
+asyncio.run(main())
+print('done')
+''')
+    assert result.stdout.strip() == 'done', result.stderr
+    assert not running('sleep 30.75')
+
+def test_scheduler_stopped_early():
+    result = run_script('''
+import asyncio
+from monitorx.scheduler import Scheduler
+from monitorx.util import async_run_command
+
+class Sleep(object):
+    def __init__(self, target):
+        self.target = target
+        self.timeout = None
+
+    async def arun(self):
+        await async_run_command('sleep {}'.format(self.target), timeout=self.timeout)
+
+async def main():
+    async for result in Scheduler(max_workers=3).asweep(Sleep, ['0.1'] + ['31.25']*5):
+        break
+
+asyncio.run(main())
+print('done')
+''')
+    assert result.stdout.strip() == 'done', result.stderr
+    assert not running('sleep 31.25')
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(util, 'load_numpy', lambda: None)
+    elif util.load_numpy() is None:
+        pytest.skip('NumPy is not installed')
+    return request.param
+
+IPS = ['10.0.0.2', '8.8.8.8', '::1', '???', '10.0.0.10', '192.168.1.1', 'fe80::1', '1.1.1.1', '8.8.8.8']
+
+def test_sortip(backend):
+    #IPv4 is IPv4-mapped (::ffff:0:0/96), which sorts after ::1 and before fe80::
+    assert util.sortip(IPS) == ['::1', '1.1.1.1', '8.8.8.8', '8.8.8.8', '10.0.0.2', '10.0.0.10', '192.168.1.1',
+                                'fe80::1', '???']
+    ipv4 = [ip for ip in IPS if '.' in ip]
+    assert util.sortip(ipv4) == sorted(ipv4, key=util.pack_ip)
+
+def test_ip_order(backend):
+    order = [int(i) for i in util.ip_order(IPS)]
+    assert [IPS[i] for i in order] == util.sortip(IPS)
+    ipv4 = ['10.0.0.10', '1.1.1.1', '10.0.0.2']
+    assert [int(i) for i in util.ip_order(ipv4, util.pack_ips(ipv4))] == [1, 2, 0]
+
+def test_pack_ips(backend):
+    packed = [tuple(int(n) for n in row) for row in util.pack_ips(['1.2.3.4', '::1'])]
+    assert packed == [(0, 0xffff01020304), (0, 1)]
+    assert list(util.pack_ipv4(['1.2.3.4', '255.0.0.1'])) == [0x01020304, 0xff000001]
+    with pytest.raises(OSError):
+        util.pack_ipv4(['1.2.3.4', '::1'])
+
+def test_pack_ipv4_rejects_what_inet_pton_does(backend):
+    for bad in (['1.2.3', '4.5.6.7.8'], ['01.2.3.4'], ['1.2.3.256'], ['1.2.3.4 '], ['1.2.3.-4'], ['a.b.c.d']):
+        with pytest.raises(OSError):
+            util.pack_ipv4(bad)
+
+def test_private_and_haversine(backend):
+    assert [bool(p) for p in util.is_private_batch(IPS)] == [True, False, True, False, True, True, True,
+                                                              False, False]
+    points = [(0.0, 0.0), (0.0, 90.0), (90.0, 0.0)]
+    assert [round(d) for d in util.haversine_consecutive(points)] == [10008, 10008]
+    matrix = [[round(d) for d in row] for row in util.haversine_pairwise(points)]
+    assert matrix == [[0, 10008, 10008], [10008, 0, 10008], [10008, 10008, 0]]